@@ -2,18 +2,28 @@
 """
 Meilisearch API Key Provisioner
 Generates and validates Meilisearch API keys using the Python client library.
+With --lightweight it talks to Meilisearch and the API server over http.client
+instead, so the Job starts without installing or importing either SDK.
 """
 
 from __future__ import annotations
 
 import argparse
 import base64
+import hashlib
+import json
 import logging
 import os
 import sys
+import threading
 import time
-from contextlib import contextmanager
-from typing import TYPE_CHECKING, Any, Iterator, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager, nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Optional
+from urllib.parse import quote, urlencode, urlsplit
 
 if TYPE_CHECKING:
     from meilisearch import Client as MeiliClient  # type: ignore[attr-defined]
@@ -112,14 +122,477 @@ def validate_master_key(client: MeiliClient) -> bool:
         return False
 
 
-def validate_api_key(url: str, api_key: str) -> bool:
-    """Validate an API key by testing it against Meilisearch."""
+KEY_PAGE_SIZE = 100
+VALIDATION_WORKERS = 8
+VALIDATION_TIMEOUT_SECONDS = 5.0
+INDEX_PAGE_SIZE = 100
+INDEX_WORKERS = 8
+TASK_TIMEOUT_SECONDS = 60.0
+TASK_POLL_SECONDS = 0.25
+FINISHED_TASK_STATUSES = {"succeeded", "failed", "canceled"}
+SEED_DIR = "/seed"
+DEFAULT_SEED_BATCH_BYTES = 10 * 1024 * 1024
+DEFAULT_SEED_IN_FLIGHT = 4
+SEED_TASK_TIMEOUT_SECONDS = 600.0
+SEED_CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+APPLIED_DIGESTS_ANNOTATION = "mbround18.github.io/meilisearch-index-digests"
+SECRET_WORKERS = 8
+HTTP_TIMEOUT_SECONDS = 60.0
+SERVICE_ACCOUNT_DIR = "/var/run/secrets/kubernetes.io/serviceaccount"
+
+# Cheapest authenticated request each action grants, in order of preference.
+# Meilisearch answers 403 both for unknown keys and for keys lacking the
+# action, so a key can only be checked against an endpoint it may call.
+ACTION_PROBES: list[tuple[tuple[str, ...], str, str, bool]] = [
+    (("version",), "GET", "/version", False),
+    (("stats.get", "stats.*"), "GET", "/stats", False),
+    (("indexes.get", "indexes.*"), "GET", "/indexes?limit=1", False),
+    (("keys.get", "keys.*"), "GET", "/keys?limit=1", False),
+    (("tasks.get", "tasks.*"), "GET", "/tasks?limit=1", False),
+    (("search",), "POST", "/multi-search", False),
+    (
+        ("documents.get", "documents.*"),
+        "GET",
+        "/indexes/{index}/documents?limit=1",
+        True,
+    ),
+    (("settings.get", "settings.*"), "GET", "/indexes/{index}/settings", True),
+]
+
+
+def create_http_session(
+    pool_size: int = VALIDATION_WORKERS, lightweight: bool = False
+) -> Any:
+    """Create a requests session whose connection pool fits the worker count.
+
+    With ``lightweight`` a ``StdlibSession`` is returned instead, so neither
+    requests nor urllib3 is imported.
+    """
+    if lightweight:
+        return StdlibSession()
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, url: str) -> None:
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+        self.url = url
+
+
+@dataclass
+class HttpResponse:
+    status_code: int
+    content: bytes
+    url: str
+
+    def json(self) -> Any:
+        return json.loads(self.content.decode("utf-8"))
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise HttpError(self.status_code, self.url)
+
+
+def _encode_body(payload: Any, data: Optional[bytes]) -> Optional[bytes]:
+    if payload is not None:
+        return json.dumps(payload).encode("utf-8")
+    return data
+
+
+class StdlibSession:
+    """The slice of ``requests.Session`` the provisioner uses, on http.client.
+
+    Each worker thread keeps one keep-alive connection per origin, so
+    concurrent validation and seeding reuse sockets without a shared pool.
+    """
+
+    def __init__(self, ssl_context: Optional[Any] = None) -> None:
+        self.ssl_context = ssl_context
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open: list[Any] = []
+
+    def _connection(self, scheme: str, netloc: str, timeout: float) -> Any:
+        import http.client
+
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        connection = connections.get((scheme, netloc))
+        if connection is None:
+            if scheme == "https":
+                connection = http.client.HTTPSConnection(
+                    netloc, timeout=timeout, context=self.ssl_context
+                )
+            else:
+                connection = http.client.HTTPConnection(netloc, timeout=timeout)
+            connections[(scheme, netloc)] = connection
+            with self._lock:
+                self._open.append(connection)
+        connection.timeout = timeout
+        return connection
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[dict[str, str]] = None,
+        params: Optional[dict[str, Any]] = None,
+        json: Any = None,
+        data: Optional[bytes] = None,
+        timeout: float = HTTP_TIMEOUT_SECONDS,
+    ) -> HttpResponse:
+        parts = urlsplit(url)
+        target = parts.path or "/"
+        query = "&".join(filter(None, [parts.query, urlencode(params or {})]))
+        if query:
+            target = f"{target}?{query}"
+        body = _encode_body(json, data)
+        request_headers = {"User-Agent": "meilisearch-provisioner", **(headers or {})}
+        if json is not None:
+            request_headers.setdefault("Content-Type", "application/json")
+
+        for attempt in range(2):
+            connection = self._connection(parts.scheme, parts.netloc, timeout)
+            try:
+                connection.request(method, target, body=body, headers=request_headers)
+                response = connection.getresponse()
+                content = response.read()
+            except Exception as e:
+                # A socket that failed mid-request is never reused. Only a
+                # dropped idle keep-alive socket is worth one retry.
+                self._discard(parts.scheme, parts.netloc, connection)
+                if attempt or not isinstance(e, ConnectionError):
+                    raise
+                continue
+            return HttpResponse(response.status, content, url)
+        raise AssertionError("unreachable")
+
+    def _discard(self, scheme: str, netloc: str, connection: Any) -> None:
+        connection.close()
+        getattr(self._local, "connections", {}).pop((scheme, netloc), None)
+        with self._lock:
+            if connection in self._open:
+                self._open.remove(connection)
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._open:
+                connection.close()
+            self._open.clear()
+
+
+class KubeApi:
+    """Secret reads and merge patches against the API server.
+
+    Stands in for ``kubernetes.client.CoreV1Api`` in lightweight mode,
+    authenticating with the pod's service account token.
+    """
+
+    def __init__(self, server: str, token: str, session: Any) -> None:
+        self.server = server.rstrip("/")
+        self.token = token
+        self.session = session
+
+    @classmethod
+    def in_cluster(cls, account_dir: str = SERVICE_ACCOUNT_DIR) -> KubeApi:
+        import ssl
+
+        host = os.environ["KUBERNETES_SERVICE_HOST"]
+        port = os.environ.get("KUBERNETES_SERVICE_PORT", "443")
+        if ":" in host:
+            host = f"[{host}]"
+        with open(os.path.join(account_dir, "token"), encoding="utf-8") as handle:
+            token = handle.read().strip()
+        context = ssl.create_default_context(cafile=os.path.join(account_dir, "ca.crt"))
+        return cls(f"https://{host}:{port}", token, StdlibSession(context))
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _request(self, method: str, path: str, **kwargs: Any) -> Any:
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Accept": "application/json",
+            **kwargs.pop("headers", {}),
+        }
+        response = self.session.request(
+            method, self.server + path, headers=headers, **kwargs
+        )
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _secret_path(name: str, namespace: str) -> str:
+        return (
+            f"/api/v1/namespaces/{quote(namespace, safe='')}"
+            f"/secrets/{quote(name, safe='')}"
+        )
+
+    def read_namespaced_secret(self, name: str, namespace: str) -> Any:
+        secret = self._request("GET", self._secret_path(name, namespace))
+        metadata = secret.get("metadata") or {}
+        return SimpleNamespace(
+            metadata=SimpleNamespace(
+                name=metadata.get("name"),
+                namespace=metadata.get("namespace"),
+                annotations=metadata.get("annotations") or {},
+            ),
+            data=secret.get("data") or {},
+        )
+
+    def create_namespaced_secret(self, namespace: str, body: dict[str, Any]) -> Any:
+        return self._request(
+            "POST", f"/api/v1/namespaces/{quote(namespace, safe='')}/secrets", json=body
+        )
+
+    def patch_namespaced_secret(
+        self, name: str, namespace: str, body: dict[str, Any]
+    ) -> Any:
+        return self._request(
+            "PATCH",
+            self._secret_path(name, namespace),
+            json=body,
+            headers={"Content-Type": "application/merge-patch+json"},
+        )
+
+
+def probe_request(
+    actions: Optional[Iterable[str]] = None,
+    indexes: Optional[Iterable[str]] = None,
+) -> Optional[tuple[str, str, Optional[dict]]]:
+    """Pick the request used to check a key with the given permissions.
+
+    Returns None when the key may only write, so no read request fits it.
+    """
+    granted = {action.strip() for action in actions or ["*"]}
+    if "*" in granted:
+        return "GET", "/version", None
+    concrete = [index for index in indexes or [] if index and "*" not in index]
+    for names, method, path, needs_index in ACTION_PROBES:
+        if not granted.intersection(names):
+            continue
+        if needs_index and not concrete:
+            continue
+        body = {"queries": []} if path == "/multi-search" else None
+        return (
+            method,
+            path.format(index=quote(concrete[0] if concrete else "", safe="")),
+            body,
+        )
+    return None
+
+
+def validate_api_key(
+    url: str,
+    api_key: str,
+    session: Optional[Any] = None,
+    actions: Optional[Iterable[str]] = None,
+    indexes: Optional[Iterable[str]] = None,
+) -> bool:
+    """Validate an API key with an authenticated request it is allowed to make.
+
+    ``/health`` answers without a key at all, so it proves nothing. A key
+    no read request fits cannot be checked this way and is accepted.
+    """
+    probe = probe_request(actions, indexes)
+    if probe is None:
+        logger.debug("No probe fits actions %s; accepting key", sorted(actions or []))
+        return True
+    method, path, body = probe
+    owned = session is None
+    session = session or create_http_session(1)
     try:
-        test_client = create_meili_client(url, api_key)
-        health = test_client.health()
-        return health.get("status") == "available"
+        response = session.request(
+            method,
+            url.rstrip("/") + path,
+            headers={"Authorization": f"Bearer {api_key}"},
+            json=body,
+            timeout=VALIDATION_TIMEOUT_SECONDS,
+        )
+        return response.status_code == 200
     except Exception:
         return False
+    finally:
+        if owned:
+            session.close()
+
+
+@dataclass(frozen=True)
+class KeyRecord:
+    """An API key as listed by Meilisearch; None scopes mean everything."""
+
+    key: str
+    name: str
+    indexes: Optional[frozenset[str]]
+    actions: Optional[frozenset[str]]
+    expires_at: Optional[datetime] = None
+
+    def expired(self, now: Optional[datetime] = None) -> bool:
+        if self.expires_at is None:
+            return False
+        return self.expires_at <= (now or datetime.now(timezone.utc))
+
+    @property
+    def scope(self) -> tuple[Optional[frozenset[str]], Optional[frozenset[str]]]:
+        return self.indexes, self.actions
+
+    def covers(
+        self,
+        indexes: Optional[frozenset[str]],
+        actions: Optional[frozenset[str]],
+    ) -> bool:
+        ok_indexes = indexes is None or self.indexes is None or indexes <= self.indexes
+        ok_actions = actions is None or self.actions is None or actions <= self.actions
+        return ok_indexes and ok_actions
+
+
+def _field(item: Any, *names: str) -> Any:
+    for name in names:
+        if isinstance(item, dict) and name in item:
+            return item[name]
+        value = getattr(item, name, None)
+        if value is not None:
+            return value
+    return None
+
+
+def _expiry(value: Any) -> Optional[datetime]:
+    """Parse ``expiresAt`` as listed: an RFC 3339 string, a datetime or None."""
+    if not value:
+        return None
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _scope(values: Any) -> Optional[frozenset[str]]:
+    if not values or list(values) == ["*"]:
+        return None
+    return frozenset(values)
+
+
+def iter_keys(client: MeiliClient, page_size: int = KEY_PAGE_SIZE) -> Iterator[Any]:
+    """Yield every key, following ``offset``/``limit`` pagination."""
+    offset = 0
+    while True:
+        try:
+            raw = client.get_keys({"offset": offset, "limit": page_size})
+        except TypeError:
+            # Clients without pagination parameters return everything at once.
+            raw = client.get_keys()
+            page_size = 0
+        # Support different return shapes (dict or KeysResults, or a list)
+        results = _field(raw, "results")
+        if results is None and isinstance(raw, list):
+            results = raw
+        results = list(results or [])
+        yield from results
+
+        total = _field(raw, "total")
+        offset += len(results)
+        if not page_size or not results or total is None or offset >= total:
+            return
+
+
+class KeyIndex:
+    """Keys bucketed by name and by (indexes, actions) scope from one listing."""
+
+    def __init__(self, records: Iterable[KeyRecord]) -> None:
+        self.by_key: dict[str, KeyRecord] = {}
+        self.by_name: dict[str, list[KeyRecord]] = {}
+        self.by_scope: dict[tuple, list[KeyRecord]] = {}
+        for record in records:
+            self.by_key.setdefault(record.key, record)
+            if record.name:
+                self.by_name.setdefault(record.name, []).append(record)
+            self.by_scope.setdefault(record.scope, []).append(record)
+
+    @classmethod
+    def from_client(cls, client: MeiliClient) -> KeyIndex:
+        records = []
+        for item in iter_keys(client):
+            key = _field(item, "key", "value", "uid")
+            if not key:
+                continue
+            records.append(
+                KeyRecord(
+                    key=key,
+                    name=_field(item, "name", "description") or "",
+                    indexes=_scope(_field(item, "indexes")),
+                    actions=_scope(_field(item, "actions")),
+                    expires_at=_expiry(_field(item, "expiresAt", "expires_at")),
+                )
+            )
+        return cls(records)
+
+    def candidates(
+        self, description: str, indexes: list[str], actions: list[str]
+    ) -> tuple[list[KeyRecord], list[KeyRecord]]:
+        """Return keys named ``description``, then keys covering the scope."""
+        by_name = list(self.by_name.get(description, []))
+        wanted_indexes = _scope(indexes)
+        wanted_actions = _scope(actions)
+        named = {record.key for record in by_name}
+        by_scope = [
+            record
+            for scope, records in self.by_scope.items()
+            if records[0].covers(wanted_indexes, wanted_actions)
+            for record in records
+            if record.key not in named
+        ]
+        return by_name, by_scope
+
+
+def first_valid_key(
+    host_url: str,
+    records: list[KeyRecord],
+    session: Any,
+    key_index: Optional[KeyIndex] = None,
+    workers: int = VALIDATION_WORKERS,
+) -> Optional[KeyRecord]:
+    """Return the first key in ``records`` order that is still valid.
+
+    Keys in the master key's listing are valid until they expire. The others
+    are probed concurrently, but a later key never wins over an earlier one
+    just because its probe answered first.
+    """
+    listed = key_index.by_key if key_index is not None else {}
+    probed = list(dict.fromkeys(r for r in records if r.key not in listed))
+    executor = ThreadPoolExecutor(max_workers=max(min(workers, len(probed)), 1))
+    try:
+        futures = {
+            record: executor.submit(
+                validate_api_key,
+                host_url,
+                record.key,
+                session=session,
+                actions=record.actions,
+                indexes=record.indexes,
+            )
+            for record in probed
+        }
+        for record in records:
+            if record in futures:
+                valid = futures[record].result()
+            else:
+                valid = not record.expired()
+            if valid:
+                return record
+        return None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 def find_matching_key(
@@ -128,6 +601,8 @@ def find_matching_key(
     description: str,
     indexes: list[str],
     actions: list[str],
+    session: Optional[Any] = None,
+    key_index: Optional[KeyIndex] = None,
 ) -> str | None:
     """Search existing API keys for one that matches the requested criteria.
 
@@ -137,84 +612,111 @@ def find_matching_key(
       supersets of the requested ones (or contain "*").
     Returns the key string if found and valid, otherwise None.
     """
-    try:
-        raw = client.get_keys()
-    except Exception as e:
-        logger.warning("Warning: failed to list keys: %s", e)
-        return None
-
-    # Support different return shapes (dict with 'results' or list)
-    keys_list = (
-        raw.get("results") if isinstance(raw, dict) and raw.get("results") else raw
-    )
+    if key_index is None:
+        try:
+            key_index = KeyIndex.from_client(client)
+        except Exception as e:
+            logger.warning("Warning: failed to list keys: %s", e)
+            return None
 
-    # Normalize requested sets
-    req_indexes = set(indexes) if indexes and indexes != ["*"] else None
-    req_actions = set(actions) if actions and actions != ["*"] else None
-
-    # Helper to extract fields robustly
-    def _get(k, *names):
-        for n in names:
-            if isinstance(k, dict) and n in k:
-                return k[n]
-            val = getattr(k, n, None)
-            if val is not None:
-                return val
+    by_name, by_scope = key_index.candidates(description, indexes, actions)
+    owned = session is None
+    session = session or create_http_session()
+    try:
+        record = first_valid_key(host_url, by_name, session, key_index)
+        if record is not None:
+            logger.info("Found existing key by description: %s", record.name)
+            return record.key
+
+        record = first_valid_key(host_url, by_scope, session, key_index)
+        if record is not None:
+            logger.info(
+                "Found existing key matching actions/indexes: %s...",
+                record.key[:20],
+            )
+            return record.key
         return None
+    finally:
+        if owned:
+            session.close()
 
-    # First pass: exact description match
-    for k in keys_list or []:
-        name = _get(k, "name", "description") or ""
-        key_val = _get(k, "key", "value", "uid")
-        if not key_val:
-            continue
-        if name and name == description:
-            if validate_api_key(host_url, key_val):
-                logger.info("Found existing key by description: %s", name)
-                return key_val
-
-    # Second pass: find by actions/indexes superset
-    for k in keys_list or []:
-        k_indexes = _get(k, "indexes") or []
-        k_actions = _get(k, "actions") or []
-        key_val = _get(k, "key", "value", "uid")
-        if not key_val:
-            continue
-
-        # Normalize lists
-        k_indexes_set = set(k_indexes) if k_indexes and k_indexes != ["*"] else None
-        k_actions_set = set(k_actions) if k_actions and k_actions != ["*"] else None
-
-        ok_indexes = True
-        ok_actions = True
 
-        if req_indexes is not None:
-            if k_indexes_set is None:
-                ok_indexes = True
-            else:
-                ok_indexes = req_indexes.issubset(k_indexes_set)
+def validate_known_key(
+    host_url: str,
+    api_key: str,
+    session: Any,
+    key_index: Optional[KeyIndex],
+) -> bool:
+    """Validate a key against the master key's listing, or probe without one."""
+    if key_index is None:
+        return validate_api_key(host_url, api_key, session=session)
+    # The master key lists every key, so one it does not know is gone.
+    record = key_index.by_key.get(api_key)
+    return record is not None and not record.expired()
+
+
+def iter_index_uids(
+    client: MeiliClient, page_size: int = INDEX_PAGE_SIZE
+) -> Iterator[str]:
+    """Yield the uid of every index, following ``offset``/``limit`` pagination."""
+    offset = 0
+    while True:
+        raw = client.get_indexes({"offset": offset, "limit": page_size})
+        results = list(_field(raw, "results") or [])
+        for index in results:
+            uid = _field(index, "uid")
+            if uid:
+                yield uid
+        total = _field(raw, "total")
+        offset += len(results)
+        if not results or total is None or offset >= total:
+            return
+
+
+def _create_index(client: MeiliClient, uid: str) -> Any:
+    # Try common signatures for create_index
+    try:
+        return client.create_index(uid=uid)
+    except TypeError:
+        return client.create_index(uid)
 
-        if req_actions is not None:
-            if k_actions_set is None:
-                ok_actions = True
-            else:
-                ok_actions = req_actions.issubset(k_actions_set)
 
-        if ok_indexes and ok_actions:
-            if validate_api_key(host_url, key_val):
-                logger.info(
-                    "Found existing key matching actions/indexes: %s...",
-                    key_val[:20],
-                )
-                return key_val
+def wait_for_tasks(
+    client: MeiliClient,
+    task_uids: list[int],
+    timeout: float = TASK_TIMEOUT_SECONDS,
+    interval: float = TASK_POLL_SECONDS,
+) -> dict[int, Any]:
+    """Poll one batched ``/tasks?uids=`` query until every task has finished.
 
-    return None
+    Returns the final task of each uid; unfinished ones are left out.
+    """
+    pending = set(task_uids)
+    finished: dict[int, Any] = {}
+    deadline = time.monotonic() + timeout
+    while pending:
+        # The SDK joins list parameters with ``",".join``, which only accepts
+        # strings, so send the uids already joined.
+        uids = ",".join(map(str, sorted(pending)))
+        raw = client.get_tasks({"uids": uids, "limit": len(pending)})
+        for task in _field(raw, "results") or []:
+            uid = _field(task, "uid")
+            if uid in pending and _field(task, "status") in FINISHED_TASK_STATUSES:
+                finished[uid] = task
+                pending.discard(uid)
+        if not pending or time.monotonic() >= deadline:
+            break
+        time.sleep(interval)
+    return finished
 
 
 def ensure_indexes(client: MeiliClient, indexes: list[str]) -> None:
     """Create any missing indexes in Meilisearch using the master client.
 
-    Skips when indexes is ['*'] (meaning all indexes).
+    Existing indexes come from one paginated listing, missing ones are
+    created concurrently, and their tasks are awaited together so the
+    indexes exist before consumers start. Skips when indexes is ['*']
+    (meaning all indexes).
     """
     if not indexes or indexes == ["*"]:
         message = "Index creation skipped (wildcard '*')"
@@ -222,29 +724,403 @@ def ensure_indexes(client: MeiliClient, indexes: list[str]) -> None:
         print(message)
         return
 
-    for idx in indexes:
-        idx = idx.strip()
-        if not idx:
+    requested = list(dict.fromkeys(idx.strip() for idx in indexes if idx.strip()))
+    try:
+        existing = set(iter_index_uids(client))
+    except Exception as e:
+        logger.warning("Warning: failed to list indexes: %s", e)
+        existing = set()
+    for idx in requested:
+        if idx in existing:
+            logger.info("Index exists: %s", idx)
+    missing = [idx for idx in requested if idx not in existing]
+    if not missing:
+        return
+
+    logger.warning("Indexes missing — creating: %s", ", ".join(missing))
+
+    def create(idx: str) -> tuple[str, Any]:
+        try:
+            return idx, _create_index(client, idx)
+        except Exception as ce:
+            logger.error("Failed to create index %s: %s", idx, ce)
+            return idx, None
+
+    task_indexes: dict[int, str] = {}
+    with ThreadPoolExecutor(max_workers=min(INDEX_WORKERS, len(missing))) as pool:
+        for idx, task in pool.map(create, missing):
+            task_uid = _field(task, "task_uid", "taskUid")
+            if isinstance(task_uid, int):
+                task_indexes[task_uid] = idx
+            elif task is not None:
+                logger.info("Created index: %s", idx)
+
+    if not task_indexes:
+        return
+    try:
+        finished = wait_for_tasks(client, list(task_indexes))
+    except Exception as e:
+        logger.warning("Warning: could not wait for index creation: %s", e)
+        return
+    for task_uid, idx in task_indexes.items():
+        task = finished.get(task_uid)
+        if task is None:
+            logger.warning("Index %s still being created (task %s)", idx, task_uid)
             continue
+        error = _field(task, "error") or {}
+        if _field(task, "status") == "succeeded":
+            logger.info("Created index: %s", idx)
+        elif _field(error, "code") == "index_already_exists":
+            logger.info("Index exists: %s", idx)
+        else:
+            logger.error("Failed to create index %s: %s", idx, error)
+
+
+class MeiliHttp:
+    """Raw HTTP access to Meilisearch for bodies the client would buffer.
+
+    It also covers the calls made through the SDK client, so lightweight
+    mode uses it in place of ``meilisearch.Client``.
+    """
+
+    def __init__(self, host: str, key: Optional[str], session: Any) -> None:
+        self.host = host.rstrip("/")
+        self.key = key
+        self.session = session
+
+    def request(self, method: str, path: str, **kwargs: Any) -> Any:
+        headers = dict(kwargs.pop("headers", {}))
+        if self.key:
+            headers["Authorization"] = f"Bearer {self.key}"
+        response = self.session.request(
+            method,
+            self.host + path,
+            headers=headers,
+            timeout=HTTP_TIMEOUT_SECONDS,
+            **kwargs,
+        )
+        response.raise_for_status()
+        return response.json() if response.content else None
+
+    def health(self) -> Any:
+        return self.request("GET", "/health")
+
+    def get_keys(self, parameters: Optional[dict[str, Any]] = None) -> Any:
+        return self.request("GET", "/keys", params=parameters)
+
+    def create_key(self, options: dict[str, Any]) -> Any:
+        return self.request("POST", "/keys", json=options)
+
+    def get_indexes(self, parameters: Optional[dict[str, Any]] = None) -> Any:
+        return self.request("GET", "/indexes", params=parameters)
+
+    def create_index(self, uid: str) -> Any:
+        return self.request("POST", "/indexes", json={"uid": uid})
+
+    def get_tasks(self, parameters: dict[str, Any]) -> Any:
+        params = {
+            key: ",".join(map(str, value)) if isinstance(value, list) else value
+            for key, value in parameters.items()
+        }
+        return self.request("GET", "/tasks", params=params)
+
+    def update_settings(self, uid: str, settings: dict[str, Any]) -> Any:
+        return self.request(
+            "PATCH", f"/indexes/{quote(uid, safe='')}/settings", json=settings
+        )
+
+    def add_documents(
+        self,
+        uid: str,
+        body: bytes,
+        content_type: str,
+        primary_key: Optional[str] = None,
+    ) -> Any:
+        params = {"primaryKey": primary_key} if primary_key else None
+        return self.request(
+            "POST",
+            f"/indexes/{quote(uid, safe='')}/documents",
+            params=params,
+            data=body,
+            headers={"Content-Type": content_type},
+        )
+
+
+@dataclass(frozen=True)
+class SeedSource:
+    """A file of documents to load into one index."""
+
+    index: str
+    path: str
+    format: str
+    primary_key: Optional[str] = None
+
+    @classmethod
+    def from_mapping(cls, data: dict[str, Any], base_dir: str) -> SeedSource:
+        path = os.path.join(base_dir, data["path"])
+        fmt = data.get("format") or ("csv" if path.endswith(".csv") else "ndjson")
+        if fmt not in SEED_CONTENT_TYPES:
+            raise ValueError(f"unsupported seed format {fmt!r} for {path}")
+        return cls(data["index"], path, fmt, data.get("primaryKey"))
+
+
+@dataclass
+class IndexPlan:
+    """Settings and seed sources declared for one index."""
+
+    uid: str
+    settings: Optional[dict[str, Any]] = None
+    sources: list[SeedSource] = field(default_factory=list)
+
+    def digest(self) -> str:
+        """Hash the settings and the seed files' contents."""
+        digest = hashlib.sha256()
+        digest.update(json.dumps(self.settings, sort_keys=True).encode())
+        for source in self.sources:
+            digest.update(f"\0{source.format}\0{source.primary_key}\0".encode())
+            with open(source.path, "rb") as handle:
+                for chunk in iter(lambda: handle.read(1 << 20), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+
+def load_index_plans(
+    config: dict[str, Any], base_dir: str = SEED_DIR
+) -> list[IndexPlan]:
+    """Group declared ``indexSettings`` and seed ``sources`` by index."""
+    plans: dict[str, IndexPlan] = {}
+    for uid, settings in (config.get("indexSettings") or {}).items():
+        plans[uid] = IndexPlan(uid, settings=settings or None)
+    for item in (config.get("seed") or {}).get("sources") or []:
+        source = SeedSource.from_mapping(item, base_dir)
+        plans.setdefault(source.index, IndexPlan(source.index)).sources.append(source)
+    return list(plans.values())
+
+
+def _iter_records(handle: Any, fmt: str) -> Iterator[bytes]:
+    if fmt == "ndjson":
+        for line in handle:
+            if line.strip():
+                yield line if line.endswith(b"\n") else line + b"\n"
+        return
+    # CSV fields may hold quoted newlines; a record ends once quotes balance.
+    record = b""
+    for line in handle:
+        record += line
+        if record.count(b'"') % 2 == 0:
+            if record.strip():
+                yield record if record.endswith(b"\n") else record + b"\n"
+            record = b""
+    if record.strip():
+        yield record + b"\n"
+
+
+def iter_batches(path: str, fmt: str, batch_bytes: int) -> Iterator[bytes]:
+    """Stream a seed file as batches of whole records of at most ``batch_bytes``.
+
+    CSV batches each repeat the header row. A record larger than the bound
+    is sent on its own.
+    """
+    with open(path, "rb") as handle:
+        records = _iter_records(handle, fmt)
+        header = next(records, b"") if fmt == "csv" else b""
+        batch: list[bytes] = []
+        size = len(header)
+        for record in records:
+            if batch and size + len(record) > batch_bytes:
+                yield header + b"".join(batch)
+                batch, size = [], len(header)
+            batch.append(record)
+            size += len(record)
+        if batch:
+            yield header + b"".join(batch)
+
+
+def seed_index(
+    api: MeiliHttp, source: SeedSource, batch_bytes: int, in_flight: int
+) -> list[int]:
+    """Upload a seed file with at most ``in_flight`` batches outstanding.
+
+    Submission stops at the first failed batch and its error is raised once
+    the batches already in flight have finished.
+    """
+    slots = threading.BoundedSemaphore(max(in_flight, 1))
+    content_type = SEED_CONTENT_TYPES[source.format]
+    failed = threading.Event()
+
+    def upload(body: bytes) -> int:
         try:
-            # Try to fetch the index; if it exists this will succeed
-            try:
-                client.get_index(idx)
-                logger.info("Index exists: %s", idx)
-            except Exception as ms:
-                logger.warning("Index %s not found: %s", idx, ms)
-                logger.warning("Index %s missing — creating...", idx)
-                try:
-                    # Try common signatures for create_index
-                    try:
-                        client.create_index(uid=idx)
-                    except TypeError:
-                        client.create_index(idx)
-                    logger.info("Created index: %s", idx)
-                except Exception as ce:
-                    logger.error("Failed to create index %s: %s", idx, ce)
-        except Exception as e:
-            logger.warning("Warning checking/creating index %s: %s", idx, e)
+            task = api.add_documents(
+                source.index, body, content_type, source.primary_key
+            )
+            return _field(task, "taskUid", "task_uid")
+        except Exception:
+            failed.set()
+            raise
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=max(in_flight, 1)) as pool:
+        futures = []
+        for body in iter_batches(source.path, source.format, batch_bytes):
+            slots.acquire()
+            if failed.is_set():
+                slots.release()
+                break
+            futures.append(pool.submit(upload, body))
+        return [future.result() for future in futures]
+
+
+def apply_index_plan(
+    api: MeiliHttp,
+    plan: IndexPlan,
+    batch_bytes: int = DEFAULT_SEED_BATCH_BYTES,
+    in_flight: int = DEFAULT_SEED_IN_FLIGHT,
+    timeout: float = SEED_TASK_TIMEOUT_SECONDS,
+) -> bool:
+    """Apply an index's settings and seed documents, waiting for every task."""
+    task_uids = []
+    try:
+        if plan.settings:
+            task_uids.append(
+                _field(api.update_settings(plan.uid, plan.settings), "taskUid")
+            )
+        for source in plan.sources:
+            logger.info("Seeding %s from %s", plan.uid, source.path)
+            task_uids.extend(seed_index(api, source, batch_bytes, in_flight))
+    except Exception as e:
+        logger.error("Failed to apply settings or seed for index %s: %s", plan.uid, e)
+        return False
+
+    task_uids = [uid for uid in task_uids if isinstance(uid, int)]
+    finished = wait_for_tasks(api, task_uids, timeout=timeout)
+    ok = True
+    for task_uid in task_uids:
+        task = finished.get(task_uid)
+        if task is None or _field(task, "status") != "succeeded":
+            logger.error(
+                "Task %s for index %s did not succeed: %s",
+                task_uid,
+                plan.uid,
+                _field(task, "error") if task is not None else "timed out",
+            )
+            ok = False
+    return ok
+
+
+def read_applied_digests(
+    namespace: str, secret_name: str, kube_v1: Optional[Any]
+) -> dict[str, str]:
+    """Read the per-index digests recorded on the API key secret."""
+    if kube_v1 is None:
+        return {}
+    try:
+        secret = kube_v1.read_namespaced_secret(secret_name, namespace)
+        annotations = getattr(secret.metadata, "annotations", None) or {}
+        data = json.loads(annotations.get(APPLIED_DIGESTS_ANNOTATION) or "{}")
+        return data if isinstance(data, dict) else {}
+    except Exception as e:
+        logger.debug("Could not read applied digests: %s", e)
+        return {}
+
+
+def record_applied_digests(
+    namespace: str,
+    secret_name: str,
+    digests: dict[str, str],
+    kube_v1: Optional[Any],
+    dry_run: bool = False,
+) -> bool:
+    if kube_v1 is None:
+        return False
+    if dry_run:
+        logger.warning("Dry-run: would record applied index digests")
+        return True
+    body = {
+        "metadata": {
+            "annotations": {
+                APPLIED_DIGESTS_ANNOTATION: json.dumps(digests, sort_keys=True)
+            }
+        }
+    }
+    try:
+        kube_v1.patch_namespaced_secret(secret_name, namespace, body)
+        return True
+    except Exception as e:
+        logger.warning("Warning: could not record applied index digests: %s", e)
+        return False
+
+
+def provision_index_data(
+    api: MeiliHttp,
+    plans: list[IndexPlan],
+    applied: dict[str, str],
+    batch_bytes: int = DEFAULT_SEED_BATCH_BYTES,
+    in_flight: int = DEFAULT_SEED_IN_FLIGHT,
+    timeout: float = SEED_TASK_TIMEOUT_SECONDS,
+) -> tuple[dict[str, str], bool]:
+    """Apply every plan whose digest changed since it was last applied.
+
+    Returns the digests to record and whether every plan succeeded; failed
+    plans keep their previous digest so the next run retries them.
+    """
+    digests = dict(applied)
+    ok = True
+    for plan in plans:
+        digest = plan.digest()
+        if applied.get(plan.uid) == digest:
+            logger.info("Index %s settings and seed unchanged; skipping", plan.uid)
+            continue
+        if apply_index_plan(api, plan, batch_bytes, in_flight, timeout):
+            digests[plan.uid] = digest
+            logger.info("Applied settings and seed for index %s", plan.uid)
+        else:
+            ok = False
+    return digests, ok
+
+
+def load_provisioning_config(path: str) -> dict[str, Any]:
+    with open(path, encoding="utf-8") as handle:
+        data = json.load(handle)
+    return data if isinstance(data, dict) else {}
+
+
+def provision_from_config(
+    config_path: str,
+    host: str,
+    master_key: Optional[str],
+    namespace: str,
+    secret_name: str,
+    kube_v1: Optional[Any] = None,
+    seed_dir: str = SEED_DIR,
+    dry_run: bool = False,
+    session: Optional[Any] = None,
+) -> bool:
+    """Apply the declared index settings and seeds from a JSON config file."""
+    config = load_provisioning_config(config_path)
+    plans = load_index_plans(config, seed_dir)
+    if not plans:
+        return True
+
+    seed = config.get("seed") or {}
+    batch_bytes = int(seed.get("batchBytes") or DEFAULT_SEED_BATCH_BYTES)
+    in_flight = int(seed.get("inFlight") or DEFAULT_SEED_IN_FLIGHT)
+    timeout = float(seed.get("taskTimeoutSeconds") or SEED_TASK_TIMEOUT_SECONDS)
+
+    applied = read_applied_digests(namespace, secret_name, kube_v1)
+    owned = session is None
+    session = session or create_http_session(in_flight)
+    try:
+        api = MeiliHttp(host, master_key, session)
+        digests, ok = provision_index_data(
+            api, plans, applied, batch_bytes, in_flight, timeout
+        )
+    finally:
+        if owned:
+            session.close()
+    if digests != applied:
+        record_applied_digests(namespace, secret_name, digests, kube_v1, dry_run)
+    return ok
 
 
 def create_api_key(
@@ -252,6 +1128,7 @@ def create_api_key(
     description: str,
     indexes: list[str],
     actions: list[str],
+    name: Optional[str] = None,
 ) -> str | None:
     """Create a new API key in Meilisearch using master key client."""
     # Clean and validate input
@@ -263,7 +1140,10 @@ def create_api_key(
 
     # Use a more specific name to make keys easier to match and avoid
     # multiple ambiguous "Provisioned API Key" entries.
-    specific_name = f"{description} ({os.getenv('NAMESPACE', 'default')}/{os.getenv('SECRET_NAME', 'meilisearch-api-key')})"
+    specific_name = (
+        name
+        or f"{description} ({os.getenv('NAMESPACE', 'default')}/{os.getenv('SECRET_NAME', 'meilisearch-api-key')})"
+    )
     try:
         response = client.create_key(
             options={
@@ -275,8 +1155,9 @@ def create_api_key(
             }
         )
 
-        # Response is a Key object with a .key attribute (str)
-        key = response.key  # type: ignore[attr-defined]
+        # Response is a Key object with a .key attribute (str), or a dict
+        # when it comes from MeiliHttp
+        key = _field(response, "key")
         if key and isinstance(key, str) and len(key) > 0:
             logger.info("API key created: %s...", key[:20])
             return key
@@ -295,8 +1176,12 @@ def patch_secret(
     kube_config: Optional[str] = None,
     kube_v1: Optional[Any] = None,
     dry_run: bool = False,
+    field: str = "api-key",
 ) -> bool:
-    """Patch the Kubernetes secret with the API key using the Python client."""
+    """Patch the Kubernetes secret with the API key using the Python client.
+
+    A secret that does not exist yet is created with just the key.
+    """
     try:
         # Use provided kube_v1 client when available to reuse connections
         if kube_v1 is not None:
@@ -311,15 +1196,9 @@ def patch_secret(
                 k8s_config.load_incluster_config()
             v1 = k8s_client.CoreV1Api()
 
-        # Get existing secret
-        secret = v1.read_namespaced_secret(secret_name, namespace)
-
-        # Update the api-key field
-        if getattr(secret, "data", None) is None:  # type: ignore[union-attr]
-            setattr(secret, "data", {})
-
-        # Encode the key as base64
-        secret.data["api-key"] = base64.b64encode(api_key.encode()).decode()  # type: ignore[index]
+        # Only the api-key field is sent, so the patch leaves the rest of
+        # the secret alone and serializes the same for either client
+        body = {"data": {field: base64.b64encode(api_key.encode()).decode()}}
 
         # Patch the secret
         if dry_run:
@@ -327,9 +1206,15 @@ def patch_secret(
                 "Dry-run: would patch secret %s in %s", secret_name, namespace
             )
         else:
-            v1.patch_namespaced_secret(secret_name, namespace, secret)
-
-        logger.info("Secret %s updated", secret_name)
+            try:
+                v1.patch_namespaced_secret(secret_name, namespace, body)
+            except Exception as e:
+                if getattr(e, "status", None) != 404:
+                    raise
+                body["metadata"] = {"name": secret_name, "namespace": namespace}
+                v1.create_namespaced_secret(namespace, body)
+
+        logger.info("Secret %s/%s updated", namespace, secret_name)
         return True
     except Exception as e:
         logger.error("Error updating secret: %s", e)
@@ -341,8 +1226,9 @@ def read_secret_api_key(
     secret_name: str,
     kube_config: Optional[str] = None,
     kube_v1: Optional[Any] = None,
+    field: str = "api-key",
 ) -> Optional[str]:
-    """Read `api-key` from a Kubernetes secret if present (returns decoded string).
+    """Read `api-key` (or `field`) from a Kubernetes secret if present (returns decoded string).
 
     Returns None if the secret or key is missing or on error.
     """
@@ -363,7 +1249,7 @@ def read_secret_api_key(
         data = getattr(secret, "data", None)
         if not data:
             return None
-        api_b64 = data.get("api-key") or data.get("api_key")
+        api_b64 = data.get(field) or data.get(field.replace("-", "_"))
         if not api_b64:
             return None
         try:
@@ -375,6 +1261,158 @@ def read_secret_api_key(
         return None
 
 
+@dataclass(frozen=True)
+class SecretTarget:
+    """A Secret field that receives a provisioned API key."""
+
+    namespace: str
+    name: str
+    key: str = "api-key"
+
+
+@dataclass(frozen=True)
+class KeySpec:
+    """An API key to provision and every Secret it is written to."""
+
+    description: str
+    indexes: tuple[str, ...]
+    actions: tuple[str, ...]
+    secrets: tuple[SecretTarget, ...]
+
+    @property
+    def name(self) -> str:
+        # Matches the name create_api_key gives single-secret keys.
+        target = self.secrets[0]
+        return f"{self.description} ({target.namespace}/{target.name})"
+
+    @classmethod
+    def from_mapping(cls, data: dict[str, Any], default_namespace: str) -> KeySpec:
+        description = data.get("description") or "Provisioned API Key"
+        secrets = tuple(
+            SecretTarget(
+                item.get("namespace") or default_namespace,
+                item["name"],
+                item.get("key") or "api-key",
+            )
+            for item in data.get("secrets") or []
+        )
+        if not secrets:
+            raise ValueError(f"key {description!r} has no target secrets")
+        indexes = [idx.strip() for idx in data.get("indexes") or ["*"] if idx.strip()]
+        actions = [act.strip() for act in data.get("actions") or ["*"] if act.strip()]
+        return cls(
+            description,
+            ("*",) if "*" in indexes else tuple(indexes),
+            ("*",) if "*" in actions else tuple(actions),
+            secrets,
+        )
+
+
+def load_key_specs(config: dict[str, Any], default_namespace: str) -> list[KeySpec]:
+    return [
+        KeySpec.from_mapping(item, default_namespace)
+        for item in config.get("keys") or []
+    ]
+
+
+def _map_concurrently(func: Any, items: list[Any]) -> list[Any]:
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(SECRET_WORKERS, len(items))) as pool:
+        return list(pool.map(func, items))
+
+
+def provision_keys(
+    client: MeiliClient,
+    host_url: str,
+    specs: list[KeySpec],
+    kube_v1: Any,
+    session: Any,
+    key_index: Optional[KeyIndex] = None,
+    dry_run: bool = False,
+) -> bool:
+    """Provision several keys and their Secrets from one key listing.
+
+    A key already held by one of the spec's Secrets, or named for the spec,
+    is kept while it still covers the spec's scope. Only keys named for the
+    spec are reused, so tenants never share a broader key. Missing keys are
+    created together, and every Secret whose value changes gets a
+    concurrent merge patch.
+    """
+    if key_index is None:
+        try:
+            key_index = KeyIndex.from_client(client)
+        except Exception as e:
+            logger.error("Failed to list keys: %s", e)
+            return False
+
+    targets = list(dict.fromkeys(t for spec in specs for t in spec.secrets))
+    current = dict(
+        zip(
+            targets,
+            _map_concurrently(
+                lambda t: read_secret_api_key(
+                    t.namespace, t.name, kube_v1=kube_v1, field=t.key
+                ),
+                targets,
+            ),
+        )
+    )
+
+    keys: dict[KeySpec, Optional[str]] = {}
+    for spec in specs:
+        held = [
+            key_index.by_key[value]
+            for value in dict.fromkeys(current[t] for t in spec.secrets)
+            if value in key_index.by_key
+        ]
+        named = key_index.by_name.get(spec.name, [])
+        wanted = (_scope(spec.indexes), _scope(spec.actions))
+        records = [r for r in dict.fromkeys(held + named) if r.covers(*wanted)]
+        record = first_valid_key(host_url, records, session, key_index)
+        keys[spec] = record.key if record is not None else None
+        if record is not None:
+            logger.info("Reusing API key %s for %s", record.key[:20], spec.name)
+
+    missing = [spec for spec, key in keys.items() if key is None]
+    if missing:
+        logger.info("Creating %d API keys...", len(missing))
+    created = _map_concurrently(
+        lambda spec: create_api_key(
+            client,
+            spec.description,
+            list(spec.indexes),
+            list(spec.actions),
+            name=spec.name,
+        ),
+        missing,
+    )
+    keys.update(zip(missing, created))
+
+    patches = [
+        (target, key)
+        for spec, key in keys.items()
+        if key
+        for target in spec.secrets
+        if current[target] != key
+    ]
+    patched = _map_concurrently(
+        lambda item: patch_secret(
+            item[0].namespace,
+            item[0].name,
+            item[1],
+            kube_v1=kube_v1,
+            dry_run=dry_run,
+            field=item[0].key,
+        ),
+        patches,
+    )
+    for spec, key in keys.items():
+        if not key:
+            logger.error("Failed to provision API key for %s", spec.name)
+    return all(keys.values()) and all(patched)
+
+
 def main():
     """Main provisioning flow."""
     logger.info("Meilisearch API Key Provisioner")
@@ -397,6 +1435,19 @@ def main():
     parser.add_argument("--api-key-indexes", default=os.getenv("API_KEY_INDEXES", "*"))
     parser.add_argument("--api-key-actions", default=os.getenv("API_KEY_ACTIONS", "*"))
     parser.add_argument("--kube-config", default=os.getenv("KUBECONFIG", None))
+    parser.add_argument(
+        "--config",
+        default=os.getenv("PROVISIONING_CONFIG"),
+        help="JSON file with indexSettings and seed sources to apply",
+    )
+    parser.add_argument("--seed-dir", default=os.getenv("SEED_DIR", SEED_DIR))
+    parser.add_argument(
+        "--lightweight",
+        action="store_true",
+        default=os.getenv("PROVISIONER_LIGHTWEIGHT", "").lower() in ("1", "true"),
+        help="Use the built-in stdlib clients instead of the meilisearch and "
+        "kubernetes packages (in-cluster service account auth only)",
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -415,6 +1466,10 @@ def main():
     key_actions_input = args.api_key_actions.split(",")
     kube_config = args.kube_config
     dry_run = args.dry_run
+    lightweight = args.lightweight
+    if lightweight and kube_config:
+        logger.warning("Lightweight mode needs in-cluster auth; ignoring KUBECONFIG")
+        lightweight = False
 
     # Use ["*"] if the input contains "*" to allow all
     key_indexes = ["*"] if "*" in key_indexes_input else key_indexes_input
@@ -431,9 +1486,17 @@ def main():
         ",".join(key_actions),
     )
 
-    # Use context managers to reuse clients
-    with meili_client_ctx(meili_host, meili_master_key) as master_client:
-        with kube_client_ctx(kube_config) as kube_v1:
+    # Use context managers to reuse clients and connections
+    with closing(create_http_session(lightweight=lightweight)) as session:
+        if lightweight:
+            meili_ctx: Any = nullcontext(
+                MeiliHttp(meili_host, meili_master_key, session)
+            )
+            kube_ctx: Any = closing(KubeApi.in_cluster())
+        else:
+            meili_ctx = meili_client_ctx(meili_host, meili_master_key)
+            kube_ctx = kube_client_ctx(kube_config)
+        with meili_ctx as master_client, kube_ctx as kube_v1:
             # Wait for Meilisearch
             if not wait_for_meilisearch(master_client):
                 logger.error("Error: Meilisearch is not responding")
@@ -448,10 +1511,51 @@ def main():
             # Ensure requested indexes exist (creates missing ones)
             ensure_indexes(master_client, key_indexes)
 
+            # Apply declared index settings and seed documents
+            key_specs: list[KeySpec] = []
+            if args.config and os.path.exists(args.config):
+                key_specs = load_key_specs(
+                    load_provisioning_config(args.config), namespace
+                )
+                if not provision_from_config(
+                    args.config,
+                    meili_host,
+                    meili_master_key,
+                    namespace,
+                    secret_name,
+                    kube_v1=kube_v1,
+                    seed_dir=args.seed_dir,
+                    dry_run=dry_run,
+                    session=session,
+                ):
+                    logger.error("Error: Failed to apply index settings or seeds")
+                    sys.exit(1)
+
+            try:
+                key_index: Optional[KeyIndex] = KeyIndex.from_client(master_client)
+            except Exception as e:
+                logger.warning("Warning: failed to list keys: %s", e)
+                key_index = None
+
+            # Provision the additional keys declared in the config
+            if key_specs:
+                logger.info("Provisioning %d declared API keys...", len(key_specs))
+                if not provision_keys(
+                    master_client,
+                    meili_host,
+                    key_specs,
+                    kube_v1,
+                    session,
+                    key_index=key_index,
+                    dry_run=dry_run,
+                ):
+                    logger.error("Error: Failed to provision declared API keys")
+                    sys.exit(1)
+
             # Check for provided API key first
             if api_key_value:
                 logger.info("Validating provided API key...")
-                if validate_api_key(meili_host, api_key_value):
+                if validate_known_key(meili_host, api_key_value, session, key_index):
                     logger.info("Provided API key is valid")
                     logger.info("Provisioning complete!")
                     return
@@ -470,7 +1574,9 @@ def main():
                     namespace,
                     secret_name,
                 )
-                if validate_api_key(meili_host, existing_secret_key):
+                if validate_known_key(
+                    meili_host, existing_secret_key, session, key_index
+                ):
                     logger.info(
                         "Kubernetes secret contains a valid API key; provisioning complete"
                     )
@@ -483,9 +1589,17 @@ def main():
                     )
 
             # Try to find and reuse an existing key that matches our criteria
-            existing = find_matching_key(
-                master_client, meili_host, key_description, key_indexes, key_actions
-            )
+            existing = None
+            if key_index is not None:
+                existing = find_matching_key(
+                    master_client,
+                    meili_host,
+                    key_description,
+                    key_indexes,
+                    key_actions,
+                    session=session,
+                    key_index=key_index,
+                )
             if existing:
                 logger.info("Reusing existing matching API key")
                 if patch_secret(
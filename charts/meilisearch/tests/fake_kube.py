@@ -0,0 +1,115 @@
+"""In-process stand-in for the Kubernetes API server's Secret endpoints.
+
+Only bearer-token requests for namespaced Secrets are answered; PATCH
+applies JSON merge patch semantics and POST creates a Secret.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+
+def merge_patch(target: object, patch: object) -> object:
+    if not isinstance(patch, dict):
+        return patch
+    merged = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            merged.pop(key, None)
+        else:
+            merged[key] = merge_patch(merged.get(key), value)
+    return merged
+
+
+class FakeKubeApi(ThreadingHTTPServer):
+    def __init__(self, token: str = "sa-token") -> None:
+        super().__init__(("127.0.0.1", 0), FakeKubeApiHandler)
+        self.token = token
+        self.secrets: dict[tuple[str, str], dict] = {}
+        self.patches: list[tuple[str, dict]] = []
+        self.created: list[tuple[str, str]] = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self) -> FakeKubeApi:
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def process_request(self, request, client_address) -> None:
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def add_secret(self, namespace: str, name: str, data: dict | None = None) -> None:
+        self.secrets[(namespace, name)] = {
+            "metadata": {"name": name, "namespace": namespace},
+            "data": data or {},
+        }
+
+
+class FakeKubeApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeKubeApi
+
+    def log_message(self, *_args: object) -> None:
+        pass
+
+    def _reply(self, status: int, payload: object) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if self.headers.get("Authorization") != f"Bearer {self.server.token}":
+            return self._reply(401, {"kind": "Status", "code": 401})
+
+        segments = [unquote(s) for s in urlsplit(self.path).path.split("/") if s]
+        if segments[:3] != ["api", "v1", "namespaces"] or segments[4:5] != ["secrets"]:
+            return self._reply(404, {"kind": "Status", "code": 404})
+        if self.command == "POST" and len(segments) == 5:
+            secret = json.loads(body)
+            key = (segments[3], secret["metadata"]["name"])
+            with self.server.lock:
+                if key in self.server.secrets:
+                    return self._reply(409, {"kind": "Status", "code": 409})
+                self.server.created.append(key)
+                self.server.secrets[key] = secret
+            return self._reply(201, secret)
+        if len(segments) != 6:
+            return self._reply(404, {"kind": "Status", "code": 404})
+        key = (segments[3], segments[5])
+        secret = self.server.secrets.get(key)
+        if secret is None:
+            return self._reply(404, {"kind": "Status", "code": 404})
+
+        if self.command == "GET":
+            return self._reply(200, secret)
+        if self.command == "PATCH":
+            content_type = self.headers.get("Content-Type", "")
+            if content_type != "application/merge-patch+json":
+                return self._reply(415, {"kind": "Status", "code": 415})
+            patch = json.loads(body)
+            with self.server.lock:
+                self.server.patches.append((content_type, patch))
+                self.server.secrets[key] = merge_patch(secret, patch)
+            return self._reply(200, self.server.secrets[key])
+        return self._reply(405, {"kind": "Status", "code": 405})
+
+    do_GET = do_PATCH = do_POST = _handle
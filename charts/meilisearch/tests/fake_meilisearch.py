@@ -0,0 +1,160 @@
+"""In-process stand-in for the Meilisearch HTTP API used by the provisioner.
+
+Tasks succeed as soon as they are enqueued, and every request is recorded
+so tests can assert on how the provisioner talks to Meilisearch.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+class FakeMeilisearch(ThreadingHTTPServer):
+    def __init__(self, master_key: str = "master") -> None:
+        super().__init__(("127.0.0.1", 0), FakeMeilisearchHandler)
+        self.master_key = master_key
+        self.indexes: dict[str, dict] = {}
+        self.documents: dict[str, dict[str, dict]] = {}
+        self.batches: list[tuple[str, str, bytes]] = []
+        self.tasks: dict[int, dict] = {}
+        self.keys: list[dict] = []
+        self.requests: list[tuple[str, str]] = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self) -> FakeMeilisearch:
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def process_request(self, request, client_address) -> None:
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def enqueue(self, index: str, kind: str, error: dict | None = None) -> dict:
+        with self.lock:
+            uid = len(self.tasks)
+            self.tasks[uid] = {
+                "uid": uid,
+                "indexUid": index,
+                "type": kind,
+                "status": "failed" if error else "succeeded",
+                "error": error,
+            }
+        return {"taskUid": uid, "indexUid": index, "status": "enqueued"}
+
+    def create_key(self, options: dict) -> dict:
+        with self.lock:
+            number = len(self.keys)
+            key = {**options, "uid": f"uid-{number}", "key": f"key-{number}"}
+            self.keys.append(key)
+        return key
+
+    def add_documents(self, index: str, content_type: str, body: bytes) -> dict:
+        text = body.decode("utf-8")
+        if content_type == "text/csv":
+            rows = list(csv.DictReader(io.StringIO(text)))
+        else:
+            rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+        with self.lock:
+            self.batches.append((index, content_type, body))
+            self.indexes.setdefault(index, {})
+            store = self.documents.setdefault(index, {})
+            for row in rows:
+                store[str(row.get("id"))] = row
+        return self.enqueue(index, "documentAdditionOrUpdate")
+
+
+class FakeMeilisearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeMeilisearch
+
+    def log_message(self, *_args: object) -> None:
+        pass
+
+    def _reply(self, status: int, payload: object) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _page(self, items: list, query: dict[str, str]) -> None:
+        offset = int(query.get("offset", 0))
+        limit = int(query.get("limit", 20))
+        return self._reply(
+            200,
+            {
+                "results": items[offset : offset + limit],
+                "offset": offset,
+                "limit": limit,
+                "total": len(items),
+            },
+        )
+
+    def _handle(self) -> None:
+        parts = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        self.server.requests.append((self.command, parts.path))
+
+        if parts.path == "/health":
+            return self._reply(200, {"status": "available"})
+        segments = [unquote(segment) for segment in parts.path.split("/") if segment]
+        route = (self.command, *segments[:1], *segments[2:])
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        if route == ("POST", "multi-search") and any(
+            key["key"] == token for key in self.server.keys
+        ):
+            return self._reply(200, {"results": []})
+        if token != self.server.master_key:
+            return self._reply(403, {"code": "invalid_api_key"})
+
+        if route == ("GET", "version"):
+            return self._reply(200, {"pkgVersion": "1.11.0"})
+        if route == ("POST", "multi-search"):
+            return self._reply(200, {"results": []})
+        if route == ("GET", "keys"):
+            return self._page(self.server.keys, query)
+        if route == ("POST", "keys"):
+            return self._reply(201, self.server.create_key(json.loads(body)))
+        if route == ("GET", "indexes"):
+            uids = [{"uid": uid} for uid in sorted(self.server.indexes)]
+            return self._page(uids, query)
+        if route == ("POST", "indexes"):
+            index = json.loads(body)["uid"]
+            self.server.indexes.setdefault(index, {})
+            return self._reply(202, self.server.enqueue(index, "indexCreation"))
+        if route == ("GET", "tasks"):
+            uids = [int(uid) for uid in query.get("uids", "").split(",") if uid]
+            results = [
+                self.server.tasks[uid] for uid in uids if uid in self.server.tasks
+            ]
+            return self._reply(200, {"results": results, "total": len(results)})
+        if route == ("PATCH", "indexes", "settings"):
+            index = segments[1]
+            self.server.indexes.setdefault(index, {}).update(json.loads(body))
+            return self._reply(202, self.server.enqueue(index, "settingsUpdate"))
+        if route == ("POST", "indexes", "documents"):
+            content_type = self.headers.get("Content-Type", "")
+            task = self.server.add_documents(segments[1], content_type, body)
+            return self._reply(202, task)
+        return self._reply(404, {"code": "not_found", "path": parts.path})
+
+    do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _handle
@@ -1,4 +1,19 @@
+import base64
+import json
+import subprocess
+import sys
+import threading
+import time
+from contextlib import closing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
 import charts.meilisearch.resources.main as prov
+from charts.meilisearch.tests.fake_kube import FakeKubeApi
+from charts.meilisearch.tests.fake_meilisearch import FakeMeilisearch
 
 
 class DummyKey:
@@ -14,6 +29,12 @@ class DummyClient:
     def __init__(self, keys=None, existing_indexes=None):
         self._keys = keys or []
         self._indexes = set(existing_indexes or [])
+        self._tasks = {}
+        self._polled = set()
+        self._lock = threading.Lock()
+        self.created = []
+        self.index_pages = []
+        self.task_queries = []
 
     def get_keys(self):
         # return as list
@@ -31,6 +52,15 @@ class DummyClient:
             raise Exception("not found")
         return {"uid": uid}
 
+    def get_indexes(self, parameters):
+        uids = sorted(self._indexes)
+        offset, limit = parameters["offset"], parameters["limit"]
+        self.index_pages.append(offset)
+        return {
+            "results": [{"uid": uid} for uid in uids[offset : offset + limit]],
+            "total": len(uids),
+        }
+
     def create_index(self, *args, **kwargs):
         # accept uid kw or first arg
         if "uid" in kwargs:
@@ -39,8 +69,31 @@ class DummyClient:
             uid = args[0]
         else:
             raise TypeError("missing uid")
-        self._indexes.add(uid)
-        return {"uid": uid}
+        with self._lock:
+            self.created.append(uid)
+            task_uid = len(self._tasks)
+            self._tasks[task_uid] = uid
+        return {"taskUid": task_uid}
+
+    def get_tasks(self, parameters):
+        # Like the SDK, join list values with ",".join, which rejects non-str
+        # items. Tasks finish on the second poll, applying their index then.
+        parameters = {
+            key: ",".join(value) if isinstance(value, list) else value
+            for key, value in parameters.items()
+        }
+        task_uids = [int(uid) for uid in str(parameters["uids"]).split(",")]
+        self.task_queries.append(task_uids)
+        results = []
+        for task_uid in task_uids:
+            done = task_uid in self._polled
+            self._polled.add(task_uid)
+            if done:
+                self._indexes.add(self._tasks[task_uid])
+            results.append(
+                {"uid": task_uid, "status": "succeeded" if done else "enqueued"}
+            )
+        return {"results": results}
 
 
 def test_find_matching_key_by_description(monkeypatch):
@@ -49,7 +102,7 @@ def test_find_matching_key_by_description(monkeypatch):
     )
 
     # patch validate_api_key to return True for this key
-    monkeypatch.setattr(prov, "validate_api_key", lambda url, k: True)
+    monkeypatch.setattr(prov, "validate_api_key", lambda url, k, **_: True)
 
     found = prov.find_matching_key(c, "http://dummy", "my-key", ["a"], ["read"])
     assert found == "ABC123"
@@ -63,7 +116,7 @@ def test_find_matching_key_by_superset(monkeypatch):
             )
         ]
     )
-    monkeypatch.setattr(prov, "validate_api_key", lambda url, k: True)
+    monkeypatch.setattr(prov, "validate_api_key", lambda url, k, **_: True)
     found = prov.find_matching_key(c, "http://dummy", "notfound", ["a"], ["read"])
     assert found == "XYZ789"
 
@@ -73,6 +126,23 @@ def test_ensure_indexes_creates_missing():
     prov.ensure_indexes(c, ["a", "b"])  # should create b
     # client should now report index b exists
     assert "b" in c._indexes
+    assert c.created == ["b"]
+
+
+def test_ensure_indexes_lists_once_and_waits_for_all_tasks(monkeypatch):
+    monkeypatch.setattr(prov, "TASK_POLL_SECONDS", 0)
+    existing = [f"tenant-{n:03d}" for n in range(150)]
+    c = DummyClient(existing_indexes=existing)
+    wanted = existing[:5] + [f"new-{n}" for n in range(20)]
+
+    prov.ensure_indexes(c, wanted)
+
+    assert c.index_pages == [0, 100]
+    assert sorted(c.created) == sorted(wanted[5:])
+    # One batched query per poll covering every enqueued task.
+    assert len(c.task_queries) == 2
+    assert sorted(c.task_queries[0]) == list(range(20))
+    assert set(wanted) <= c._indexes
 
 
 def test_ensure_indexes_skip_wildcard(capfd):
@@ -80,3 +150,396 @@ def test_ensure_indexes_skip_wildcard(capfd):
     prov.ensure_indexes(c, ["*"])
     captured = capfd.readouterr()
     assert "Index creation skipped" in captured.out
+
+
+class PagedClient:
+    def __init__(self, keys):
+        self._keys = keys
+        self.pages = []
+
+    def get_keys(self, parameters):
+        offset, limit = parameters["offset"], parameters["limit"]
+        self.pages.append(offset)
+        return {
+            "results": self._keys[offset : offset + limit],
+            "offset": offset,
+            "limit": limit,
+            "total": len(self._keys),
+        }
+
+
+def test_find_matching_key_pages_once_and_prefers_named_keys(monkeypatch):
+    keys = [
+        {"key": f"K{n:03d}", "name": f"k{n}", "indexes": ["*"], "actions": ["*"]}
+        for n in range(250)
+    ]
+    keys[240].update(name="wanted", expiresAt="2020-01-01T00:00:00Z")
+    keys[245].update(name="wanted", expiresAt="2999-01-01T00:00:00.123456789Z")
+    client = PagedClient(keys)
+    checked = []
+
+    def validate(url, key, **_kwargs):
+        checked.append(key)
+        return True
+
+    monkeypatch.setattr(prov, "validate_api_key", validate)
+    found = prov.find_matching_key(client, "http://dummy", "wanted", ["a"], ["read"])
+
+    # Listed keys are trusted until they expire, so nothing is probed.
+    assert found == "K245"
+    assert checked == []
+    assert client.pages == [0, 100, 200]
+
+
+def test_first_valid_key_keeps_record_order_for_probed_keys(monkeypatch):
+    def validate(url, key, **_kwargs):
+        # The first key answers last.
+        time.sleep(0.2 if key == "slow" else 0)
+        return True
+
+    monkeypatch.setattr(prov, "validate_api_key", validate)
+    records = [
+        prov.KeyRecord(key=key, name=key, indexes=None, actions=None)
+        for key in ("slow", "fast")
+    ]
+
+    assert prov.first_valid_key("http://dummy", records, None).key == "slow"
+
+
+def test_validate_api_key_probes_an_endpoint_the_key_may_call():
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *_args):
+            pass
+
+        def _reply(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            requests_seen.append((self.command, self.path, body))
+            allowed = (self.command, self.path) == ("POST", "/multi-search")
+            valid = self.headers.get("Authorization") == "Bearer good"
+            self.send_response(200 if allowed and valid else 403)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        do_GET = do_POST = _reply
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with closing(prov.create_http_session()) as session:
+            assert prov.validate_api_key(
+                url, "good", session=session, actions=["search"], indexes=["movies"]
+            )
+            assert not prov.validate_api_key(
+                url, "bad", session=session, actions=["search"], indexes=["movies"]
+            )
+            assert not prov.validate_api_key(url, "good", session=session)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert requests_seen[0] == ("POST", "/multi-search", b'{"queries": []}')
+    assert requests_seen[-1][:2] == ("GET", "/version")
+
+
+def test_probe_request_has_no_probe_for_write_only_keys():
+    assert prov.probe_request(["documents.add", "indexes.create"], ["movies"]) is None
+    assert prov.validate_api_key("http://127.0.0.1:9", "key", actions=["documents.add"])
+
+
+class FakeKube:
+    def __init__(self):
+        self.annotations = {}
+
+    def read_namespaced_secret(self, name, namespace):
+        metadata = SimpleNamespace(annotations=dict(self.annotations))
+        return SimpleNamespace(metadata=metadata, data={})
+
+    def patch_namespaced_secret(self, name, namespace, body):
+        self.annotations.update(body["metadata"]["annotations"])
+
+
+def test_provision_from_config_seeds_in_batches_and_skips_unchanged(tmp_path):
+    seed_dir = tmp_path / "seed"
+    seed_dir.mkdir()
+    (seed_dir / "movies.ndjson").write_text(
+        "".join(json.dumps({"id": n, "title": f"Movie {n}"}) + "\n" for n in range(50)),
+        encoding="utf-8",
+    )
+    (seed_dir / "books.csv").write_text(
+        "id,title\n" + "".join(f'{n},"Book {n}\nsecond line"\n' for n in range(30)),
+        encoding="utf-8",
+    )
+    config_path = tmp_path / "provisioning.json"
+    config = {
+        "indexSettings": {"movies": {"sortableAttributes": ["title"]}},
+        "seed": {
+            "batchBytes": 400,
+            "inFlight": 3,
+            "sources": [
+                {"index": "movies", "path": "movies.ndjson", "primaryKey": "id"},
+                {"index": "books", "path": "books.csv"},
+            ],
+        },
+    }
+    config_path.write_text(json.dumps(config), encoding="utf-8")
+    kube = FakeKube()
+
+    def provision(server):
+        return prov.provision_from_config(
+            str(config_path),
+            server.url,
+            "master",
+            "default",
+            "meilisearch-api-key",
+            kube_v1=kube,
+            seed_dir=str(seed_dir),
+        )
+
+    with FakeMeilisearch() as server:
+        assert provision(server)
+
+        assert server.indexes["movies"] == {"sortableAttributes": ["title"]}
+        assert len(server.documents["movies"]) == 50
+        assert server.documents["books"]["7"]["title"] == "Book 7\nsecond line"
+        for index, content_type, body in server.batches:
+            assert len(body) <= 400
+            if content_type == "text/csv":
+                assert body.startswith(b"id,title\n")
+        assert len([b for b in server.batches if b[0] == "books"]) > 1
+
+        server.requests.clear()
+        assert provision(server)
+        assert server.requests == []
+
+        (seed_dir / "books.csv").write_text('id,title\n99,"New"\n', encoding="utf-8")
+        assert provision(server)
+        assert ("POST", "/indexes/movies/documents") not in server.requests
+        assert ("POST", "/indexes/books/documents") in server.requests
+        assert server.documents["books"]["99"]["title"] == "New"
+
+
+def test_apply_index_plan_stops_seeding_after_a_failed_batch(tmp_path):
+    seed = tmp_path / "movies.ndjson"
+    seed.write_text(
+        "".join(json.dumps({"id": n}) + "\n" for n in range(20)), encoding="utf-8"
+    )
+
+    class FailingApi:
+        def __init__(self):
+            self.uploads = 0
+
+        def add_documents(self, *_args):
+            self.uploads += 1
+            if self.uploads == 2:
+                raise prov.HttpError(413, "/indexes/movies/documents")
+            return {"taskUid": self.uploads}
+
+    api = FailingApi()
+    plan = prov.IndexPlan(
+        "movies", sources=[prov.SeedSource("movies", str(seed), "ndjson")]
+    )
+
+    assert prov.apply_index_plan(api, plan, batch_bytes=20, in_flight=1) is False
+    assert api.uploads == 2
+
+
+def test_lightweight_main_provisions_over_reused_connections(monkeypatch):
+    with FakeMeilisearch() as meili, FakeKubeApi() as kube:
+        kube.add_secret("search", "meilisearch-api-key")
+        monkeypatch.setattr(
+            prov.KubeApi,
+            "in_cluster",
+            classmethod(lambda cls: cls(kube.url, "sa-token", prov.StdlibSession())),
+        )
+        monkeypatch.setattr(prov, "TASK_POLL_SECONDS", 0)
+        monkeypatch.delenv("KUBECONFIG", raising=False)
+        monkeypatch.delenv("PROVISIONING_CONFIG", raising=False)
+        monkeypatch.setenv("MEILI_HOST", meili.url)
+        monkeypatch.setenv("MEILI_MASTER_KEY", "master")
+        monkeypatch.setenv("NAMESPACE", "search")
+        monkeypatch.setenv("API_KEY_INDEXES", "movies,books")
+        monkeypatch.setenv("API_KEY_ACTIONS", "search")
+        monkeypatch.setattr(sys, "argv", ["main.py", "--lightweight"])
+
+        prov.main()
+
+        assert set(meili.indexes) == {"movies", "books"}
+        assert [key["actions"] for key in meili.keys] == [["search"]]
+        secret = kube.secrets[("search", "meilisearch-api-key")]
+        assert base64.b64decode(secret["data"]["api-key"]).decode() == "key-0"
+        # The main thread's connection, plus one per index creation worker.
+        assert meili.connections <= 3 < len(meili.requests)
+        assert kube.connections == 1
+
+
+# Measured at roughly 130ms on a warm cache, site included; the budget leaves
+# room for slow CI runners while still failing if an SDK import creeps back in.
+LIGHTWEIGHT_IMPORT_BUDGET_US = 250_000
+HEAVY_MODULES = {"kubernetes", "meilisearch", "requests", "urllib3"}
+
+
+def test_lightweight_import_time_stays_within_budget():
+    # Run like the Job's plain ``python3 /scripts/main.py``: site and the
+    # environment are loaded and main is imported from its own directory.
+    script = (
+        "import main; main.create_http_session(lightweight=True).close(); "
+        "import http.client, ssl"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=Path(prov.__file__).parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    total = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        imported.add(name.strip().split(".")[0])
+        if not name.startswith("  "):
+            total += int(cumulative)
+    assert not imported & HEAVY_MODULES
+    assert total < LIGHTWEIGHT_IMPORT_BUDGET_US, f"lightweight import took {total}us"
+
+
+def test_stdlib_session_drops_a_connection_that_timed_out():
+    class SlowHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *_args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/slow":
+                time.sleep(0.5)
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    session = prov.StdlibSession()
+    try:
+        with pytest.raises(TimeoutError):
+            session.request("GET", f"{base_url}/slow", timeout=0.1)
+        assert session._local.connections == {}
+        assert session._open == []
+
+        # The next request opens a fresh socket instead of reading the stale reply.
+        response = session.request("GET", f"{base_url}/fast")
+        assert (response.status_code, response.content) == (200, b"ok")
+    finally:
+        session.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_provision_keys_lists_once_and_merge_patches_every_target():
+    with (
+        FakeMeilisearch() as meili,
+        FakeKubeApi() as kube,
+        closing(prov.StdlibSession()) as session,
+    ):
+        api = prov.MeiliHttp(meili.url, "master", session)
+        kube_v1 = prov.KubeApi(kube.url, "sa-token", session)
+        wiki = meili.create_key(
+            {
+                "name": "Wiki (wiki/wiki-meili)",
+                "indexes": ["wiki"],
+                "actions": ["search"],
+            }
+        )
+        shop = meili.create_key(
+            {"name": "legacy", "indexes": ["shop"], "actions": ["search"]}
+        )
+        encoded = base64.b64encode(shop["key"].encode()).decode()
+        kube.add_secret("wiki", "wiki-meili", {"other": "a2VlcA=="})
+        kube.add_secret("shop", "shop-meili", {"api-key": encoded})
+        kube.add_secret("blog", "blog-meili")
+        config = {
+            "keys": [
+                {
+                    "description": "Wiki",
+                    "indexes": ["wiki"],
+                    "actions": ["search"],
+                    "secrets": [{"namespace": "wiki", "name": "wiki-meili"}],
+                },
+                {
+                    "description": "Shop",
+                    "indexes": ["shop"],
+                    "actions": ["search"],
+                    "secrets": [{"name": "shop-meili"}],
+                },
+                {
+                    "description": "Blog",
+                    "indexes": ["blog", "*"],
+                    "actions": ["search"],
+                    "secrets": [
+                        {"namespace": "blog", "name": "blog-meili"},
+                        {"namespace": "blog-preview", "name": "meili", "key": "key"},
+                    ],
+                },
+            ]
+        }
+        specs = prov.load_key_specs(config, "shop")
+
+        assert prov.provision_keys(api, meili.url, specs, kube_v1, session)
+
+        assert meili.requests.count(("GET", "/keys")) == 1
+        assert [key["name"] for key in meili.keys[2:]] == ["Blog (blog/blog-meili)"]
+        assert meili.keys[2]["indexes"] == ["*"]
+
+        def stored(namespace, name, field="api-key"):
+            data = kube.secrets[(namespace, name)]["data"]
+            return base64.b64decode(data[field]).decode()
+
+        assert stored("wiki", "wiki-meili") == wiki["key"]
+        assert kube.secrets[("wiki", "wiki-meili")]["data"]["other"] == "a2VlcA=="
+        assert stored("shop", "shop-meili") == shop["key"]
+        assert stored("blog", "blog-meili") == stored("blog-preview", "meili", "key")
+        assert kube.created == [("blog-preview", "meili")]
+        # shop-meili already holds its key; blog-preview is created instead.
+        assert len(kube.patches) == 2
+        assert {content_type for content_type, _ in kube.patches} == {
+            "application/merge-patch+json"
+        }
+        assert all(list(patch) == ["data"] for _, patch in kube.patches)
+
+
+def test_provision_keys_reuses_a_write_only_key_on_the_next_run():
+    with (
+        FakeMeilisearch() as meili,
+        FakeKubeApi() as kube,
+        closing(prov.StdlibSession()) as session,
+    ):
+        api = prov.MeiliHttp(meili.url, "master", session)
+        kube_v1 = prov.KubeApi(kube.url, "sa-token", session)
+        kube.add_secret("etl", "etl-meili")
+        config = {
+            "keys": [
+                {
+                    "description": "ETL",
+                    "indexes": ["wiki"],
+                    "actions": ["documents.add"],
+                    "secrets": [{"name": "etl-meili"}],
+                }
+            ]
+        }
+        specs = prov.load_key_specs(config, "etl")
+
+        assert prov.provision_keys(api, meili.url, specs, kube_v1, session)
+        assert prov.provision_keys(api, meili.url, specs, kube_v1, session)
+
+        assert [key["name"] for key in meili.keys] == ["ETL (etl/etl-meili)"]
+        assert len(kube.patches) == 1
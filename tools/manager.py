@@ -6,7 +6,9 @@ import os
 import re
 import subprocess
 import sys
+from graphlib import TopologicalSorter
 from pathlib import Path
+from typing import Iterable
 
 
 REPO_ROOT = Path(__file__).resolve().parents[1]
@@ -16,15 +18,17 @@ if str(REPO_ROOT) not in sys.path:
 from tools.versioning.charts import (  # noqa: E402
     list_chart_dirs,
     load_chart_type,
+    local_dependency_graph,
     load_chart_version,
     refresh_dependency_locks,
     sync_local_dependency_versions,
     write_chart_version,
 )
 from tools.versioning.common import append_summary, bump_version, log, parse_semver  # noqa: E402
-from tools.versioning.git_ops import GitClient  # noqa: E402
-from tools.versioning.github_api import GitHubClient  # noqa: E402
+from tools.versioning.git_ops import GitClient, ref_digest  # noqa: E402
+from tools.versioning.github_api import GitHubClient, default_label_cache_path  # noqa: E402
 from tools.versioning.models import ChartUpdate, VersionBumpConfig  # noqa: E402
+from tools.versioning.plan_cache import PlanCache  # noqa: E402
 
 
 TAG_RE = re.compile(r"^(?P<chart>.+)-(?P<version>\d+\.\d+\.\d+)$")
@@ -35,9 +39,27 @@ class VersionBumpManager:
     def __init__(self, config: VersionBumpConfig) -> None:
         self.config = config
         self.git = GitClient(config.repo_root)
-        self.github = GitHubClient(config.owner_repo, config.github_token)
+        self.github = GitHubClient(
+            config.owner_repo, config.github_token, cache_path=config.label_cache
+        )
+        self._commit_texts: dict[tuple[str, Path], str] = {}
+        self._dependency_graph: dict[str, set[str]] | None = None
+        self._summary: list[str] = []
+        self._tags_digest: str | None = None
+        cache_dir = self.git.common_dir()
+        self.plan_cache = PlanCache(
+            cache_dir / "helm-charts" / "version-plan.json"
+            if config.use_plan_cache and (cache_dir / "HEAD").is_file()
+            else None
+        )
 
     def run(self) -> int:
+        try:
+            return self._run()
+        finally:
+            self.github.close()
+
+    def _run(self) -> int:
         if self.config.fetch_tags:
             try:
                 self.git.fetch_tags()
@@ -45,12 +67,20 @@ class VersionBumpManager:
                 log("WARNING", f"git fetch --tags failed: {exc}")
 
         latest_tags = self._build_latest_tag_map()
-        updates: list[ChartUpdate] = []
-
-        for chart_dir in list_chart_dirs(self.config.charts_root):
-            update = self._plan_chart_update(chart_dir, latest_tags)
-            if update is not None:
-                updates.append(update)
+        plan_key = self._plan_key()
+        cached = self.plan_cache.plan(plan_key) if plan_key else None
+        if cached is not None:
+            updates, summary = cached
+            log(
+                "INFO",
+                f"Nothing moved since the last run; reusing its plan ({len(updates)} updates).",
+            )
+            for line in summary:
+                append_summary(self.config.summary_file, line)
+        else:
+            updates = self._plan_updates(latest_tags)
+            if plan_key:
+                self.plan_cache.store_plan(plan_key, updates, self._summary)
 
         if self.config.dry_run:
             return 0
@@ -62,10 +92,51 @@ class VersionBumpManager:
         self._apply_updates(updates)
         return 0
 
+    def _plan_updates(
+        self, latest_tags: dict[str, tuple[str, str, tuple[int, int, int]]]
+    ) -> list[ChartUpdate]:
+        self._index_history(latest_tags)
+        chart_dirs = list_chart_dirs(self.config.charts_root)
+        self._prefetch_pr_labels(chart_dirs, latest_tags)
+        updates: list[ChartUpdate] = []
+
+        for chart_dir in chart_dirs:
+            update = self._plan_chart_update(chart_dir, latest_tags)
+            if update is not None:
+                updates.append(update)
+        return self._plan_cascade(updates, latest_tags)
+
+    def _summarize(self, line: str) -> None:
+        self._summary.append(line)
+        append_summary(self.config.summary_file, line)
+
+    def _plan_key(self) -> str | None:
+        """Key the plan by HEAD and tag state; None when it cannot be reused."""
+        head = self.git.head_commit()
+        if head is None or self._tags_digest is None:
+            return None
+        if not self.git.is_clean(self.config.charts_root):
+            return None
+        return f"{head}:{self._tags_digest}:{self.config.owner_repo}"
+
     def _build_latest_tag_map(self) -> dict[str, tuple[str, str, tuple[int, int, int]]]:
+        tag_refs = self.git.tag_refs()
+        if tag_refs is None:
+            return self._parse_latest_tags(self.git.list_tags("*-*"))
+
+        self._tags_digest = ref_digest(tag_refs)
+        latest = self.plan_cache.latest_tags(self._tags_digest)
+        if latest is None:
+            latest = self._parse_latest_tags(tag_refs)
+            self.plan_cache.store_latest_tags(self._tags_digest, latest)
+        return latest
+
+    def _parse_latest_tags(
+        self, tags: Iterable[str]
+    ) -> dict[str, tuple[str, str, tuple[int, int, int]]]:
         latest: dict[str, tuple[str, str, tuple[int, int, int]]] = {}
 
-        for tag in self.git.list_tags("*-*"):
+        for tag in tags:
             match = TAG_RE.match(tag)
             if match is None:
                 continue
@@ -82,6 +153,56 @@ class VersionBumpManager:
 
         return latest
 
+    def _index_history(
+        self, latest_tags: dict[str, tuple[str, str, tuple[int, int, int]]]
+    ) -> None:
+        tags = sorted(tag for tag, _version, _parsed in latest_tags.values())
+        if not tags:
+            return
+        try:
+            history = self.git.index_history(tags)
+        except subprocess.CalledProcessError as exc:
+            log("WARNING", f"Falling back to per-chart git queries: {exc}")
+            return
+        log("INFO", f"Indexed {len(history.commits)} commits since the oldest tag")
+
+    def _has_changes(self, latest_tag: str, chart_dir: Path) -> bool:
+        commits = self.git.indexed_commits(latest_tag, chart_dir)
+        if commits is None:
+            return self.git.has_changes(f"{latest_tag}..HEAD", chart_dir)
+        return bool(commits)
+
+    def _commit_text(self, latest_tag: str, chart_dir: Path) -> str:
+        key = (latest_tag, chart_dir)
+        if key not in self._commit_texts:
+            commits = self.git.indexed_commits(latest_tag, chart_dir)
+            if commits is None:
+                text = self.git.log_text(f"{latest_tag}..HEAD", chart_dir, "%s %b")
+            else:
+                text = "\n".join(commit.message for commit in commits)
+            self._commit_texts[key] = text
+        return self._commit_texts[key]
+
+    def _prefetch_pr_labels(
+        self,
+        chart_dirs: list[Path],
+        latest_tags: dict[str, tuple[str, str, tuple[int, int, int]]],
+    ) -> None:
+        if not self.config.owner_repo:
+            return
+        pull_requests: set[int] = set()
+        for chart_dir in chart_dirs:
+            latest = latest_tags.get(chart_dir.name)
+            if latest is None:
+                continue
+            commit_text = self._commit_text(latest[0], chart_dir)
+            pull_requests.update(
+                int(match.group(1)) for match in PR_RE.finditer(commit_text)
+            )
+        if pull_requests:
+            log("INFO", f"Resolving labels for {len(pull_requests)} pull requests")
+            self.github.prefetch_pr_labels(pull_requests)
+
     def _plan_chart_update(
         self,
         chart_dir: Path,
@@ -102,19 +223,31 @@ class VersionBumpManager:
                 f"Chart: {chart_name} - No previous tag found, skipping version bump."
             )
             log("WARNING", message)
-            append_summary(self.config.summary_file, f"- {message}")
+            self._summarize(f"- {message}")
             return None
 
-        latest_tag, latest_version, latest_tuple = latest
+        latest_tag, latest_version, _ = latest
         log("INFO", f"Latest tag found: {latest_tag} (version: {latest_version})")
 
-        if not self.git.has_changes(f"{latest_tag}..HEAD", chart_dir):
+        if not self._has_changes(latest_tag, chart_dir):
             message = f"Chart: {chart_name} - No changes since last release, skipping version bump."
             log("INFO", message)
-            append_summary(self.config.summary_file, f"- {message}")
+            self._summarize(f"- {message}")
             return None
 
         bump = self._determine_bump(latest_tag, chart_dir)
+        return self._build_update(chart_dir, latest, bump)
+
+    def _build_update(
+        self,
+        chart_dir: Path,
+        latest: tuple[str, str, tuple[int, int, int]],
+        bump: str,
+        reason: str = "",
+    ) -> ChartUpdate | None:
+        chart_name = chart_dir.name
+        chart_yaml = chart_dir / "Chart.yaml"
+        _latest_tag, latest_version, latest_tuple = latest
         current_version = load_chart_version(chart_yaml)
         current_tuple = parse_semver(current_version or "0.0.0") or (0, 0, 0)
         base_version = (
@@ -128,14 +261,10 @@ class VersionBumpManager:
         log("INFO", f"Determined bump type: {bump}")
         log("INFO", f"Target version: {new_version}")
 
-        append_summary(
-            self.config.summary_file,
-            f"- Chart: {chart_name} - Bump type: {bump} - New version: {new_version}",
+        self._summarize(
+            f"- Chart: {chart_name} - Bump type: {bump} - New version: {new_version}{reason}",
         )
 
-        if self.config.dry_run:
-            return None
-
         if current_version and (parse_semver(current_version) or (0, 0, 0)) >= (
             parse_semver(new_version) or (0, 0, 0)
         ):
@@ -154,9 +283,62 @@ class VersionBumpManager:
             bump=bump,
         )
 
+    def _plan_cascade(
+        self,
+        updates: list[ChartUpdate],
+        latest_tags: dict[str, tuple[str, str, tuple[int, int, int]]],
+    ) -> list[ChartUpdate]:
+        """Add patch bumps for every chart that transitively depends on an update.
+
+        The reverse ``file://`` dependency graph is walked once, so a whole
+        chain of dependents is released in the same commit. Updates come
+        back in topological order, dependencies first.
+        """
+        self._dependency_graph = local_dependency_graph(self.config.charts_root)
+        dependents: dict[str, set[str]] = {}
+        for chart_name, dependencies in self._dependency_graph.items():
+            for dependency in dependencies:
+                dependents.setdefault(dependency, set()).add(chart_name)
+
+        planned = {update.chart_name: update for update in updates}
+        visited = set(planned)
+        pending = sorted(planned)
+        while pending:
+            dependency = pending.pop()
+            for chart_name in sorted(dependents.get(dependency, ())):
+                if chart_name in visited:
+                    continue
+                visited.add(chart_name)
+                latest = latest_tags.get(chart_name)
+                if latest is None:
+                    log(
+                        "WARNING",
+                        f"{chart_name} depends on {dependency} but has no previous tag, skipping cascade bump.",
+                    )
+                    continue
+                log("INFO", f"Cascading bump to {chart_name} (depends on {dependency})")
+                update = self._build_update(
+                    self.config.charts_root / chart_name,
+                    latest,
+                    "patch",
+                    f" - Cascaded from: {dependency}",
+                )
+                if update is not None:
+                    planned[chart_name] = update
+                    pending.append(chart_name)
+
+        order = self._topological_order()
+        return sorted(planned.values(), key=lambda update: order[update.chart_name])
+
+    def _topological_order(self) -> dict[str, int]:
+        if self._dependency_graph is None:
+            self._dependency_graph = local_dependency_graph(self.config.charts_root)
+        sorter = TopologicalSorter(self._dependency_graph)
+        return {name: index for index, name in enumerate(sorter.static_order())}
+
     def _determine_bump(self, latest_tag: str, chart_dir: Path) -> str:
         bump = "patch"
-        commit_text = self.git.log_text(f"{latest_tag}..HEAD", chart_dir, "%s %b")
+        commit_text = self._commit_text(latest_tag, chart_dir)
         pull_requests = {int(match.group(1)) for match in PR_RE.finditer(commit_text)}
 
         for pull_request in pull_requests:
@@ -178,10 +360,16 @@ class VersionBumpManager:
             write_chart_version(update.chart_yaml, update.new_version)
 
         bumped_versions = {update.chart_name: update.new_version for update in updates}
-        dependency_chart_dirs = sync_local_dependency_versions(
-            self.config.charts_root, bumped_versions
+        # bumped_versions already holds the whole cascade, so one pass over
+        # the dependents settles every chain; locks follow dependency order.
+        order = self._topological_order()
+        dependency_chart_dirs = sorted(
+            sync_local_dependency_versions(self.config.charts_root, bumped_versions),
+            key=lambda chart_dir: order.get(chart_dir.name, len(order)),
+        )
+        refreshed_lockfiles = refresh_dependency_locks(
+            dependency_chart_dirs, verify=self.config.verify_locks
         )
-        refreshed_lockfiles = refresh_dependency_locks(dependency_chart_dirs)
 
         staged_paths = {update.chart_yaml for update in updates}
         for chart_dir in dependency_chart_dirs:
@@ -233,6 +421,9 @@ def build_config(args: argparse.Namespace) -> VersionBumpConfig:
         owner_repo=os.environ.get("GITHUB_REPOSITORY", ""),
         github_token=os.environ.get("GH_TOKEN") or os.environ.get("GITHUB_TOKEN"),
         summary_file=summary_path,
+        label_cache=args.label_cache,
+        verify_locks=args.verify_locks,
+        use_plan_cache=not args.no_plan_cache,
     )
 
 
@@ -265,6 +456,22 @@ def parse_args() -> argparse.Namespace:
         default=None,
         help="Optional GitHub Actions summary file to append dry-run output to.",
     )
+    parser.add_argument(
+        "--no-plan-cache",
+        action="store_true",
+        help="Re-plan every chart even if HEAD and the tags have not moved.",
+    )
+    parser.add_argument(
+        "--verify-locks",
+        action="store_true",
+        help="Run helm dependency build on regenerated Chart.lock files.",
+    )
+    parser.add_argument(
+        "--label-cache",
+        type=Path,
+        default=default_label_cache_path(),
+        help="JSON file caching labels of merged pull requests between runs.",
+    )
     return parser.parse_args()
 
 
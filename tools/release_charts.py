@@ -2,16 +2,22 @@
 from __future__ import annotations
 
 import argparse
+import base64
 import hashlib
 import json
 import os
+import re
 import shutil
 import subprocess
 import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 from urllib import error, parse, request
 
 import yaml
@@ -23,6 +29,14 @@ DEFAULT_PACKAGE_DIR = REPO_ROOT / ".cr-release-packages"
 DEFAULT_INDEX_WORKTREE = REPO_ROOT / ".cr-index"
 DEFAULT_PAGES_BRANCH = "gh-pages"
 DEFAULT_INDEX_PATH = Path("index.yaml")
+PAGES_SPARSE_PATHS = ("/charts-data.json", "/index.html", "/search-index.json")
+SEARCH_TOKEN_RE = re.compile(r"[a-z0-9]+")
+CAMEL_CASE_RE = re.compile(r"([a-z0-9])([A-Z])")
+SEARCH_PREFIX_MIN_LENGTH = 2
+DEFAULT_OCI_CONCURRENCY = 8
+HELM_CONFIG_MEDIA_TYPE = "application/vnd.cncf.helm.config.v1+json"
+HELM_CHART_LAYER_MEDIA_TYPE = "application/vnd.cncf.helm.chart.content.v1.tar+gzip"
+OCI_MANIFEST_MEDIA_TYPE = "application/vnd.oci.image.manifest.v1+json"
 
 
 @dataclass(frozen=True)
@@ -119,6 +133,7 @@ def discover_packages(package_dir: Path) -> list[ChartPackage]:
     return packages
 
 
+@lru_cache(maxsize=None)
 def semver_key(version: str) -> tuple[int, Version | str]:
     try:
         return (1, Version(version))
@@ -126,6 +141,29 @@ def semver_key(version: str) -> tuple[int, Version | str]:
         return (0, version)
 
 
+def index_entry_sort_key(version_info: dict[str, Any]) -> tuple[int, Version | str]:
+    return semver_key(str(version_info.get("version", "")))
+
+
+def group_packages_by_chart(
+    packages: list[ChartPackage],
+) -> dict[str, dict[str, ChartPackage]]:
+    grouped: dict[str, dict[str, ChartPackage]] = {}
+    for package in packages:
+        grouped.setdefault(package.name, {})[package.version] = package
+    return grouped
+
+
+def build_index_entry(package: ChartPackage, owner: str, repo: str) -> dict[str, Any]:
+    entry = dict(package.metadata)
+    entry["digest"] = package.digest
+    entry["created"] = package.created
+    entry["urls"] = [
+        f"https://github.com/{owner}/{repo}/releases/download/{package.tag_name}/{package.filename}"
+    ]
+    return entry
+
+
 def merge_index(
     existing_index: dict[str, Any],
     packages: list[ChartPackage],
@@ -142,33 +180,65 @@ def merge_index(
                     version for version in versions if isinstance(version, dict)
                 ]
 
-    for package in packages:
-        chart_versions = merged_entries.setdefault(package.name, [])
-        filtered_versions = [
-            version_info
-            for version_info in chart_versions
-            if version_info.get("version") != package.version
-        ]
-        entry = dict(package.metadata)
-        entry["digest"] = package.digest
-        entry["created"] = package.created
-        entry["urls"] = [
-            f"https://github.com/{owner}/{repo}/releases/download/{package.tag_name}/{package.filename}"
-        ]
-        filtered_versions.append(entry)
-        filtered_versions.sort(
-            key=lambda version_info: semver_key(str(version_info.get("version", ""))),
-            reverse=True,
+    changed = False
+    for chart_name, chart_packages in group_packages_by_chart(packages).items():
+        by_version = {
+            str(version_info.get("version", "")): version_info
+            for version_info in merged_entries.get(chart_name, [])
+        }
+
+        chart_changed = False
+        for version, package in chart_packages.items():
+            current = by_version.get(version)
+            if current is not None and current.get("digest") == package.digest:
+                continue
+            by_version[version] = build_index_entry(package, owner, repo)
+            chart_changed = True
+
+        if not chart_changed:
+            continue
+
+        changed = True
+        merged_entries[chart_name] = sorted(
+            by_version.values(), key=index_entry_sort_key, reverse=True
         )
-        merged_entries[package.name] = filtered_versions
+
+    generated = existing_index.get("generated")
+    if changed or not isinstance(generated, str):
+        generated = utc_timestamp()
 
     return {
         "apiVersion": existing_index.get("apiVersion", "v1"),
         "entries": dict(sorted(merged_entries.items())),
-        "generated": utc_timestamp(),
+        "generated": generated,
     }
 
 
+def split_published_packages(
+    existing_index: dict[str, Any], packages: list[ChartPackage]
+) -> tuple[list[ChartPackage], list[ChartPackage]]:
+    """Split packages into (pending, published) by their recorded index digest."""
+    entries = existing_index.get("entries")
+    recorded: dict[tuple[str, str], Any] = {}
+    if isinstance(entries, dict):
+        for chart_name, versions in entries.items():
+            if not isinstance(versions, list):
+                continue
+            for version_info in versions:
+                if isinstance(version_info, dict):
+                    version = str(version_info.get("version", ""))
+                    recorded[(chart_name, version)] = version_info.get("digest")
+
+    pending: list[ChartPackage] = []
+    published: list[ChartPackage] = []
+    for package in packages:
+        if recorded.get((package.name, package.version)) == package.digest:
+            published.append(package)
+        else:
+            pending.append(package)
+    return pending, published
+
+
 class GitHubClient:
     def __init__(self, owner: str, repo: str, token: str, api_base_url: str) -> None:
         self.owner = owner
@@ -250,6 +320,43 @@ class GitHubClient:
         log(f"Creating GitHub release {tag}")
         return self.create_release(tag, target_commitish)
 
+    def delete_release_asset(self, asset: dict[str, Any]) -> None:
+        asset_id = asset.get("id")
+        if not isinstance(asset_id, int):
+            raise RuntimeError(f"Missing id for release asset {asset.get('name')}")
+        self._request(
+            "DELETE",
+            f"{self.api_base_url}/repos/{self.owner}/{self.repo}/releases/assets/{asset_id}",
+            payload=None,
+            content_type=None,
+        )
+
+    def release_asset_digest(
+        self, asset: dict[str, Any], package: ChartPackage
+    ) -> str | None:
+        """Hash an asset GitHub lists without a digest.
+
+        Only an asset of the local package's size is downloaded; None means
+        it is known or assumed to differ.
+        """
+        url = asset.get("url")
+        if asset.get("size") != package.path.stat().st_size or not isinstance(url, str):
+            return None
+        try:
+            status, body = self._request(
+                "GET",
+                url,
+                payload=None,
+                content_type=None,
+                accept="application/octet-stream",
+            )
+        except RuntimeError as exc:
+            log(f"Could not download {package.filename} to compare it: {exc}")
+            return None
+        if status != 200 or not isinstance(body, bytes):
+            return None
+        return f"sha256:{hashlib.sha256(body).hexdigest()}"
+
     def upload_release_asset(
         self, release: dict[str, Any], package: ChartPackage
     ) -> None:
@@ -257,10 +364,23 @@ class GitHubClient:
         if isinstance(assets, list):
             for asset in assets:
                 if isinstance(asset, dict) and asset.get("name") == package.filename:
+                    asset_digest = asset.get("digest")
+                    if not isinstance(asset_digest, str):
+                        # Assets uploaded before GitHub recorded digests.
+                        asset_digest = self.release_asset_digest(asset, package)
+                    if asset_digest == f"sha256:{package.digest}":
+                        log(
+                            f"Asset already present for {package.tag_name}: {package.filename}"
+                        )
+                        return
+                    # The index entry will carry the new digest, so the
+                    # downloadable asset has to match it.
                     log(
-                        f"Asset already present for {package.tag_name}: {package.filename}"
+                        f"Asset for {package.tag_name} has digest {asset_digest}, "
+                        f"local package is sha256:{package.digest}; replacing it"
                     )
-                    return
+                    self.delete_release_asset(asset)
+                    break
 
         upload_url = release.get("upload_url")
         release_id = release.get("id")
@@ -280,6 +400,249 @@ class GitHubClient:
         )
 
 
+@dataclass(frozen=True)
+class OciBlob:
+    repository: str
+    digest: str
+    media_type: str
+    data: bytes
+
+    @property
+    def descriptor(self) -> dict[str, Any]:
+        return {
+            "mediaType": self.media_type,
+            "digest": self.digest,
+            "size": len(self.data),
+        }
+
+
+@dataclass(frozen=True)
+class OciArtifact:
+    repository: str
+    tag: str
+    blobs: tuple[OciBlob, ...]
+    manifest: bytes
+
+
+def build_oci_artifact(package: ChartPackage, repository: str) -> OciArtifact:
+    config_data = json.dumps(package.metadata, separators=(",", ":")).encode("utf-8")
+    config = OciBlob(
+        repository=repository,
+        digest=f"sha256:{hashlib.sha256(config_data).hexdigest()}",
+        media_type=HELM_CONFIG_MEDIA_TYPE,
+        data=config_data,
+    )
+    layer = OciBlob(
+        repository=repository,
+        digest=f"sha256:{package.digest}",
+        media_type=HELM_CHART_LAYER_MEDIA_TYPE,
+        data=package.path.read_bytes(),
+    )
+    manifest = {
+        "schemaVersion": 2,
+        "mediaType": OCI_MANIFEST_MEDIA_TYPE,
+        "config": config.descriptor,
+        "layers": [layer.descriptor],
+        "annotations": {
+            "org.opencontainers.image.title": package.name,
+            "org.opencontainers.image.version": package.version,
+        },
+    }
+    return OciArtifact(
+        repository=repository,
+        # OCI tags may not contain "+", Helm substitutes "_" for semver build metadata.
+        tag=package.version.replace("+", "_"),
+        blobs=(config, layer),
+        manifest=json.dumps(manifest, separators=(",", ":")).encode("utf-8"),
+    )
+
+
+class OciRegistryClient:
+    def __init__(
+        self, reference: str, username: str | None, password: str | None
+    ) -> None:
+        reference = reference.removeprefix("oci://")
+        scheme, separator, remainder = reference.partition("://")
+        if not separator:
+            scheme, remainder = "https", reference
+        host, _, namespace = remainder.partition("/")
+        self.base_url = f"{scheme}://{host}"
+        self.namespace = namespace.strip("/")
+        self.username = username
+        self.password = password
+        self._tokens: dict[str, str] = {}
+        self._tokens_lock = threading.Lock()
+        self._scope_locks: dict[str, threading.Lock] = {}
+
+    def repository_for(self, chart_name: str) -> str:
+        return f"{self.namespace}/{chart_name}" if self.namespace else chart_name
+
+    def _authenticate(
+        self, challenge: str, scope: str, rejected_token: str | None
+    ) -> bool:
+        """Get a token for ``scope``, fetching it once however many workers ask.
+
+        Workers that were rejected with the same token wait on the scope's
+        lock and reuse whatever token the first of them fetched.
+        """
+        with self._tokens_lock:
+            scope_lock = self._scope_locks.setdefault(scope, threading.Lock())
+        with scope_lock:
+            current = self._tokens.get(scope)
+            if current is not None and current != rejected_token:
+                return True
+            token = self._fetch_token(challenge, scope)
+            if token is None:
+                return False
+            with self._tokens_lock:
+                self._tokens[scope] = token
+            return True
+
+    def _fetch_token(self, challenge: str, scope: str) -> str | None:
+        scheme, _, params = challenge.partition(" ")
+        if scheme.lower() != "bearer":
+            return None
+        fields = dict(re.findall(r'(\w+)="([^"]*)"', params))
+        realm = fields.get("realm")
+        if not realm:
+            return None
+
+        query = {"scope": fields.get("scope", scope)}
+        if "service" in fields:
+            query["service"] = fields["service"]
+        req = request.Request(f"{realm}?{parse.urlencode(query)}")
+        if self.username and self.password:
+            credentials = f"{self.username}:{self.password}".encode("utf-8")
+            req.add_header(
+                "Authorization", f"Basic {base64.b64encode(credentials).decode()}"
+            )
+        with request.urlopen(req) as response:
+            payload = json.loads(response.read().decode("utf-8"))
+        token = payload.get("token") or payload.get("access_token")
+        return token if isinstance(token, str) else None
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        *,
+        scope: str,
+        payload: bytes | None = None,
+        content_type: str | None = None,
+    ) -> tuple[int, Any]:
+        for attempt in range(2):
+            req = request.Request(url, data=payload, method=method)
+            token = self._tokens.get(scope)
+            if token:
+                req.add_header("Authorization", f"Bearer {token}")
+            if content_type:
+                req.add_header("Content-Type", content_type)
+            try:
+                with request.urlopen(req) as response:
+                    response.read()
+                    return response.status, response.headers
+            except error.HTTPError as exc:
+                body = exc.read().decode("utf-8", errors="replace")
+                challenge = exc.headers.get("WWW-Authenticate", "")
+                if (
+                    exc.code == 401
+                    and attempt == 0
+                    and challenge
+                    and self._authenticate(challenge, scope, token)
+                ):
+                    continue
+                if exc.code == 404:
+                    return exc.code, exc.headers
+                raise RuntimeError(
+                    f"OCI registry error {exc.code} for {method} {url}: {body}"
+                ) from exc
+        raise RuntimeError(f"OCI registry authentication failed for {url}")
+
+    def blob_exists(self, blob: OciBlob) -> bool:
+        status, _ = self._request(
+            "HEAD",
+            f"{self.base_url}/v2/{blob.repository}/blobs/{blob.digest}",
+            scope=f"repository:{blob.repository}:pull,push",
+        )
+        return status == 200
+
+    def push_blob(self, blob: OciBlob) -> bool:
+        if self.blob_exists(blob):
+            return False
+
+        scope = f"repository:{blob.repository}:pull,push"
+        _, headers = self._request(
+            "POST",
+            f"{self.base_url}/v2/{blob.repository}/blobs/uploads/",
+            scope=scope,
+            payload=b"",
+        )
+        location = headers.get("Location")
+        if not location:
+            raise RuntimeError(f"Registry did not return an upload location for {blob}")
+        upload_url = parse.urljoin(f"{self.base_url}/", location)
+        separator = "&" if "?" in upload_url else "?"
+        self._request(
+            "PUT",
+            f"{upload_url}{separator}{parse.urlencode({'digest': blob.digest})}",
+            scope=scope,
+            payload=blob.data,
+            content_type="application/octet-stream",
+        )
+        return True
+
+    def manifest_exists(self, artifact: OciArtifact) -> bool:
+        status, headers = self._request(
+            "HEAD",
+            f"{self.base_url}/v2/{artifact.repository}/manifests/{artifact.tag}",
+            scope=f"repository:{artifact.repository}:pull,push",
+        )
+        digest = f"sha256:{hashlib.sha256(artifact.manifest).hexdigest()}"
+        return status == 200 and headers.get("Docker-Content-Digest") == digest
+
+    def push_manifest(self, artifact: OciArtifact) -> None:
+        self._request(
+            "PUT",
+            f"{self.base_url}/v2/{artifact.repository}/manifests/{artifact.tag}",
+            scope=f"repository:{artifact.repository}:pull,push",
+            payload=artifact.manifest,
+            content_type=OCI_MANIFEST_MEDIA_TYPE,
+        )
+
+
+def publish_oci_packages(
+    client: OciRegistryClient, packages: list[ChartPackage], concurrency: int
+) -> None:
+    """Push every package whose manifest the registry does not already hold.
+
+    This runs independently of the release skip, so a registry added after
+    charts were released gets backfilled.
+    """
+    artifacts = [
+        build_oci_artifact(package, client.repository_for(package.name))
+        for package in packages
+    ]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        present = list(executor.map(client.manifest_exists, artifacts))
+        artifacts = [
+            artifact for artifact, exists in zip(artifacts, present) if not exists
+        ]
+        if len(artifacts) < len(present):
+            log(f"{len(present) - len(artifacts)} OCI chart(s) already present")
+        blobs = {
+            (blob.repository, blob.digest): blob
+            for artifact in artifacts
+            for blob in artifact.blobs
+        }
+        uploaded = sum(executor.map(client.push_blob, blobs.values()))
+        log(f"Pushed {uploaded} OCI blob(s), {len(blobs) - uploaded} already present")
+        for artifact in executor.map(
+            lambda artifact: client.push_manifest(artifact) or artifact, artifacts
+        ):
+            log(f"Pushed OCI chart {artifact.repository}:{artifact.tag}")
+
+
 def git(*args: str, cwd: Path) -> str:
     result = subprocess.run(
         ["git", *args],
@@ -320,6 +683,58 @@ def ensure_git_worktree(repo_root: Path, branch: str, worktree_path: Path) -> No
                 path.unlink()
 
 
+def is_git_worktree(path: Path) -> bool:
+    return (path / ".git").exists()
+
+
+def ensure_sparse_git_worktree(
+    repo_root: Path,
+    branch: str,
+    worktree_path: Path,
+    sparse_paths: list[str],
+) -> None:
+    """Reuse a persistent, shallow and sparse pages worktree across runs."""
+    reusable = is_git_worktree(worktree_path)
+    # A fresh worktree only needs the branch tip. Once the tip is present,
+    # a plain fetch negotiates against it and transfers only new commits,
+    # keeping the parent link needed to fast-forward.
+    depth_args = [] if reusable else ["--depth", "1"]
+    try:
+        git("fetch", *depth_args, "origin", branch, cwd=repo_root)
+        git("show-ref", "--verify", f"refs/remotes/origin/{branch}", cwd=repo_root)
+    except subprocess.CalledProcessError:
+        if reusable:
+            # Merging against a stale index would drop what others published.
+            log(f"Could not fetch origin/{branch} for the reused pages worktree")
+            raise
+        ensure_git_worktree(repo_root, branch, worktree_path)
+        return
+
+    if not reusable:
+        git("worktree", "prune", cwd=repo_root)
+        git(
+            "worktree",
+            "add",
+            "--no-checkout",
+            "--force",
+            "-B",
+            branch,
+            str(worktree_path),
+            f"origin/{branch}",
+            cwd=repo_root,
+        )
+        git("sparse-checkout", "set", "--no-cone", *sparse_paths, cwd=worktree_path)
+        git("checkout", branch, cwd=worktree_path)
+        return
+
+    git("sparse-checkout", "set", "--no-cone", *sparse_paths, cwd=worktree_path)
+    try:
+        git("merge", "--ff-only", f"origin/{branch}", cwd=worktree_path)
+    except subprocess.CalledProcessError:
+        log(f"Pages worktree cannot fast-forward; resetting to origin/{branch}")
+        git("reset", "--hard", f"origin/{branch}", cwd=worktree_path)
+
+
 def read_values_yaml_from_archive(package_path: Path) -> str:
     with tarfile.open(package_path, mode="r:gz") as archive:
         member = next(
@@ -358,6 +773,107 @@ def merge_charts_data(
     return merged
 
 
+def search_tokens(text: str) -> set[str]:
+    """Lowercase words plus their camelCase parts; the catalog page's
+    ``searchTokens`` applies the same rule to queries."""
+    tokens = set(SEARCH_TOKEN_RE.findall(text.lower()))
+    tokens.update(SEARCH_TOKEN_RE.findall(CAMEL_CASE_RE.sub(r"\1 \2", text).lower()))
+    return tokens
+
+
+def iter_values_keys(data: Any) -> Iterator[str]:
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield str(key)
+            yield from iter_values_keys(value)
+    elif isinstance(data, list):
+        for item in data:
+            yield from iter_values_keys(item)
+
+
+def values_key_tokens(values_text: str) -> set[str]:
+    try:
+        data = yaml.safe_load(values_text)
+    except yaml.YAMLError:
+        return set()
+    tokens: set[str] = set()
+    for key in set(iter_values_keys(data)):
+        tokens.update(search_tokens(key))
+    return tokens
+
+
+def prefix_tokens(tokens: set[str]) -> set[str]:
+    prefixes: set[str] = set()
+    for token in tokens:
+        for end in range(min(SEARCH_PREFIX_MIN_LENGTH, len(token)), len(token) + 1):
+            prefixes.add(token[:end])
+    return prefixes
+
+
+def encode_postings(ids: set[int]) -> list[int]:
+    deltas = []
+    previous = 0
+    for value in sorted(ids):
+        deltas.append(value - previous)
+        previous = value
+    return deltas
+
+
+def generate_search_index(
+    merged_index: dict[str, Any], charts_data: dict[str, Any]
+) -> dict[str, Any]:
+    """Build an inverted token index for the catalog page.
+
+    Chart-level tokens (name, keywords, description) are posted per chart
+    and values.yaml keys per chart version, both with their forward prefixes
+    so partial words match. Postings are delta-encoded id lists.
+    """
+    entries: dict[str, list[dict[str, Any]]] = merged_index.get("entries", {})
+    charts: list[str] = []
+    versions: list[list[Any]] = []
+    chart_postings: dict[str, set[int]] = {}
+    value_postings: dict[str, set[int]] = {}
+
+    for chart_name, chart_versions in sorted(entries.items()):
+        if not chart_versions:
+            continue
+        chart_id = len(charts)
+        charts.append(chart_name)
+
+        latest = chart_versions[0]
+        chart_text = " ".join(
+            [
+                chart_name,
+                str(latest.get("description", "")),
+                *(str(keyword) for keyword in latest.get("keywords") or []),
+            ]
+        )
+        for token in prefix_tokens(search_tokens(chart_text)):
+            chart_postings.setdefault(token, set()).add(chart_id)
+
+        values_by_version = charts_data.get(chart_name, {})
+        for version_info in chart_versions:
+            version = str(version_info.get("version", ""))
+            values_text = values_by_version.get(version)
+            if not values_text:
+                continue
+            version_id = len(versions)
+            versions.append([chart_id, version])
+            for token in prefix_tokens(values_key_tokens(values_text)):
+                value_postings.setdefault(token, set()).add(version_id)
+
+    return {
+        "charts": charts,
+        "versions": versions,
+        "chartTokens": {
+            token: encode_postings(ids) for token, ids in sorted(chart_postings.items())
+        },
+        "valueTokens": {
+            token: encode_postings(ids) for token, ids in sorted(value_postings.items())
+        },
+    }
+
+
 def generate_index_html(
     merged_index: dict[str, Any],
     charts_data: dict[str, Any],
@@ -402,55 +918,107 @@ def generate_index_html(
     )
 
 
-def update_pages_index(
+@contextmanager
+def pages_worktree(
     repo_root: Path,
+    branch: str,
+    worktree_path: Path,
+    index_relative_path: Path,
+    reuse_worktree: bool = False,
+) -> Iterator[Path]:
+    if reuse_worktree:
+        ensure_sparse_git_worktree(
+            repo_root,
+            branch,
+            worktree_path,
+            [f"/{index_relative_path.as_posix()}", *PAGES_SPARSE_PATHS],
+        )
+    else:
+        ensure_git_worktree(repo_root, branch, worktree_path)
+    try:
+        yield worktree_path
+    finally:
+        if not reuse_worktree and worktree_path.exists():
+            git("worktree", "remove", "--force", str(worktree_path), cwd=repo_root)
+
+
+def write_pages_index(
+    worktree_path: Path,
+    existing_index: dict[str, Any],
     packages: list[ChartPackage],
     owner: str,
     repo: str,
     branch: str,
-    worktree_path: Path,
     index_relative_path: Path,
 ) -> None:
-    ensure_git_worktree(repo_root, branch, worktree_path)
-    try:
-        index_path = worktree_path / index_relative_path
-        charts_data_path = worktree_path / "charts-data.json"
-        html_path = worktree_path / "index.html"
+    index_path = worktree_path / index_relative_path
+    charts_data_path = worktree_path / "charts-data.json"
+    html_path = worktree_path / "index.html"
+    search_index_path = worktree_path / "search-index.json"
+
+    existing_charts_data = load_charts_data(charts_data_path)
 
-        existing_index = load_yaml(index_path)
-        existing_charts_data = load_charts_data(charts_data_path)
+    merged_index = merge_index(existing_index, packages, owner, repo)
+    merged_charts_data = merge_charts_data(existing_charts_data, packages)
 
-        merged_index = merge_index(existing_index, packages, owner, repo)
-        merged_charts_data = merge_charts_data(existing_charts_data, packages)
+    if merged_index == existing_index and merged_charts_data == existing_charts_data:
+        log("No gh-pages changes detected")
+        return
 
+    if merged_index != existing_index:
         index_path.parent.mkdir(parents=True, exist_ok=True)
         dump_yaml(index_path, merged_index)
 
-        with charts_data_path.open("w", encoding="utf-8") as handle:
-            json.dump(merged_charts_data, handle, separators=(",", ":"))
+    with charts_data_path.open("w", encoding="utf-8") as handle:
+        json.dump(merged_charts_data, handle, separators=(",", ":"))
 
-        html_content = generate_index_html(
-            merged_index, merged_charts_data, owner, repo
-        )
-        with html_path.open("w", encoding="utf-8") as handle:
-            handle.write(html_content)
+    html_content = generate_index_html(merged_index, merged_charts_data, owner, repo)
+    with html_path.open("w", encoding="utf-8") as handle:
+        handle.write(html_content)
 
-        changed_files = [
-            str(index_relative_path),
-            "charts-data.json",
-            "index.html",
-        ]
-        status = git("status", "--porcelain", "--", *changed_files, cwd=worktree_path)
-        if not status:
-            log("No gh-pages changes detected")
-            return
-
-        git("add", *changed_files, cwd=worktree_path)
-        git("commit", "-m", "Update index.yaml and index.html", cwd=worktree_path)
-        git("push", "origin", f"HEAD:{branch}", cwd=worktree_path)
-    finally:
-        if worktree_path.exists():
-            git("worktree", "remove", "--force", str(worktree_path), cwd=repo_root)
+    search_index = generate_search_index(merged_index, merged_charts_data)
+    with search_index_path.open("w", encoding="utf-8") as handle:
+        json.dump(search_index, handle, separators=(",", ":"))
+
+    changed_files = [
+        str(index_relative_path),
+        "charts-data.json",
+        "index.html",
+        "search-index.json",
+    ]
+    status = git("status", "--porcelain", "--", *changed_files, cwd=worktree_path)
+    if not status:
+        log("No gh-pages changes detected")
+        return
+
+    git("add", *changed_files, cwd=worktree_path)
+    git("commit", "-m", "Update index.yaml and index.html", cwd=worktree_path)
+    git("push", "origin", f"HEAD:{branch}", cwd=worktree_path)
+
+
+def update_pages_index(
+    repo_root: Path,
+    packages: list[ChartPackage],
+    owner: str,
+    repo: str,
+    branch: str,
+    worktree_path: Path,
+    index_relative_path: Path,
+    reuse_worktree: bool = False,
+) -> None:
+    with pages_worktree(
+        repo_root, branch, worktree_path, index_relative_path, reuse_worktree
+    ) as worktree:
+        existing_index = load_yaml(worktree / index_relative_path)
+        write_pages_index(
+            worktree,
+            existing_index,
+            packages,
+            owner,
+            repo,
+            branch,
+            index_relative_path,
+        )
 
 
 def parse_owner_repo(value: str | None) -> tuple[str | None, str | None]:
@@ -489,7 +1057,12 @@ def parse_args() -> argparse.Namespace:
         "--worktree-path",
         type=Path,
         default=DEFAULT_INDEX_WORKTREE,
-        help="Temporary git worktree path used for the pages branch.",
+        help="Git worktree path used for the pages branch.",
+    )
+    parser.add_argument(
+        "--reuse-worktree",
+        action="store_true",
+        help="Keep a shallow, sparse pages worktree between runs and fast-forward it.",
     )
     parser.add_argument(
         "--config",
@@ -515,7 +1088,23 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--skip-existing",
         action="store_true",
-        help="Accepted for workflow compatibility. Existing assets are always left in place.",
+        help="Skip packages whose sha256 digest is already recorded in index.yaml.",
+    )
+    parser.add_argument(
+        "--oci-registry",
+        default=None,
+        help="Also push packages as OCI artifacts, e.g. oci://ghcr.io/<owner>/charts.",
+    )
+    parser.add_argument(
+        "--oci-username",
+        default=None,
+        help="Registry username for OCI pushes. Defaults to OCI_USERNAME or the owner.",
+    )
+    parser.add_argument(
+        "--oci-concurrency",
+        type=int,
+        default=DEFAULT_OCI_CONCURRENCY,
+        help="Maximum number of concurrent OCI blob and manifest uploads.",
     )
     return parser.parse_args()
 
@@ -550,20 +1139,46 @@ def main() -> int:
     target_commitish = git("rev-parse", "HEAD", cwd=REPO_ROOT)
     client = GitHubClient(owner, repo, token, api_base_url)
 
-    for package in packages:
-        log(f"Publishing {package.filename} as release {package.tag_name}")
-        release = client.ensure_release(package.tag_name, target_commitish)
-        client.upload_release_asset(release, package)
-
-    update_pages_index(
-        repo_root=REPO_ROOT,
-        packages=packages,
-        owner=owner,
-        repo=repo,
-        branch=args.pages_branch,
-        worktree_path=args.worktree_path,
-        index_relative_path=args.index_path,
-    )
+    with pages_worktree(
+        REPO_ROOT,
+        args.pages_branch,
+        args.worktree_path,
+        args.index_path,
+        args.reuse_worktree,
+    ) as worktree:
+        existing_index = load_yaml(worktree / args.index_path)
+        all_packages = packages
+        if args.skip_existing:
+            packages, published = split_published_packages(existing_index, packages)
+            for package in published:
+                log(f"Skipping {package.filename}: digest already published")
+
+        for package in packages:
+            log(f"Publishing {package.filename} as release {package.tag_name}")
+            release = client.ensure_release(package.tag_name, target_commitish)
+            client.upload_release_asset(release, package)
+
+        if args.oci_registry:
+            oci_client = OciRegistryClient(
+                args.oci_registry,
+                args.oci_username or os.environ.get("OCI_USERNAME") or owner,
+                os.environ.get("OCI_PASSWORD") or token,
+            )
+            publish_oci_packages(oci_client, all_packages, args.oci_concurrency)
+
+        if not packages:
+            log("All chart packages already published")
+            return 0
+
+        write_pages_index(
+            worktree,
+            existing_index,
+            packages,
+            owner,
+            repo,
+            args.pages_branch,
+            args.index_path,
+        )
     return 0
 
 
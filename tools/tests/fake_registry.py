@@ -0,0 +1,397 @@
+"""Offline replay server for the registry APIs used by tools/upgrade.py.
+
+Serves the Docker Hub v2 tags API, the Quay tag API and the OCI distribution
+``tags/list``, manifest, blob and token endpoints from a JSON fixture of
+tags and their ages. Requests are routed by ``Host`` header, so a single
+server stands in for every registry through ``--registry-origin``.
+
+Run it directly to benchmark a full upgrade across all charts::
+
+    uv run python -m tools.tests.fake_registry
+    uv run python -m tools.tests.fake_registry --record  # refresh fixtures
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import hashlib
+import json
+import logging
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from tools import upgrade  # noqa: E402
+
+
+FIXTURE_PATH = Path(__file__).with_name("fixtures") / "registry_tags.json"
+logger = logging.getLogger("fake-registry")
+REGISTRY_HOSTS = (
+    "hub.docker.com",
+    "registry-1.docker.io",
+    "auth.docker.io",
+    "quay.io",
+    "ghcr.io",
+    "mcr.microsoft.com",
+)
+# Distribution API hosts whose fixtures are keyed by another registry name.
+FIXTURE_REGISTRY = {"registry-1.docker.io": "docker.io"}
+FAKE_TOKEN = "replay-token"
+DEFAULT_PAGE_SIZE = 25
+
+
+def load_fixtures(path: Path = FIXTURE_PATH) -> dict[str, list[tuple[str, float]]]:
+    """Return ``{image reference: [(tag, age in days), ...]}``."""
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return {
+        reference: [(tag, float(age)) for tag, age in tags]
+        for reference, tags in data["repositories"].items()
+    }
+
+
+def dump_fixtures(repositories: dict[str, list]) -> str:
+    """Serialise fixtures with one repository per line to keep diffs small."""
+    lines = [
+        f"  {json.dumps(reference)}: {json.dumps(tags, separators=(',', ':'))}"
+        for reference, tags in sorted(repositories.items())
+    ]
+    return '{"repositories": {\n' + ",\n".join(lines) + "\n}}\n"
+
+
+def digest_of(*parts: str) -> str:
+    return "sha256:" + hashlib.sha256(":".join(parts).encode()).hexdigest()
+
+
+class FakeRegistry:
+    """Threaded HTTP server replaying fixture tags for every registry host.
+
+    Tag ages are applied relative to ``now`` (midnight UTC today by default),
+    so a fixture keeps the same shape however long ago it was recorded and
+    listed dates stay stable between runs on the same day.
+    """
+
+    def __init__(
+        self,
+        fixtures: dict[str, list[tuple[str, float]]],
+        page_size: int = DEFAULT_PAGE_SIZE,
+        now: datetime.datetime | None = None,
+    ) -> None:
+        self.fixtures = fixtures
+        self.page_size = page_size
+        self.now = now or datetime.datetime.now(datetime.timezone.utc).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        self.requests: Counter[str] = Counter()
+        self.bytes: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def origin(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def origin_overrides(self) -> dict[str, str]:
+        return {host: self.origin for host in REGISTRY_HOSTS}
+
+    def __enter__(self) -> FakeRegistry:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def record(self, host: str, size: int) -> None:
+        with self._lock:
+            self.requests[host] += 1
+            self.bytes[host] += size
+
+    def dated_tags(self, reference: str) -> list[tuple[str, datetime.datetime]] | None:
+        tags = self.fixtures.get(reference)
+        if tags is None:
+            return None
+        dated = [(tag, self.now - datetime.timedelta(days=age)) for tag, age in tags]
+        return sorted(dated, key=lambda item: item[1], reverse=True)
+
+    def _handler_class(self):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *_args):
+                pass
+
+            def do_HEAD(self):
+                self.route(head=True)
+
+            def do_GET(self):
+                self.route(head=False)
+
+            def route(self, head: bool):
+                host = (self.headers.get("Host") or "").split(":", 1)[0]
+                parts = urlsplit(self.path)
+                query = {
+                    key: values[-1] for key, values in parse_qs(parts.query).items()
+                }
+                if host == "hub.docker.com":
+                    response = registry.docker_hub(parts.path, query)
+                elif host == "quay.io" and not parts.path.startswith("/v2/"):
+                    response = registry.quay(parts.path, query)
+                else:
+                    response = registry.distribution(
+                        host, parts.path, query, self.headers.get("Authorization")
+                    )
+                self.reply(host, head, *response)
+
+            def reply(self, host, head, status, payload, headers=None):
+                body = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if not head:
+                    self.wfile.write(body)
+                registry.record(host, 0 if head else len(body))
+
+        return Handler
+
+    def page(self, items: list, number: int, size: int) -> tuple[list, bool]:
+        start = (number - 1) * size
+        return items[start : start + size], start + size < len(items)
+
+    def docker_hub(self, path: str, query: dict[str, str]):
+        # /v2/repositories/<namespace>/<name>/tags/
+        segments = path.strip("/").split("/")
+        if len(segments) != 5 or segments[-1] != "tags":
+            return 404, {"message": "not found"}
+        tags = self.dated_tags(f"docker.io/{segments[2]}/{segments[3]}")
+        if tags is None:
+            return 404, {"message": "object not found"}
+        if query.get("name"):
+            tags = [item for item in tags if query["name"] in item[0]]
+        number = int(query.get("page", 1))
+        size = min(int(query.get("page_size", 10)), self.page_size)
+        page, more = self.page(tags, number, size)
+        next_url = None
+        if more:
+            next_query = {**query, "page": str(number + 1)}
+            next_url = f"https://hub.docker.com{path}?{urlencode(next_query)}"
+        results = [
+            {"name": tag, "last_updated": created.isoformat()} for tag, created in page
+        ]
+        return 200, {"count": len(tags), "next": next_url, "results": results}
+
+    def quay(self, path: str, query: dict[str, str]):
+        # /api/v1/repository/<org>/<name>/tag/
+        segments = path.strip("/").split("/")
+        if len(segments) != 6 or segments[-1] != "tag":
+            return 404, {"error": "not found"}
+        tags = self.dated_tags(f"quay.io/{segments[3]}/{segments[4]}")
+        if tags is None:
+            return 404, {"error": "not found"}
+        number = int(query.get("page", 1))
+        size = min(int(query.get("limit", 50)), self.page_size)
+        page, more = self.page(tags, number, size)
+        entries = [
+            {"name": tag, "last_modified": created.isoformat()} for tag, created in page
+        ]
+        return 200, {"tags": entries, "page": number, "has_additional": more}
+
+    def distribution(self, host: str, path: str, query: dict[str, str], auth):
+        if path in ("/token", "/oauth2/token", "/v2/auth"):
+            return 200, {"token": FAKE_TOKEN, "access_token": FAKE_TOKEN}
+        if auth != f"Bearer {FAKE_TOKEN}":
+            challenge = f'Bearer realm="https://{host}/token",service="{host}"'
+            return 401, {"errors": []}, {"WWW-Authenticate": challenge}
+
+        registry_name = FIXTURE_REGISTRY.get(host, host)
+        repository, _, rest = path.removeprefix("/v2/").partition("/tags/")
+        if rest == "list":
+            return self.tag_list(registry_name, repository, query)
+        for kind in ("manifests", "blobs"):
+            repository, marker, reference = path.removeprefix("/v2/").rpartition(
+                f"/{kind}/"
+            )
+            if marker:
+                return getattr(self, kind)(f"{registry_name}/{repository}", reference)
+        return 404, {"errors": [{"code": "NAME_UNKNOWN"}]}
+
+    def tag_list(self, host: str, repository: str, query: dict[str, str]):
+        tags = self.dated_tags(f"{host}/{repository}")
+        if tags is None:
+            return 404, {"errors": [{"code": "NAME_UNKNOWN"}]}
+        names = sorted(tag for tag, _ in tags)
+        if query.get("last"):
+            names = [name for name in names if name > query["last"]]
+        size = min(int(query.get("n", self.page_size)), self.page_size)
+        page, more = names[:size], len(names) > size
+        headers = {}
+        if more:
+            next_query = urlencode({"n": size, "last": page[-1]})
+            headers["Link"] = f'</v2/{repository}/tags/list?{next_query}>; rel="next"'
+        return 200, {"name": repository, "tags": page}, headers
+
+    def manifests(self, reference: str, tag: str):
+        known = dict(self.fixtures.get(reference, ()))
+        if tag not in known:
+            return 404, {"errors": [{"code": "MANIFEST_UNKNOWN"}]}
+        manifest = {
+            "schemaVersion": 2,
+            "mediaType": "application/vnd.oci.image.manifest.v1+json",
+            "config": {"digest": digest_of(reference, tag, "config")},
+        }
+        # The digest changes whenever the fixture re-dates a tag, like a re-push.
+        digest = digest_of(reference, tag, str(known[tag]))
+        return 200, manifest, {"Docker-Content-Digest": digest}
+
+    def blobs(self, reference: str, digest: str):
+        for tag, created in self.dated_tags(reference) or ():
+            if digest_of(reference, tag, "config") == digest:
+                return 200, {"created": created.isoformat()}
+        return 404, {"errors": [{"code": "BLOB_UNKNOWN"}]}
+
+
+@dataclass
+class BenchmarkResult:
+    exit_code: int
+    wall_seconds: float
+    requests: Counter[str]
+    bytes: Counter[str]
+
+    def report(self) -> list[str]:
+        lines = [f"Wall time: {self.wall_seconds:.2f}s"]
+        for host in sorted(self.requests):
+            lines.append(
+                f"  {host}: {self.requests[host]} requests, "
+                f"{self.bytes[host] / 1024:.1f} KiB"
+            )
+        return lines
+
+
+def copy_charts(chart_paths: list[Path], destination: Path) -> list[Path]:
+    """Copy just the files tools/upgrade.py reads, since it rewrites them."""
+    copies = []
+    for chart_path in chart_paths:
+        target = destination / chart_path.name
+        target.mkdir(parents=True)
+        for name in ("Chart.yaml", "values.yaml"):
+            if (chart_path / name).is_file():
+                shutil.copy2(chart_path / name, target / name)
+        copies.append(target)
+    return copies
+
+
+def run_benchmark(
+    chart_paths: list[Path],
+    workdir: Path,
+    fixtures: dict[str, list[tuple[str, float]]] | None = None,
+    extra_args: list[str] | None = None,
+    cache_path: Path | None = None,
+) -> BenchmarkResult:
+    """Run ``async_main`` over copies of ``chart_paths`` against the replay server.
+
+    Each run starts cold unless ``cache_path`` names a cache to reuse.
+    """
+    charts = copy_charts(chart_paths, workdir / "charts")
+    with FakeRegistry(fixtures if fixtures is not None else load_fixtures()) as server:
+        argv = [str(path) for path in charts]
+        if cache_path is None:
+            argv += ["--cache-path", str(workdir / "cache.sqlite3"), "--refresh"]
+        else:
+            argv += ["--cache-path", str(cache_path)]
+        for host, origin in server.origin_overrides.items():
+            argv += ["--registry-origin", f"{host}={origin}"]
+        args = upgrade.parse_args(argv + (extra_args or []))
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(None):
+            exit_code = asyncio.run(upgrade.async_main(args))
+        elapsed = time.perf_counter() - started
+    return BenchmarkResult(exit_code, elapsed, server.requests, server.bytes)
+
+
+def default_chart_paths() -> list[Path]:
+    return sorted(path.parent for path in (REPO_ROOT / "charts").glob("*/Chart.yaml"))
+
+
+def fixture_key(registry_type: str, repository: str) -> str:
+    if registry_type != "docker.io":
+        return repository
+    _, name = upgrade.repository_key(registry_type, repository)
+    return f"docker.io/{name if '/' in name else 'library/' + name}"
+
+
+async def record_fixtures(chart_paths: list[Path]) -> dict[str, list[list]]:
+    """Fetch live tag lists for every image the charts reference."""
+    plans = [upgrade.load_chart_plan(chart_path) for chart_path in chart_paths]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    repositories = {}
+    async with upgrade.AsyncHttpClient() as http:
+        session = upgrade.RegistrySession(http)
+        for plan in plans:
+            for img_info in plan.images:
+                repository = img_info["current_repository"]
+                registry_type = upgrade.get_registry_type(repository or "")
+                if registry_type == "unknown":
+                    continue
+                key = fixture_key(registry_type, repository)
+                if key in repositories:
+                    continue
+                tags = await upgrade.get_tags_for_repository(
+                    registry_type, repository, session
+                )
+                repositories[key] = [
+                    [tag[0], round((now - tag[1]).total_seconds() / 86400, 2)]
+                    if isinstance(tag, tuple)
+                    else [tag, 365]
+                    for tag in tags
+                ]
+    return repositories
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("chart_paths", nargs="*", type=Path)
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help=f"Re-record {FIXTURE_PATH.name} from the live registries.",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    chart_paths = args.chart_paths or default_chart_paths()
+
+    if args.record:
+        repositories = asyncio.run(record_fixtures(chart_paths))
+        FIXTURE_PATH.write_text(dump_fixtures(repositories), encoding="utf-8")
+        logger.info("Recorded %d repositories to %s", len(repositories), FIXTURE_PATH)
+        return 0
+
+    with tempfile.TemporaryDirectory() as workdir:
+        result = run_benchmark(chart_paths, Path(workdir))
+    for line in result.report():
+        logger.info(line)
+    return result.exit_code
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
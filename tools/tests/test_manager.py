@@ -1,6 +1,26 @@
+import json
+import re
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
+import pytest
+
 from tools.manager import VersionBumpManager
+from tools.versioning.charts import (
+    list_chart_dirs,
+    load_yaml,
+    local_dependency_graph,
+    lock_digest,
+    refresh_dependency_locks,
+    resolve_local_lock,
+    sync_local_dependency_versions,
+    write_chart_lock,
+)
+from tools.versioning.git_ops import GitClient
+from tools.versioning.github_api import ConnectionPool, GitHubClient
 from tools.versioning.models import VersionBumpConfig
 
 
@@ -41,3 +61,382 @@ version: 0.1.0
     assert update is not None
     assert update.chart_name == "game-tools"
     assert update.new_version == "0.1.1"
+
+
+def _git(repo: Path, *args: str) -> None:
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=repo,
+        check=True,
+        capture_output=True,
+    )
+
+
+def _commit_chart(repo: Path, chart: str, message: str) -> None:
+    chart_dir = repo / "charts" / chart
+    chart_dir.mkdir(parents=True, exist_ok=True)
+    values = chart_dir / "values.yaml"
+    previous = values.read_text(encoding="utf-8") if values.exists() else ""
+    values.write_text(f"{previous}# {message}\n", encoding="utf-8")
+    _git(repo, "add", ".")
+    _git(repo, "commit", "-q", "-m", message)
+
+
+def test_history_index_matches_per_chart_git_queries(tmp_path: Path):
+    _git(tmp_path, "init", "-q")
+    _commit_chart(tmp_path, "alpha", "Add alpha")
+    _commit_chart(tmp_path, "beta", "Add beta")
+    _git(tmp_path, "tag", "alpha-0.1.0")
+    _commit_chart(tmp_path, "alpha", "Tune alpha (#12)")
+    _git(tmp_path, "tag", "beta-0.1.0")
+    _commit_chart(tmp_path, "beta", "Tune beta (#13)")
+    _commit_chart(tmp_path, "alpha", "More alpha (#14)")
+
+    git = GitClient(tmp_path)
+    history = git.index_history(["alpha-0.1.0", "beta-0.1.0"])
+
+    assert len(history.commits) == 3
+    for tag, chart in (
+        ("alpha-0.1.0", "alpha"),
+        ("beta-0.1.0", "beta"),
+        ("beta-0.1.0", "alpha"),
+    ):
+        chart_dir = tmp_path / "charts" / chart
+        commits = git.indexed_commits(tag, chart_dir)
+        assert commits is not None
+        assert bool(commits) == git.has_changes(f"{tag}..HEAD", chart_dir)
+        expected = git.log_text(f"{tag}..HEAD", chart_dir, "%s %b")
+        assert [commit.message.strip() for commit in commits] == [
+            line.strip() for line in expected.splitlines()
+        ]
+    assert git.indexed_commits("missing-0.1.0", tmp_path / "charts" / "alpha") is None
+
+
+class FakeGitHub(ThreadingHTTPServer):
+    """Serves GraphQL pull request labels and REST issues for one repository."""
+
+    def __init__(self, pulls: dict[int, tuple[str, list[str]]], issues: dict):
+        super().__init__(("127.0.0.1", 0), FakeGitHubHandler)
+        self.pulls = pulls
+        self.issues = issues
+        self.calls: list[str] = []
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self) -> "FakeGitHub":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *_args) -> None:
+        pass
+
+    def _reply(self, payload) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        self.server.calls.append("graphql")
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        repository = {}
+        for alias, number in re.findall(
+            r"(pr\d+): pullRequest\(number: (\d+)\)", request["query"]
+        ):
+            pull = self.server.pulls.get(int(number))
+            repository[alias] = pull and {
+                "state": pull[0],
+                "labels": {"nodes": [{"name": name} for name in pull[1]]},
+            }
+        self._reply({"data": {"repository": repository}})
+
+    def do_GET(self) -> None:
+        number = int(self.path.rsplit("/", 1)[1])
+        self.server.calls.append(f"rest:{number}")
+        state, labels = self.server.issues.get(number) or self.server.pulls[number]
+        self._reply({"state": state.lower(), "labels": [{"name": n} for n in labels]})
+
+
+def test_prefetch_pr_labels_batches_graphql_and_caches_settled_prs(tmp_path: Path):
+    pulls = {12: ("MERGED", ["minor"]), 13: ("OPEN", ["major"])}
+    issues = {14: ("closed", ["bug"])}
+    cache_path = tmp_path / "labels.json"
+
+    with FakeGitHub(pulls, issues) as server:
+        client = GitHubClient("o/r", "token", server.url, cache_path)
+        client.prefetch_pr_labels([12, 13, 14])
+        assert server.calls == ["graphql", "rest:14"]
+        assert client.get_pr_labels(12) == ["minor"]
+        assert client.get_pr_labels(14) == ["bug"]
+
+        server.calls.clear()
+        client = GitHubClient("o/r", "token", server.url, cache_path)
+        client.prefetch_pr_labels([12, 13, 14])
+        # Only the open PR is looked up again.
+        assert server.calls == ["graphql"]
+        assert client.get_pr_labels(13) == ["major"]
+
+        server.calls.clear()
+        client = GitHubClient("o/r", None, server.url)
+        client.prefetch_pr_labels([12, 13])
+        assert sorted(server.calls) == ["rest:12", "rest:13"]
+        assert client.get_pr_labels(13) == ["major"]
+
+
+def test_native_lock_digest_matches_committed_locks():
+    charts_root = Path(__file__).resolve().parents[2] / "charts"
+    for lock_path in sorted(charts_root.glob("*/Chart.lock")):
+        locked = resolve_local_lock(lock_path.parent)
+        requirements = load_yaml(lock_path.parent / "Chart.yaml")["dependencies"]
+
+        assert locked is not None, lock_path
+        assert lock_digest(requirements, locked) == load_yaml(lock_path)["digest"]
+
+
+def test_refresh_dependency_locks_rewrites_file_dependencies(tmp_path: Path):
+    (tmp_path / "lib").mkdir()
+    (tmp_path / "lib" / "Chart.yaml").write_text(
+        "apiVersion: v2\nname: lib\nversion: 0.2.0\n", encoding="utf-8"
+    )
+    app = tmp_path / "app"
+    app.mkdir()
+    (app / "Chart.yaml").write_text(
+        """
+apiVersion: v2
+name: app
+version: 1.0.0
+dependencies:
+- name: lib
+  version: 0.2.0
+  repository: file://../lib
+- name: redis
+  alias: cache
+  version: 1.4.*
+  repository: https://charts.example.com
+""".lstrip(),
+        encoding="utf-8",
+    )
+    (app / "Chart.lock").write_text(
+        """
+dependencies:
+- name: lib
+  repository: file://../lib
+  version: 0.1.0
+- name: redis
+  repository: https://charts.example.com
+  version: 1.4.2
+digest: sha256:stale
+generated: "2026-01-01T00:00:00Z"
+""".lstrip(),
+        encoding="utf-8",
+    )
+
+    assert refresh_dependency_locks([app]) == [app / "Chart.lock"]
+
+    lock = load_yaml(app / "Chart.lock")
+    assert lock["dependencies"] == [
+        {"name": "lib", "repository": "file://../lib", "version": "0.2.0"},
+        {
+            "name": "redis",
+            "repository": "https://charts.example.com",
+            "version": "1.4.2",
+        },
+    ]
+    assert lock["digest"] == lock_digest(
+        load_yaml(app / "Chart.yaml")["dependencies"], lock["dependencies"]
+    )
+    assert re.search(r'^generated: "\S+Z"$', (app / "Chart.lock").read_text(), re.M)
+    assert write_chart_lock(app) is False
+
+    (app / "Chart.yaml").write_text(
+        (app / "Chart.yaml").read_text().replace("1.4.*", "^1.5.0"), encoding="utf-8"
+    )
+    assert write_chart_lock(app) is None
+
+
+def test_cascade_bumps_transitive_dependents_in_one_commit(tmp_path: Path, monkeypatch):
+    charts_root = tmp_path / "charts"
+    for name, dependency in (
+        ("backup-job", None),
+        ("game-tools", "backup-job"),
+        ("valheim", "game-tools"),
+        ("standalone", None),
+    ):
+        chart_dir = charts_root / name
+        chart_dir.mkdir(parents=True)
+        text = f"apiVersion: v2\nname: {name}\nversion: 0.1.0\n"
+        if dependency:
+            text += (
+                f"dependencies:\n- name: {dependency}\n  version: 0.1.0\n"
+                f"  repository: file://../{dependency}\n"
+            )
+        (chart_dir / "Chart.yaml").write_text(text, encoding="utf-8")
+
+    config = VersionBumpConfig(
+        repo_root=tmp_path,
+        charts_root=charts_root,
+        dry_run=False,
+        push_changes=False,
+        fetch_tags=False,
+        owner_repo="",
+        github_token=None,
+        summary_file=None,
+    )
+    manager = VersionBumpManager(config)
+    latest_tags = {
+        name: (f"{name}-0.1.0", "0.1.0", (0, 1, 0))
+        for name in ("backup-job", "game-tools", "valheim", "standalone")
+    }
+    monkeypatch.setattr(
+        manager.git,
+        "has_changes",
+        lambda _range, chart_dir: chart_dir.name == "backup-job",
+    )
+    monkeypatch.setattr(manager, "_determine_bump", lambda *_args: "minor")
+    commits = []
+    monkeypatch.setattr(manager.git, "stage_paths", lambda paths: None)
+    monkeypatch.setattr(manager.git, "commit", commits.append)
+
+    updates = [
+        update
+        for chart_dir in list_chart_dirs(charts_root)
+        if (update := manager._plan_chart_update(chart_dir, latest_tags))
+    ]
+    updates = manager._plan_cascade(updates, latest_tags)
+    manager._apply_updates(updates)
+
+    assert [(u.chart_name, u.new_version) for u in updates] == [
+        ("backup-job", "0.2.0"),
+        ("game-tools", "0.1.1"),
+        ("valheim", "0.1.1"),
+    ]
+    valheim = load_yaml(charts_root / "valheim" / "Chart.yaml")
+    assert valheim["dependencies"][0]["version"] == "0.1.1"
+    assert load_yaml(charts_root / "valheim" / "Chart.lock")["dependencies"] == [
+        {"name": "game-tools", "repository": "file://../game-tools", "version": "0.1.1"}
+    ]
+    assert len(commits) == 1
+
+
+def test_dependency_graph_keys_charts_by_directory(tmp_path: Path):
+    charts_root = tmp_path / "charts"
+    for directory, name, dependency in (
+        ("mongo", "mongodb", None),
+        ("bubbles-ttrpg", "bubble-ttrpg", "mongo"),
+        ("party", "party", "bubbles-ttrpg"),
+    ):
+        chart_dir = charts_root / directory
+        chart_dir.mkdir(parents=True)
+        text = f"apiVersion: v2\nname: {name}\nversion: 0.1.0\n"
+        if dependency:
+            dependency_name = "mongodb" if dependency == "mongo" else "bubble-ttrpg"
+            text += (
+                f"dependencies:\n- name: {dependency_name}\n  version: 0.1.0\n"
+                f"  repository: file://../{dependency}\n"
+            )
+        (chart_dir / "Chart.yaml").write_text(text, encoding="utf-8")
+
+    assert local_dependency_graph(charts_root) == {
+        "bubbles-ttrpg": {"mongo"},
+        "mongo": set(),
+        "party": {"bubbles-ttrpg"},
+    }
+    assert sync_local_dependency_versions(charts_root, {"bubbles-ttrpg": "0.1.1"}) == [
+        charts_root / "party"
+    ]
+    party = load_yaml(charts_root / "party" / "Chart.yaml")
+    assert party["dependencies"][0]["version"] == "0.1.1"
+
+
+def test_dry_run_reuses_plan_until_head_or_tags_move(tmp_path: Path, monkeypatch):
+    _git(tmp_path, "init", "-q")
+    _commit_chart(tmp_path, "alpha", "Add alpha")
+    _git(tmp_path, "tag", "alpha-0.1.0")
+    _git(tmp_path, "pack-refs", "--all")
+    _git(tmp_path, "tag", "-a", "-m", "annotated", "alpha-0.1.1")
+    (tmp_path / "charts" / "alpha" / "Chart.yaml").write_text(
+        "apiVersion: v2\nname: alpha\nversion: 0.1.1\n", encoding="utf-8"
+    )
+    _commit_chart(tmp_path, "alpha", "Tune alpha")
+
+    git = GitClient(tmp_path)
+    assert sorted(git.tag_refs()) == ["alpha-0.1.0", "alpha-0.1.1"]
+    assert git.head_commit() == git.run(["git", "rev-parse", "HEAD"])
+
+    summary_file = tmp_path / "summary.md"
+    config = VersionBumpConfig(
+        repo_root=tmp_path,
+        charts_root=tmp_path / "charts",
+        dry_run=True,
+        push_changes=False,
+        fetch_tags=False,
+        owner_repo="",
+        github_token=None,
+        summary_file=summary_file,
+    )
+    assert VersionBumpManager(config).run() == 0
+    first = summary_file.read_text(encoding="utf-8")
+    assert "New version: 0.1.2" in first
+
+    manager = VersionBumpManager(config)
+    monkeypatch.setattr(manager, "_plan_updates", None)
+    assert manager.run() == 0
+    assert summary_file.read_text(encoding="utf-8") == first * 2
+
+    _git(tmp_path, "tag", "alpha-0.1.2")
+    planned = []
+    manager = VersionBumpManager(config)
+    original = manager._plan_updates
+    monkeypatch.setattr(
+        manager, "_plan_updates", lambda tags: planned.append(tags) or original(tags)
+    )
+    assert manager.run() == 0
+    assert planned and planned[0]["alpha"][0] == "alpha-0.1.2"
+
+
+def test_connection_pool_drops_a_connection_that_timed_out():
+    class SlowHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *_args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/slow":
+                time.sleep(0.5)
+            body = json.dumps({"path": self.path}).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    pool = ConnectionPool(timeout=0.1)
+    try:
+        with pytest.raises(TimeoutError):
+            pool.request("GET", f"{base_url}/slow", {})
+        assert pool._local.connections == {}
+        assert pool._open == []
+
+        # The next request opens a fresh socket instead of failing with
+        # CannotSendRequest on the half-used one.
+        assert pool.request("GET", f"{base_url}/fast", {}) == (200, {"path": "/fast"})
+    finally:
+        pool.close()
+        server.shutdown()
+        server.server_close()
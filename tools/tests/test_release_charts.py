@@ -1,6 +1,14 @@
+import hashlib
+import json
+import subprocess
 import tarfile
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
+import pytest
+
 from tools import release_charts
 
 
@@ -69,3 +77,482 @@ def test_merge_index_replaces_same_version_and_keeps_history(tmp_path: Path):
     assert merged["entries"]["demo"][1]["urls"] == [
         "https://old.example/demo-1.1.0.tgz"
     ]
+
+
+def make_synthetic_package(name: str, version: str, digest: str):
+    return release_charts.ChartPackage(
+        path=Path(f"{name}-{version}.tgz"),
+        name=name,
+        version=version,
+        metadata={"apiVersion": "v2", "name": name, "version": version},
+        digest=digest,
+        created="2026-01-01T00:00:00.000000Z",
+    )
+
+
+def test_merge_index_keeps_unchanged_digest_entries_and_generated():
+    package = make_synthetic_package("demo", "1.0.0", "abc")
+    existing_index = {
+        "apiVersion": "v1",
+        "entries": {
+            "demo": [
+                {
+                    "name": "demo",
+                    "version": "1.0.0",
+                    "digest": "abc",
+                    "created": "2020-01-01T00:00:00.000000Z",
+                    "urls": ["https://old.example/demo-1.0.0.tgz"],
+                }
+            ]
+        },
+        "generated": "2020-01-01T00:00:00.000000Z",
+    }
+
+    merged = release_charts.merge_index(existing_index, [package], "owner", "repo")
+
+    assert merged == existing_index
+
+
+def test_merge_index_bulk_upsert_of_thousands_of_versions(monkeypatch):
+    existing_index = {
+        "apiVersion": "v1",
+        "entries": {
+            "demo": [
+                {"name": "demo", "version": f"1.{minor}.{patch}", "digest": "old"}
+                for minor in range(50)
+                for patch in range(100)
+            ]
+        },
+        "generated": "2020-01-01T00:00:00.000000Z",
+    }
+    packages = [
+        make_synthetic_package("demo", f"2.{minor}.{patch}", "new")
+        for minor in range(20)
+        for patch in range(100)
+    ]
+    packages.append(make_synthetic_package("demo", "1.0.0", "old"))
+
+    sort_keys = []
+    original_sort_key = release_charts.index_entry_sort_key
+
+    def counting_sort_key(version_info):
+        sort_keys.append(version_info["version"])
+        return original_sort_key(version_info)
+
+    monkeypatch.setattr(release_charts, "index_entry_sort_key", counting_sort_key)
+    merged = release_charts.merge_index(existing_index, packages, "owner", "repo")
+
+    versions = [entry["version"] for entry in merged["entries"]["demo"]]
+    assert len(versions) == 7000
+    assert versions[0] == "2.19.99"
+    assert versions[-1] == "1.0.0"
+    assert merged["entries"]["demo"][-1] == {
+        "name": "demo",
+        "version": "1.0.0",
+        "digest": "old",
+    }
+    assert merged["generated"] != existing_index["generated"]
+    # One sort over the merged chart entries, however many packages changed.
+    assert len(sort_keys) == 7000
+
+
+def test_write_pages_index_skips_all_writes_when_nothing_changed(tmp_path: Path):
+    package = release_charts.load_chart_package(
+        create_chart_package(tmp_path, "demo", "1.0.0")
+    )
+    worktree = tmp_path / "pages"
+    worktree.mkdir()
+    existing_index = release_charts.merge_index({}, [package], "owner", "repo")
+    charts_data = release_charts.merge_charts_data({}, [package])
+    (worktree / "charts-data.json").write_text(json.dumps(charts_data))
+
+    release_charts.write_pages_index(
+        worktree,
+        existing_index,
+        [package],
+        "owner",
+        "repo",
+        "gh-pages",
+        Path("index.yaml"),
+    )
+
+    assert sorted(path.name for path in worktree.iterdir()) == ["charts-data.json"]
+
+
+def run_git(*args: str, cwd: Path) -> str:
+    return release_charts.git(*args, cwd=cwd)
+
+
+def init_pages_remote(tmp_path: Path) -> tuple[Path, Path, Path]:
+    remote = tmp_path / "remote.git"
+    run_git("init", "--bare", "-b", "main", str(remote), cwd=tmp_path)
+
+    publisher = tmp_path / "publisher"
+    run_git("clone", str(remote), str(publisher), cwd=tmp_path)
+    run_git("checkout", "--orphan", "gh-pages", cwd=publisher)
+    (publisher / "index.yaml").write_text("apiVersion: v1\n", encoding="utf-8")
+    (publisher / "assets").mkdir()
+    (publisher / "assets" / "large.bin").write_bytes(b"0" * 1024)
+    run_git("add", ".", cwd=publisher)
+    run_git("commit", "-m", "pages", cwd=publisher)
+    run_git("push", "origin", "gh-pages", cwd=publisher)
+
+    repo = tmp_path / "repo"
+    run_git("clone", str(remote), str(repo), cwd=tmp_path)
+    return remote, publisher, repo
+
+
+def test_sparse_worktree_is_reused_and_fast_forwarded(tmp_path: Path, monkeypatch):
+    for key in ("AUTHOR", "COMMITTER"):
+        monkeypatch.setenv(f"GIT_{key}_NAME", "test")
+        monkeypatch.setenv(f"GIT_{key}_EMAIL", "test@example.com")
+    _, publisher, repo = init_pages_remote(tmp_path)
+    worktree = tmp_path / "pages"
+    sparse_paths = ["/index.yaml", *release_charts.PAGES_SPARSE_PATHS]
+
+    release_charts.ensure_sparse_git_worktree(repo, "gh-pages", worktree, sparse_paths)
+
+    assert (worktree / "index.yaml").exists()
+    assert not (worktree / "assets").exists()
+    first_head = run_git("rev-parse", "HEAD", cwd=worktree)
+    marker = worktree / ".keep-me"
+    marker.write_text("", encoding="utf-8")
+
+    (publisher / "index.yaml").write_text("apiVersion: v1\nentries: {}\n")
+    run_git("commit", "-am", "update", cwd=publisher)
+    run_git("push", "origin", "gh-pages", cwd=publisher)
+
+    release_charts.ensure_sparse_git_worktree(repo, "gh-pages", worktree, sparse_paths)
+
+    assert marker.exists()
+    assert run_git("rev-parse", "HEAD^", cwd=worktree) == first_head
+    assert "entries" in (worktree / "index.yaml").read_text(encoding="utf-8")
+
+
+def test_reused_worktree_fails_when_fetch_fails(tmp_path: Path, monkeypatch):
+    for key in ("AUTHOR", "COMMITTER"):
+        monkeypatch.setenv(f"GIT_{key}_NAME", "test")
+        monkeypatch.setenv(f"GIT_{key}_EMAIL", "test@example.com")
+    remote, _, repo = init_pages_remote(tmp_path)
+    worktree = tmp_path / "pages"
+    sparse_paths = ["/index.yaml", *release_charts.PAGES_SPARSE_PATHS]
+    release_charts.ensure_sparse_git_worktree(repo, "gh-pages", worktree, sparse_paths)
+
+    remote.rename(tmp_path / "moved.git")
+
+    with pytest.raises(subprocess.CalledProcessError):
+        release_charts.ensure_sparse_git_worktree(
+            repo, "gh-pages", worktree, sparse_paths
+        )
+
+
+def test_split_published_packages_skips_matching_digests():
+    published = make_synthetic_package("demo", "1.0.0", "same")
+    rebuilt = make_synthetic_package("demo", "1.1.0", "changed")
+    new = make_synthetic_package("other", "0.1.0", "fresh")
+    existing_index = {
+        "entries": {
+            "demo": [
+                {"version": "1.1.0", "digest": "previous"},
+                {"version": "1.0.0", "digest": "same"},
+            ]
+        }
+    }
+
+    pending, skipped = release_charts.split_published_packages(
+        existing_index, [published, rebuilt, new]
+    )
+
+    assert pending == [rebuilt, new]
+    assert skipped == [published]
+
+
+def test_upload_release_asset_skips_existing_asset(monkeypatch):
+    package = make_synthetic_package("demo", "1.0.0", "abc")
+    client = release_charts.GitHubClient("owner", "repo", "token", "https://api")
+    calls = []
+    monkeypatch.setattr(client, "_request", lambda *args, **kwargs: calls.append(args))
+
+    release = {
+        "id": 1,
+        "assets": [{"name": package.filename, "digest": "sha256:abc"}],
+    }
+    client.upload_release_asset(release, package)
+
+    assert calls == []
+
+
+def test_upload_release_asset_replaces_mismatched_asset(tmp_path: Path, monkeypatch):
+    package = release_charts.load_chart_package(
+        create_chart_package(tmp_path, "demo", "1.0.0")
+    )
+    client = release_charts.GitHubClient("owner", "repo", "token", "https://api")
+    calls = []
+    monkeypatch.setattr(
+        client, "_request", lambda method, url, **kwargs: calls.append((method, url))
+    )
+
+    release = {
+        "id": 1,
+        "upload_url": "https://uploads/assets{?name,label}",
+        "assets": [{"id": 7, "name": package.filename, "digest": "sha256:old"}],
+    }
+    client.upload_release_asset(release, package)
+
+    assert calls == [
+        ("DELETE", "https://api/repos/owner/repo/releases/assets/7"),
+        ("POST", f"https://uploads/assets?name={package.filename}"),
+    ]
+
+
+@pytest.mark.parametrize(
+    ("uploaded", "expected"),
+    [
+        ("same", ["GET"]),
+        ("same-size", ["GET", "DELETE", "POST"]),
+        ("resized", ["DELETE", "POST"]),
+    ],
+)
+def test_upload_release_asset_compares_assets_without_a_digest(
+    tmp_path: Path, monkeypatch, uploaded, expected
+):
+    package = release_charts.load_chart_package(
+        create_chart_package(tmp_path, "demo", "1.0.0")
+    )
+    data = package.path.read_bytes()
+    remote = {
+        "same": data,
+        "same-size": bytes(len(data)),
+        "resized": data + b"\0",
+    }[uploaded]
+    client = release_charts.GitHubClient("owner", "repo", "token", "https://api")
+    calls = []
+
+    def fake_request(method, url, **kwargs):
+        calls.append(method)
+        if method == "GET":
+            assert kwargs["accept"] == "application/octet-stream"
+            return 200, remote
+        return 201, None
+
+    monkeypatch.setattr(client, "_request", fake_request)
+
+    release = {
+        "id": 1,
+        "upload_url": "https://uploads/assets{?name,label}",
+        "assets": [
+            {
+                "id": 7,
+                "name": package.filename,
+                "size": len(remote),
+                "url": "https://api/repos/owner/repo/releases/assets/7",
+            }
+        ],
+    }
+    client.upload_release_asset(release, package)
+
+    assert calls == expected
+
+
+def test_generate_search_index_maps_tokens_to_charts_and_versions():
+    merged_index = {
+        "entries": {
+            "valheim": [
+                {
+                    "version": "2.0.0",
+                    "description": "Game server",
+                    "keywords": ["viking"],
+                },
+                {"version": "1.0.0"},
+            ],
+            "redis-cache": [{"version": "0.1.0", "description": "Cache"}],
+        }
+    }
+    charts_data = {
+        "valheim": {
+            "2.0.0": "image:\n  pullPolicy: Always\nbackups:\n  enabled: true\n",
+            "1.0.0": "image:\n  pullPolicy: Always\n",
+        }
+    }
+
+    search_index = release_charts.generate_search_index(merged_index, charts_data)
+
+    assert search_index["charts"] == ["redis-cache", "valheim"]
+    assert search_index["versions"] == [[1, "2.0.0"], [1, "1.0.0"]]
+    assert search_index["chartTokens"]["vik"] == [1]
+    assert search_index["chartTokens"]["redis"] == [0]
+    assert search_index["valueTokens"]["policy"] == [0, 1]
+    assert search_index["valueTokens"]["pullpolicy"] == [0, 1]
+    assert search_index["valueTokens"]["backups"] == [0]
+    assert search_index["valueTokens"]["pullp"] == [0, 1]
+    assert search_index["valueTokens"]["back"] == [0]
+    assert release_charts.search_tokens("pullPolicy") == {
+        "pullpolicy",
+        "pull",
+        "policy",
+    }
+
+
+class FakeRegistryHandler(BaseHTTPRequestHandler):
+    blobs: dict[str, bytes] = {}
+    manifests: dict[str, bytes] = {}
+    requests: list[tuple[str, str]] = []
+
+    def log_message(self, *_args):
+        pass
+
+    def _reply(self, status: int, headers: dict[str, str] | None = None) -> None:
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _record(self) -> urllib.parse.SplitResult:
+        self.requests.append((self.command, self.path))
+        return urllib.parse.urlsplit(self.path)
+
+    def do_HEAD(self):
+        url = self._record()
+        if "/manifests/" in url.path:
+            manifest = self.manifests.get(url.path)
+            if manifest is None:
+                return self._reply(404)
+            digest = f"sha256:{hashlib.sha256(manifest).hexdigest()}"
+            return self._reply(200, {"Docker-Content-Digest": digest})
+        digest = url.path.rsplit("/", 1)[-1]
+        self._reply(200 if digest in self.blobs else 404)
+
+    def do_POST(self):
+        url = self._record()
+        self._reply(202, {"Location": f"{url.path}{len(self.requests)}?state=x"})
+
+    def do_PUT(self):
+        url = self._record()
+        body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        if "/manifests/" in url.path:
+            self.manifests[url.path] = body
+        else:
+            digest = urllib.parse.parse_qs(url.query)["digest"][0]
+            assert digest == f"sha256:{hashlib.sha256(body).hexdigest()}"
+            self.blobs[digest] = body
+        self._reply(201)
+
+
+def test_publish_oci_packages_skips_existing_blobs(tmp_path: Path):
+    FakeRegistryHandler.blobs = {}
+    FakeRegistryHandler.manifests = {}
+    FakeRegistryHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRegistryHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        packages = [
+            release_charts.load_chart_package(
+                create_chart_package(tmp_path, "demo", version)
+            )
+            for version in ("1.0.0", "1.1.0+build")
+        ]
+        client = release_charts.OciRegistryClient(
+            f"http://127.0.0.1:{server.server_port}/charts", None, None
+        )
+
+        release_charts.publish_oci_packages(client, packages, concurrency=4)
+
+        assert set(FakeRegistryHandler.manifests) == {
+            "/v2/charts/demo/manifests/1.0.0",
+            "/v2/charts/demo/manifests/1.1.0_build",
+        }
+        manifest = json.loads(
+            FakeRegistryHandler.manifests["/v2/charts/demo/manifests/1.0.0"]
+        )
+        assert manifest["config"]["mediaType"] == (
+            release_charts.HELM_CONFIG_MEDIA_TYPE
+        )
+        assert manifest["layers"][0]["digest"] == f"sha256:{packages[0].digest}"
+        assert len(FakeRegistryHandler.blobs) == 4
+
+        FakeRegistryHandler.requests = []
+        del FakeRegistryHandler.manifests["/v2/charts/demo/manifests/1.0.0"]
+        release_charts.publish_oci_packages(client, packages, concurrency=4)
+
+        methods = [method for method, _ in FakeRegistryHandler.requests]
+        # Both manifests are checked; only the missing one is pushed again,
+        # and its blobs are already in the registry.
+        assert methods.count("HEAD") == 4
+        assert "POST" not in methods
+        assert FakeRegistryHandler.requests[-1] == (
+            "PUT",
+            "/v2/charts/demo/manifests/1.0.0",
+        )
+        assert methods.count("PUT") == 1
+
+        FakeRegistryHandler.requests = []
+        release_charts.publish_oci_packages(client, packages, concurrency=4)
+
+        assert [method for method, _ in FakeRegistryHandler.requests] == ["HEAD"] * 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_reloaded_package_is_detected_as_already_pushed(tmp_path: Path, monkeypatch):
+    FakeRegistryHandler.blobs = {}
+    FakeRegistryHandler.manifests = {}
+    FakeRegistryHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRegistryHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    package_path = create_chart_package(tmp_path, "demo", "1.0.0")
+    try:
+        client = release_charts.OciRegistryClient(
+            f"http://127.0.0.1:{server.server_port}/charts", None, None
+        )
+        monkeypatch.setattr(
+            release_charts, "utc_timestamp", lambda: "2024-01-01T00:00:00.000000Z"
+        )
+        first = release_charts.load_chart_package(package_path)
+        release_charts.publish_oci_packages(client, [first], concurrency=1)
+
+        # A later run loads the same .tgz at another time.
+        monkeypatch.setattr(
+            release_charts, "utc_timestamp", lambda: "2024-06-01T00:00:00.000000Z"
+        )
+        reloaded = release_charts.load_chart_package(package_path)
+        artifact = release_charts.build_oci_artifact(reloaded, "charts/demo")
+
+        assert artifact.manifest == (
+            release_charts.build_oci_artifact(first, "charts/demo").manifest
+        )
+        assert client.manifest_exists(artifact)
+        FakeRegistryHandler.requests = []
+        release_charts.publish_oci_packages(client, [reloaded], concurrency=1)
+        assert [method for method, _ in FakeRegistryHandler.requests] == ["HEAD"]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_oci_client_fetches_one_token_per_scope_under_concurrency(monkeypatch):
+    client = release_charts.OciRegistryClient("registry.example/charts", None, None)
+    fetched = []
+    gate = threading.Barrier(8)
+
+    def fetch_token(challenge, scope):
+        fetched.append(scope)
+        return "token"
+
+    monkeypatch.setattr(client, "_fetch_token", fetch_token)
+
+    def authenticate():
+        gate.wait()
+        return client._authenticate('Bearer realm="r"', "repository:a:push", None)
+
+    threads = [threading.Thread(target=authenticate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fetched == ["repository:a:push"]
+    assert client._authenticate('Bearer realm="r"', "repository:a:push", "token")
+    assert fetched == ["repository:a:push"] * 2
@@ -1,59 +1,125 @@
 import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
+import yaml
+
 from tools import upgrade
+from tools.tests.fake_registry import (
+    FakeRegistry,
+    default_chart_paths,
+    digest_of,
+    run_benchmark,
+)
+from tools.upgrading.http import AsyncHttpClient, HttpError, HttpResponse
+from tools.upgrading.policy import PolicyRule, PolicySet, compile_policy
+from tools.upgrading.spans import YamlDocument, patch_scalars, set_top_level_scalar
 
 
-def test_save_yaml_preserves_existing_quotes(tmp_path: Path):
-    values_path = tmp_path / "values.yaml"
-    values_path.write_text(
-        """
+def test_values_patch_preserves_existing_quotes():
+    original = """
 image:
   repository: busybox
   tag: "1.37"
 backups:
   schedule: "0 2 * * *"
   image: "mbround18/backup-cron:latest"
-""".lstrip(),
-        encoding="utf-8",
-    )
-
-    values_data = upgrade.load_yaml_file(values_path)
-    values_data["image"]["tag"] = upgrade.apply_scalar_style(
-        "1.38", values_data["image"]["tag"]
-    )
+""".lstrip()
+    document = YamlDocument(original)
+    images = {img["path"]: img for img in upgrade.find_images_in_values(document)}
 
-    upgrade.save_yaml_file(values_path, values_data)
-    rendered = values_path.read_text(encoding="utf-8")
+    rendered = patch_scalars(original, [(images["image"]["span"], "1.38")])
 
     assert 'tag: "1.38"' in rendered
     assert 'schedule: "0 2 * * *"' in rendered
     assert 'image: "mbround18/backup-cron:latest"' in rendered
 
 
-def test_save_chart_yaml_keeps_icon_inline_and_app_version_quoted(tmp_path: Path):
-    chart_path = tmp_path / "Chart.yaml"
-    chart_path.write_text(
-        """
+def test_set_app_version_keeps_icon_inline_and_quotes():
+    original = """
 apiVersion: v2
 name: demo
 icon: https://example.com/logo.png
 version: 0.1.0
 appVersion: "main"
-""".lstrip(),
-        encoding="utf-8",
+""".lstrip()
+
+    rendered = set_top_level_scalar(YamlDocument(original), "appVersion", "v1.2.3")
+
+    assert "icon: https://example.com/logo.png" in rendered
+    assert 'appVersion: "v1.2.3"' in rendered
+
+
+def test_patch_keeps_anchors_and_tags_before_the_value():
+    original = "image:\n  tag: &tag !!str 1.37\nsidecar:\n  tag: *tag\n"
+    document = YamlDocument(original)
+    span = document.root.value[0][1].value[0][1]
+
+    patched = patch_scalars(original, [(document.span(span), "1.38")])
+
+    assert patched == original.replace("1.37", "'1.38'")
+    assert yaml.safe_load(patched)["sidecar"]["tag"] == "1.38"
+
+
+def test_patch_separates_empty_values_from_key_and_anchor():
+    for original in ("appVersion:\nname: demo\n", "appVersion: &app\nname: demo\n"):
+        document = YamlDocument(original)
+        patched = set_top_level_scalar(document, "appVersion", "v1.0.0")
+
+        assert yaml.safe_load(patched) == {"appVersion": "v1.0.0", "name": "demo"}
+        assert patched.startswith(original.split("\n", 1)[0] + " v1.0.0\n")
+
+
+def test_values_patch_rewrites_only_tag_spans():
+    original = """# Top comment kept verbatim
+image:   {repository: busybox, tag: '1.37'}   # flow style
+sidecar:
+  image: "ghcr.io/acme/agent:v1.2.0"  # pinned
+jobs:
+  - name: cleanup
+    image:
+        repository: redis
+        tag: 8-alpine
+schedule: "0 2 * * *"
+"""
+    document = YamlDocument(original)
+    images = {img["path"]: img for img in upgrade.find_images_in_values(document)}
+
+    assert images["sidecar.image"]["current_tag"] == "v1.2.0"
+    assert images["jobs.0.image"]["current_repository"] == "redis"
+
+    patched = patch_scalars(
+        original,
+        [
+            (images["image"]["span"], "1.38"),
+            (images["sidecar.image"]["span"], "ghcr.io/acme/agent:v1.3.0"),
+            (images["jobs.0.image"]["span"], "8.2-alpine"),
+        ],
     )
 
-    chart_data = upgrade.load_yaml_file(chart_path)
-    chart_data["appVersion"] = upgrade.apply_scalar_style(
-        "v1.2.3", chart_data["appVersion"]
+    assert patched == (
+        original.replace("'1.37'", "'1.38'")
+        .replace(":v1.2.0", ":v1.3.0")
+        .replace("tag: 8-alpine", "tag: 8.2-alpine")
     )
 
-    upgrade.save_yaml_file(chart_path, chart_data)
-    rendered = chart_path.read_text(encoding="utf-8")
 
-    assert "icon: https://example.com/logo.png" in rendered
-    assert 'appVersion: "v1.2.3"' in rendered
+def test_set_app_version_quotes_numeric_values():
+    patched = set_top_level_scalar(
+        YamlDocument("apiVersion: v2\nname: demo\nversion: 0.1.0\n"),
+        "appVersion",
+        "18.6",
+    )
+    assert patched.endswith("version: 0.1.0\nappVersion: '18.6'\n")
+
+    patched = set_top_level_scalar(
+        YamlDocument("name: demo # keep\nappVersion: v1.0.0 # app\n"),
+        "appVersion",
+        "v1.1.0",
+    )
+    assert patched == "name: demo # keep\nappVersion: v1.1.0 # app\n"
 
 
 def test_get_latest_stable_tag_honors_min_age():
@@ -68,6 +134,84 @@ def test_get_latest_stable_tag_honors_min_age():
     assert upgrade.get_latest_stable_tag(tags, min_age_days=14) == "v1.0.0"
 
 
+def test_policy_keeps_variant_and_major():
+    old = upgrade.datetime.datetime(2020, 1, 1, tzinfo=upgrade.datetime.timezone.utc)
+    tags = [
+        (tag, old)
+        for tag in [
+            "8-alpine",
+            "8.2-alpine",
+            "9-alpine",
+            "8.4",
+            "8.3-alpine3.20",
+            "latest",
+        ]
+    ]
+
+    rule = PolicyRule(variant="alpine", pin_major=True)
+
+    assert (
+        upgrade.get_latest_stable_tag(tags, rule=rule, current_tag="8-alpine")
+        == "8.2-alpine"
+    )
+    assert (
+        upgrade.get_latest_stable_tag(tags, rule=PolicyRule(variant="alpine"))
+        == "9-alpine"
+    )
+    assert upgrade.get_latest_stable_tag(tags, rule=PolicyRule(pattern=r"\d+")) is None
+    assert upgrade.get_latest_stable_tag(tags) == "8.4"
+
+
+def test_chart_annotation_policy_applies_per_image(tmp_path: Path):
+    chart_dir = tmp_path / "redis"
+    chart_dir.mkdir()
+    (chart_dir / "Chart.yaml").write_text(
+        """apiVersion: v2
+name: redis
+version: 0.1.0
+annotations:
+  mbround18.github.io/upgrade-policy: |
+    redis:
+      variant: alpine
+      pinMajor: true
+""",
+        encoding="utf-8",
+    )
+    (chart_dir / "values.yaml").write_text(
+        "image:\n  repository: docker.io/library/redis\n  tag: 8-alpine\n",
+        encoding="utf-8",
+    )
+    policies = PolicySet.from_mapping({"default": {"lookbackDays": 30}})
+
+    plan = upgrade.load_chart_plan(chart_dir, policies)
+
+    assert plan.exit_code == 0
+    assert plan.policies.for_image("docker.io/library/redis", "image") == PolicyRule(
+        variant="alpine", pin_major=True
+    )
+    assert plan.policies.for_image("busybox") == PolicyRule(lookback_days=30)
+
+
+def test_policy_selection_handles_50k_tags():
+    start = upgrade.datetime.datetime(2024, 1, 1, tzinfo=upgrade.datetime.timezone.utc)
+    tags = []
+    for index in range(50_000):
+        major, minor, patch = index // 2500, (index // 50) % 50, index % 50
+        suffix = ("", "-alpine", "-rc1", "-bookworm")[index % 4]
+        tags.append(
+            (
+                f"{major}.{minor}.{patch}{suffix}",
+                start + upgrade.datetime.timedelta(minutes=index),
+            )
+        )
+    policy = compile_policy(PolicyRule(variant="alpine", pin_major=True))
+
+    best = policy.select(tags, current_tag="3.0.1-alpine")
+    assert policy.select(tags, current_tag="3.0.1-alpine") == best
+
+    assert best == "3.49.47-alpine"
+
+
 def test_parse_args_supports_multiple_chart_paths():
     args = upgrade.parse_args(["charts/one", "charts/two", "--chart-concurrency", "2"])
 
@@ -99,10 +243,14 @@ image:
     )
 
     now = upgrade.datetime.datetime.now(upgrade.datetime.timezone.utc)
+
+    async def fake_docker_hub_tags(repository, session, window=None):
+        return [("1.38", now - upgrade.datetime.timedelta(days=30))]
+
     monkeypatch.setattr(
         upgrade,
         "get_docker_hub_tags",
-        lambda repository: [("1.38", now - upgrade.datetime.timedelta(days=30))],
+        fake_docker_hub_tags,
     )
 
     exit_code, logs = asyncio.run(
@@ -117,3 +265,597 @@ image:
     assert 'appVersion: "1.38"' in (chart_dir / "Chart.yaml").read_text(
         encoding="utf-8"
     )
+
+
+class FakeHttp:
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = []
+
+    async def get(self, url, headers=None):
+        return self.respond("GET", url, headers)
+
+    async def head(self, url, headers=None):
+        return self.respond("HEAD", url, headers)
+
+    def respond(self, method, url, headers):
+        self.calls.append((url, headers) if method == "GET" else (method, url))
+        status, payload, response_headers = self.handler(url, headers)
+        body = (
+            json.dumps(payload).encode()
+            if payload is not None and method == "GET"
+            else b""
+        )
+        return HttpResponse(
+            status,
+            {key.lower(): value for key, value in (response_headers or {}).items()},
+            body,
+            url,
+        )
+
+
+def test_registry_cache_serves_fresh_tags_without_network(tmp_path: Path):
+    now = upgrade.datetime.datetime.now(upgrade.datetime.timezone.utc)
+    http = FakeHttp(
+        lambda url, headers: (
+            200,
+            {
+                "results": [{"name": "1.38", "last_updated": now.isoformat()}],
+                "next": None,
+            },
+            {"ETag": '"v1"'},
+        )
+    )
+    cache = upgrade.RegistryCache(tmp_path / "cache.sqlite3", ttl_seconds=3600)
+    session = upgrade.RegistrySession(http, cache)
+
+    first = asyncio.run(
+        upgrade.get_tags_for_repository("docker.io", "busybox", session)
+    )
+    second = asyncio.run(
+        upgrade.get_tags_for_repository("docker.io", "busybox", session)
+    )
+
+    assert first == second == [("1.38", now)]
+    assert len(http.calls) == 1
+    assert (tmp_path / "cache.sqlite3").stat().st_mode & 0o777 == 0o600
+
+    refreshed = upgrade.RegistryCache(
+        tmp_path / "cache.sqlite3", ttl_seconds=3600, refresh=True
+    )
+    asyncio.run(
+        upgrade.get_tags_for_repository(
+            "docker.io", "busybox", upgrade.RegistrySession(http, refreshed)
+        )
+    )
+    assert len(http.calls) == 2
+
+
+def test_docker_hub_paging_stops_past_current_tag(tmp_path: Path):
+    now = upgrade.datetime.datetime.now(upgrade.datetime.timezone.utc)
+    days = upgrade.datetime.timedelta
+
+    def page(names, age):
+        return [
+            {"name": name, "last_updated": (now - days(days=age)).isoformat()}
+            for name in names
+        ]
+
+    pages = {
+        1: (page(["1.40", "1.39"], 1), 2),
+        2: (page(["1.38", "1.37"], 30), 3),
+        3: (page(["1.36", "1.35"], 400), None),
+    }
+
+    def handler(url, headers):
+        number = int(url.rsplit("page=", 1)[1]) if "page=" in url else 1
+        results, next_page = pages[number]
+        next_url = (
+            f"https://hub.docker.com/v2/repositories/library/busybox/tags/?page={next_page}"
+            if next_page
+            else None
+        )
+        return 200, {"results": results, "next": next_url}, None
+
+    http = FakeHttp(handler)
+    cache = upgrade.RegistryCache(tmp_path / "cache.sqlite3", ttl_seconds=3600)
+    session = upgrade.RegistrySession(http, cache)
+    window = upgrade.TagWindow(frozenset({"1.39"}))
+
+    tags = asyncio.run(upgrade.get_docker_hub_tags("busybox", session, window=window))
+
+    assert [name for name, _ in tags] == ["1.40", "1.39", "1.38", "1.37"]
+    assert len(http.calls) == 2
+    assert "ordering=last_updated" in http.calls[0][0]
+    # The truncated listing is cached as partial and serves any window it
+    # reaches past without a request.
+    assert cache.get_tags("docker.io", "busybox").complete is False
+    again = asyncio.run(
+        upgrade.get_tags_for_repository("docker.io", "busybox", session, window)
+    )
+    assert again == tags
+    assert len(http.calls) == 2
+
+    # An older current tag needs the pages the first walk skipped.
+    older = upgrade.TagWindow(frozenset({"1.35"}))
+    full = asyncio.run(
+        upgrade.get_tags_for_repository("docker.io", "busybox", session, older)
+    )
+    assert len(full) == 6
+    assert len(http.calls) == 5
+    assert cache.get_tags("docker.io", "busybox").complete is True
+    cache.close()
+
+
+def test_quay_paging_stops_at_lookback_cutoff():
+    now = upgrade.datetime.datetime.now(upgrade.datetime.timezone.utc)
+
+    def handler(url, headers):
+        number = int(url.split("page=", 1)[1].split("&", 1)[0])
+        age = upgrade.datetime.timedelta(days=100 * number)
+        return (
+            200,
+            {
+                "tags": [
+                    {
+                        "name": f"v{10 - number}.0",
+                        "last_modified": (now - age).isoformat(),
+                    }
+                ],
+                "page": number,
+                "has_additional": number < 9,
+            },
+            None,
+        )
+
+    http = FakeHttp(handler)
+    session = upgrade.RegistrySession(http)
+    window = upgrade.TagWindow(
+        frozenset({"v0.1"}), now - upgrade.datetime.timedelta(days=250)
+    )
+
+    tags = asyncio.run(upgrade.get_quay_tags("quay.io/org/app", session, window=window))
+
+    assert [name for name, _ in tags] == ["v9.0", "v8.0", "v7.0"]
+    assert len(http.calls) == 3
+    assert "onlyActiveTags=true" in http.calls[0][0]
+
+
+def test_ghcr_age_filter_looks_up_only_top_candidates(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(upgrade, "DATE_LOOKUP_BATCH_SIZE", 3)
+    now = upgrade.datetime.datetime.now(upgrade.datetime.timezone.utc)
+    ages = {"2.0": 1, "1.9": 5, "1.8": 60, "1.7": 90, "1.0": 400}
+    base = "https://ghcr.io/v2/acme/app"
+
+    def handler(url, headers):
+        if url.startswith("https://ghcr.io/token"):
+            return 200, {"token": "t"}, None
+        name = url.rsplit("/", 1)[1]
+        if "/manifests/" in url:
+            tag = name.removeprefix("sha256:index-")
+            if tag == "2.0":
+                # Multi-arch tags resolve through the platform manifest.
+                manifests = [
+                    {
+                        "digest": "sha256:arm-2.0",
+                        "platform": {"os": "linux", "architecture": "arm64"},
+                    },
+                    {
+                        "digest": "sha256:amd-2.0",
+                        "platform": {"os": "linux", "architecture": "amd64"},
+                    },
+                ]
+                return (
+                    200,
+                    {"manifests": manifests},
+                    {"Docker-Content-Digest": "sha256:index-2.0"},
+                )
+            tag = tag.removeprefix("sha256:amd-")
+            return (
+                200,
+                {"config": {"digest": f"sha256:config-{tag}"}},
+                {"Docker-Content-Digest": f"sha256:manifest-{tag}"},
+            )
+        tag = name.removeprefix("sha256:config-")
+        created = now - upgrade.datetime.timedelta(days=ages[tag])
+        return 200, {"created": created.strftime("%Y-%m-%dT%H:%M:%S.123456789Z")}, None
+
+    cache = upgrade.RegistryCache(tmp_path / "cache.sqlite3", ttl_seconds=3600)
+    cache.put_tags("ghcr.io", "ghcr.io/acme/app", list(ages))
+    img_info = {
+        "current_repository": "ghcr.io/acme/app",
+        "current_tag": "1.0",
+        "path": "image",
+    }
+
+    def resolve(http):
+        resolver = upgrade.TagResolver(
+            asyncio.Semaphore(1), upgrade.RegistrySession(http, cache)
+        )
+        return asyncio.run(upgrade.resolve_image_update(img_info, 30, resolver))
+
+    http = FakeHttp(handler)
+    result, _ = resolve(http)
+    assert result["new_tag"] == "1.8"
+    requested = [call[0] for call in http.calls if call[0] != "HEAD"]
+    assert f"{base}/blobs/sha256:config-1.7" not in requested
+    assert f"{base}/manifests/sha256:amd-2.0" in requested
+
+    # Tag digests and their dates are cached, so a rerun within the TTL makes
+    # no requests at all.
+    http = FakeHttp(handler)
+    result, _ = resolve(http)
+    assert result["new_tag"] == "1.8"
+    assert http.calls == []
+    cache.close()
+
+
+def test_registry_cache_revalidates_stale_tags_with_etag(tmp_path: Path):
+    cache = upgrade.RegistryCache(tmp_path / "cache.sqlite3", ttl_seconds=0)
+    cache.put_tags("ghcr.io", "ghcr.io/org/app", ["v1.0.0"], etag='"abc"')
+    cache.put_token("ghcr.io:repository:org/app:pull", "token", expires_in=300)
+    http = FakeHttp(lambda url, headers: (304, None, None))
+
+    tags = asyncio.run(
+        upgrade.get_tags_for_repository(
+            "ghcr.io", "ghcr.io/org/app", upgrade.RegistrySession(http, cache)
+        )
+    )
+
+    assert tags == ["v1.0.0"]
+    assert http.calls == [
+        (
+            "https://ghcr.io/v2/org/app/tags/list",
+            {"Authorization": "Bearer token", "If-None-Match": '"abc"'},
+        )
+    ]
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections: set[int] = set()
+    throttled = 0
+
+    def log_message(self, *_args):
+        pass
+
+    def do_GET(self):
+        self.connections.add(self.client_address[1])
+        if self.path == "/limited" and KeepAliveHandler.throttled < 1:
+            KeepAliveHandler.throttled += 1
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps({"path": self.path}).encode()
+        self.send_response(200)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n0\r\n\r\n")
+
+
+def test_async_http_client_reuses_connections_and_retries_429():
+    KeepAliveHandler.connections = set()
+    KeepAliveHandler.throttled = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    async def run():
+        async with upgrade.AsyncHttpClient(max_connections_per_host=1) as http:
+            responses = [await http.get(f"{base_url}/page/{i}") for i in range(3)]
+            responses.append(await http.get(f"{base_url}/limited"))
+            return responses, http.stats
+
+    try:
+        responses, stats = asyncio.run(run())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert [response.json()["path"] for response in responses] == [
+        "/page/0",
+        "/page/1",
+        "/page/2",
+        "/limited",
+    ]
+    assert len(KeepAliveHandler.connections) == 1
+    assert stats["127.0.0.1"].requests == 5
+
+
+class RedirectHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests: list[tuple[str, str]] = []
+
+    def log_message(self, *_args):
+        pass
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self.requests.append((self.command, self.path))
+        if self.path.endswith("/upload"):
+            self.send_response(303)
+            self.send_header("Location", "/result")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps({"method": self.command, "path": self.path}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _reply
+    do_POST = _reply
+
+
+def serve(handler: type[BaseHTTPRequestHandler]) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_async_http_client_follows_303_with_get():
+    RedirectHandler.requests = []
+    server = serve(RedirectHandler)
+
+    async def run():
+        async with upgrade.AsyncHttpClient() as http:
+            return await http.request(
+                "POST", f"http://127.0.0.1:{server.server_port}/upload", body=b"{}"
+            )
+
+    try:
+        response = asyncio.run(run())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert response.json() == {"method": "GET", "path": "/result"}
+    assert RedirectHandler.requests == [("POST", "/upload"), ("GET", "/result")]
+
+
+def test_async_http_client_uses_proxy_from_environment(monkeypatch):
+    RedirectHandler.requests = []
+    proxy = serve(RedirectHandler)
+    for name in ("http_proxy", "all_proxy", "ALL_PROXY", "no_proxy", "NO_PROXY"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("HTTP_PROXY", f"http://127.0.0.1:{proxy.server_port}")
+
+    async def run():
+        async with upgrade.AsyncHttpClient() as http:
+            return await http.get("http://registry.invalid/v2/")
+
+    try:
+        response = asyncio.run(run())
+    finally:
+        proxy.shutdown()
+        proxy.server_close()
+
+    assert response.json()["path"] == "http://registry.invalid/v2/"
+    assert RedirectHandler.requests == [("GET", "http://registry.invalid/v2/")]
+
+
+def test_async_main_resolves_each_repository_once(tmp_path: Path, monkeypatch):
+    chart_paths = []
+    for name in ("one", "two"):
+        chart_dir = tmp_path / name
+        chart_dir.mkdir()
+        (chart_dir / "Chart.yaml").write_text(
+            f"apiVersion: v2\nname: {name}\nversion: 0.1.0\n", encoding="utf-8"
+        )
+        (chart_dir / "values.yaml").write_text(
+            """
+database:
+  image:
+    repository: postgres
+    tag: "16.1"
+replica:
+  image: library/postgres:16.1
+""".lstrip(),
+            encoding="utf-8",
+        )
+        chart_paths.append(str(chart_dir))
+
+    now = upgrade.datetime.datetime.now(upgrade.datetime.timezone.utc)
+    calls = []
+
+    async def fake_docker_hub_tags(repository, session, window=None):
+        calls.append(repository)
+        return [("16.2", now - upgrade.datetime.timedelta(days=30))]
+
+    monkeypatch.setattr(upgrade, "get_docker_hub_tags", fake_docker_hub_tags)
+    args = upgrade.parse_args(
+        [*chart_paths, "--cache-path", str(tmp_path / "cache.sqlite3"), "--refresh"]
+    )
+
+    assert asyncio.run(upgrade.async_main(args)) == 0
+    assert len(calls) == 1
+    for chart_path in chart_paths:
+        rendered = (Path(chart_path) / "values.yaml").read_text(encoding="utf-8")
+        assert 'tag: "16.2"' in rendered
+        assert "image: library/postgres:16.2" in rendered
+
+
+# Requests per registry host for a full replayed upgrade of every chart, as
+# measured when the budget was last set. The budget allows 25% (at least two
+# requests) on top so adding a chart or an image does not fail the suite,
+# while a change that multiplies registry traffic still does. Re-measure and
+# raise these deliberately when a change needs more traffic.
+REPLAY_REQUEST_BASELINE = {"hub.docker.com": 31, "ghcr.io": 42, "quay.io": 2}
+REPLAY_REQUEST_BUDGET = {
+    host: requests + max(requests // 4, 2)
+    for host, requests in REPLAY_REQUEST_BASELINE.items()
+}
+
+
+def test_ghcr_tags_follow_link_pagination_through_replay_server():
+    fixtures = {"ghcr.io/acme/app": [(f"1.{n}.0", n) for n in range(60)]}
+
+    async def fetch(server):
+        async with AsyncHttpClient(origin_overrides=server.origin_overrides) as http:
+            tags = await upgrade.get_ghcr_tags(
+                "ghcr.io/acme/app", upgrade.RegistrySession(http)
+            )
+            return tags, http.stats["ghcr.io"].requests
+
+    with FakeRegistry(fixtures, page_size=25) as server:
+        tags, requests = asyncio.run(fetch(server))
+
+    assert sorted(tags) == sorted(tag for tag, _ in fixtures["ghcr.io/acme/app"])
+    # One token request plus three pages of 25.
+    assert requests == 4
+
+
+def test_replayed_upgrade_of_all_charts_stays_within_request_budget(tmp_path: Path):
+    result = run_benchmark(default_chart_paths(), tmp_path)
+
+    assert result.exit_code == 0
+    for host, budget in REPLAY_REQUEST_BUDGET.items():
+        assert result.requests[host] <= budget, (host, result.requests[host])
+
+
+def test_replayed_rerun_within_ttl_makes_no_requests(tmp_path: Path):
+    cache_path = tmp_path / "cache.sqlite3"
+    first = run_benchmark(
+        default_chart_paths(), tmp_path / "first", cache_path=cache_path
+    )
+    second = run_benchmark(
+        default_chart_paths(), tmp_path / "second", cache_path=cache_path
+    )
+
+    assert first.exit_code == second.exit_code == 0
+    assert sum(first.requests.values()) > 0
+    assert dict(second.requests) == {}
+
+
+def test_plan_then_apply_edits_only_selected_charts(tmp_path: Path):
+    charts = []
+    for name in ("app", "worker"):
+        chart_dir = tmp_path / name
+        chart_dir.mkdir()
+        (chart_dir / "Chart.yaml").write_text(
+            f"apiVersion: v2\nname: {name}\nversion: 0.1.0\nappVersion: '1.0'\n",
+            encoding="utf-8",
+        )
+        (chart_dir / "values.yaml").write_text(
+            f"image:\n  repository: acme/{name}\n  tag: '1.0'\n", encoding="utf-8"
+        )
+        charts.append(chart_dir)
+    fixtures = {
+        f"docker.io/acme/{name}": [("1.0", 90), ("1.1", 30), ("1.2", 2)]
+        for name in ("app", "worker")
+    }
+    plan_path = tmp_path / "plan.json"
+
+    with FakeRegistry(fixtures) as server:
+        argv = [str(path) for path in charts]
+        argv += ["--plan", str(plan_path), "--cache-path", str(tmp_path / "c.db")]
+        for host, origin in server.origin_overrides.items():
+            argv += ["--registry-origin", f"{host}={origin}"]
+        assert asyncio.run(upgrade.async_main(upgrade.parse_args(argv))) == 0
+
+    upgrade_plan = json.loads(plan_path.read_text(encoding="utf-8"))
+    assert [change["newTag"] for change in upgrade_plan["changes"]] == ["1.1", "1.1"]
+    assert upgrade_plan["changes"][0]["registry"] == "docker.io"
+    assert upgrade_plan["changes"][0]["published"]
+    assert "tag: '1.0'" in (charts[0] / "values.yaml").read_text(encoding="utf-8")
+
+    args = upgrade.parse_args(["--apply", str(plan_path), str(charts[0])])
+    assert asyncio.run(upgrade.async_main(args)) == 0
+
+    assert "tag: '1.1'" in (charts[0] / "values.yaml").read_text(encoding="utf-8")
+    assert "appVersion: '1.1'" in (charts[0] / "Chart.yaml").read_text(encoding="utf-8")
+    assert "tag: '1.0'" in (charts[1] / "values.yaml").read_text(encoding="utf-8")
+
+    # Re-applying is a no-op because the old tag no longer matches.
+    assert asyncio.run(upgrade.async_main(args)) == 0
+    assert "tag: '1.1'" in (charts[0] / "values.yaml").read_text(encoding="utf-8")
+
+    # The plan decides whether appVersion follows the image tag.
+    for change in upgrade_plan["changes"]:
+        change["appVersion"] = False
+    plan_path.write_text(json.dumps(upgrade_plan), encoding="utf-8")
+    args = upgrade.parse_args(["--apply", str(plan_path), str(charts[1])])
+    assert asyncio.run(upgrade.async_main(args)) == 0
+    assert "tag: '1.1'" in (charts[1] / "values.yaml").read_text(encoding="utf-8")
+    assert "appVersion: '1.0'" in (charts[1] / "Chart.yaml").read_text(encoding="utf-8")
+
+
+def test_pin_digests_writes_pins_and_reuses_cached_digests(tmp_path: Path):
+    chart_dir = tmp_path / "hub"
+    chart_dir.mkdir()
+    (chart_dir / "Chart.yaml").write_text(
+        "apiVersion: v2\nname: hub\nversion: 0.1.0\n", encoding="utf-8"
+    )
+    (chart_dir / "values.yaml").write_text(
+        "image:\n  repository: acme/hub\n  tag: latest\n"
+        'sidecar:\n  image: "ghcr.io/acme/agent:1.0@sha256:0ld"\n',
+        encoding="utf-8",
+    )
+    fixtures = {
+        "docker.io/acme/hub": [("latest", 1)],
+        "ghcr.io/acme/agent": [("1.0", 90), ("1.1", 30)],
+    }
+
+    def run(server):
+        argv = [str(chart_dir), "--pin-digests", "--cache-path", str(tmp_path / "c.db")]
+        for host, origin in server.origin_overrides.items():
+            argv += ["--registry-origin", f"{host}={origin}"]
+        return asyncio.run(upgrade.async_main(upgrade.parse_args(argv)))
+
+    with FakeRegistry(fixtures) as server:
+        assert run(server) == 0
+        assert server.requests["registry-1.docker.io"] == 1
+
+    values = (chart_dir / "values.yaml").read_text(encoding="utf-8")
+    hub_digest = digest_of("docker.io/acme/hub", "latest", "1")
+    agent_digest = digest_of("ghcr.io/acme/agent", "1.1", "30")
+    assert f"tag: latest@{hub_digest}\n" in values
+    assert f'image: "ghcr.io/acme/agent:1.1@{agent_digest}"' in values
+
+    # Nothing moved, so the second run is served entirely from the cache.
+    with FakeRegistry(fixtures) as server:
+        assert run(server) == 0
+        assert sum(server.requests.values()) == 0
+    assert (chart_dir / "values.yaml").read_text(encoding="utf-8") == values
+
+
+def test_pin_digests_falls_back_to_tag_when_digest_lookup_fails(
+    tmp_path: Path, monkeypatch
+):
+    chart_dir = tmp_path / "agent"
+    chart_dir.mkdir()
+    (chart_dir / "Chart.yaml").write_text(
+        "apiVersion: v2\nname: agent\nversion: 0.1.0\n", encoding="utf-8"
+    )
+    original = (
+        'image: "ghcr.io/acme/agent:1.0"\n'
+        'sidecar:\n  image: "ghcr.io/acme/helper:1.0@sha256:0ld"\n'
+    )
+    (chart_dir / "values.yaml").write_text(original, encoding="utf-8")
+    fixtures = {
+        "ghcr.io/acme/agent": [("1.0", 90), ("1.1", 30)],
+        "ghcr.io/acme/helper": [("1.0", 90), ("1.1", 30)],
+    }
+
+    async def failing_digest(session, registry_type, repository, tag):
+        raise HttpError(500, f"https://ghcr.io/v2/{repository}/manifests/{tag}")
+
+    monkeypatch.setattr(upgrade, "get_manifest_digest", failing_digest)
+    with FakeRegistry(fixtures) as server:
+        # No age filter, so no publish-date lookup caches the tag digests.
+        argv = [str(chart_dir), "--pin-digests", "--min-tag-age-days", "0"]
+        argv += ["--cache-path", str(tmp_path / "c.db")]
+        for host, origin in server.origin_overrides.items():
+            argv += ["--registry-origin", f"{host}={origin}"]
+        assert asyncio.run(upgrade.async_main(upgrade.parse_args(argv))) == 0
+
+    values = (chart_dir / "values.yaml").read_text(encoding="utf-8")
+    # The unpinned image still moves to the new tag; the pinned one is kept.
+    assert 'image: "ghcr.io/acme/agent:1.1"\n' in values
+    assert 'image: "ghcr.io/acme/helper:1.0@sha256:0ld"' in values
@@ -1,43 +1,67 @@
 import asyncio
 import argparse
 import datetime
+import json
 import re
-import requests
 import sys
+from dataclasses import dataclass, field
 from pathlib import Path
-from ruamel.yaml import YAML
-from ruamel.yaml.comments import CommentedMap
-from ruamel.yaml.scalarstring import DoubleQuotedScalarString, SingleQuotedScalarString
-from packaging.version import parse as parse_version, InvalidVersion
-
-
-# --- YAML Loading/Saving Utilities ---
-def create_yaml() -> YAML:
-    yaml = YAML()
-    yaml.preserve_quotes = True
-    yaml.indent(mapping=2, sequence=4, offset=2)
-    yaml.width = 4096
-    return yaml
-
-
-def load_yaml_file(filepath: Path):
-    yaml = create_yaml()
-    with open(filepath, "r") as f:
-        return yaml.load(f)
-
-
-def save_yaml_file(filepath: Path, data):
-    yaml = create_yaml()
-    with open(filepath, "w") as f:
-        yaml.dump(data, f)
+from typing import Any
+from urllib.parse import urlencode, urljoin
+import yaml
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from tools.upgrading.cache import (  # noqa: E402
+    DEFAULT_CACHE_TTL_HOURS,
+    CachedTags,
+    RegistryCache,
+    default_cache_path,
+)
+from tools.upgrading.http import REQUEST_ERRORS, AsyncHttpClient  # noqa: E402
+from tools.upgrading.spans import (  # noqa: E402
+    STR_TAG,
+    SafeLoader,
+    YamlDocument,
+    patch_scalars,
+    scalar_text,
+    set_top_level_scalar,
+)
+from tools.upgrading.policy import (  # noqa: E402
+    POLICY_ANNOTATION,
+    PolicyRule,
+    PolicySet,
+    chart_policies,
+    compile_policy,
+    load_policy_file,
+)
+
+
+DEFAULT_TOKEN_TTL_SECONDS = 300
+DEFAULT_TAG_LOOKBACK_DAYS = 365
+# Candidate tags whose publish dates are looked up concurrently, and how many
+# such rounds to try before giving up on a repository without tag dates.
+DATE_LOOKUP_BATCH_SIZE = 4
+DATE_LOOKUP_MAX_BATCHES = 3
+MANIFEST_ACCEPT = ", ".join(
+    (
+        "application/vnd.oci.image.index.v1+json",
+        "application/vnd.oci.image.manifest.v1+json",
+        "application/vnd.docker.distribution.manifest.list.v2+json",
+        "application/vnd.docker.distribution.manifest.v2+json",
+    )
+)
 
 
-def apply_scalar_style(new_value: str, existing_value):
-    if isinstance(existing_value, DoubleQuotedScalarString):
-        return DoubleQuotedScalarString(new_value)
-    if isinstance(existing_value, SingleQuotedScalarString):
-        return SingleQuotedScalarString(new_value)
-    return new_value
+def parse_registry_origin(value: str) -> tuple[str, str]:
+    host, separator, origin = value.partition("=")
+    if not separator or not host or "://" not in origin:
+        raise argparse.ArgumentTypeError(
+            f"expected HOST=SCHEME://ADDRESS, got {value!r}"
+        )
+    return host, origin
 
 
 def parse_args(argv=None):
@@ -46,9 +70,22 @@ def parse_args(argv=None):
     )
     parser.add_argument(
         "chart_paths",
-        nargs="+",
+        nargs="*",
         type=Path,
-        help="Path(s) to Helm chart directories (e.g., charts/my-chart)",
+        help="Path(s) to Helm chart directories (e.g., charts/my-chart). With --apply, limits which charts of the plan are written.",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--plan",
+        type=Path,
+        metavar="OUT.json",
+        help="Resolve upgrades and write them to a JSON plan instead of editing any chart.",
+    )
+    mode.add_argument(
+        "--apply",
+        type=Path,
+        metavar="PLAN.json",
+        help="Apply the changes from a plan written by --plan, without querying any registry.",
     )
     parser.add_argument(
         "--min-tag-age-days",
@@ -66,68 +103,131 @@ def parse_args(argv=None):
         "--image-concurrency",
         type=int,
         default=8,
-        help="Maximum number of registry lookups to run concurrently (default: 8).",
+        help="Maximum number of concurrent registry lookups and open sockets per registry host (default: 8).",
+    )
+    parser.add_argument(
+        "--tag-lookback-days",
+        type=int,
+        default=DEFAULT_TAG_LOOKBACK_DAYS,
+        help=f"Stop paging Docker Hub and Quay tags older than this many days, 0 disables (default: {DEFAULT_TAG_LOOKBACK_DAYS}).",
+    )
+    parser.add_argument(
+        "--cache-path",
+        type=Path,
+        default=default_cache_path(),
+        help="SQLite file caching registry tag lists and tokens (default: user cache dir).",
+    )
+    parser.add_argument(
+        "--cache-ttl-hours",
+        type=float,
+        default=DEFAULT_CACHE_TTL_HOURS,
+        help=f"Serve cached tag lists younger than this without network calls (default: {DEFAULT_CACHE_TTL_HOURS:g}).",
+    )
+    parser.add_argument(
+        "--policy-file",
+        type=Path,
+        help=f"YAML file of per-image upgrade policies (default and images keys). Charts can add their own under the {POLICY_ANNOTATION} annotation.",
+    )
+    parser.add_argument(
+        "--pin-digests",
+        action="store_true",
+        help="Write tag@sha256:digest pins for every image. Images that are already pinned are always re-pinned.",
+    )
+    parser.add_argument(
+        "--registry-origin",
+        action="append",
+        default=[],
+        type=parse_registry_origin,
+        metavar="HOST=URL",
+        help="Send requests for a registry host to another origin, such as a local replay server. Repeatable.",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignore cached tag lists and tokens and query every registry again.",
     )
     return parser.parse_args(argv)
 
 
 # --- Image Discovery ---
-def find_images_in_values(data, path_parts=None):
+def split_digest(reference: str) -> tuple[str, str | None]:
+    """Split ``name@sha256:...`` into the name and its pinned digest."""
+    name, separator, digest = reference.partition("@")
+    return name, digest if separator else None
+
+
+def find_images_in_values(document: YamlDocument, node=None, path_parts=None):
+    if node is None:
+        node = document.root
     if path_parts is None:
         path_parts = []
 
     images = []
 
-    if isinstance(data, dict) or isinstance(data, CommentedMap):
-        # Type 1: Dictionary with separate 'repository' and 'tag' keys
-        if "repository" in data and "tag" in data:
+    if isinstance(node, yaml.MappingNode):
+        scalars = {
+            key_node.value: value_node
+            for key_node, value_node in node.value
+            if isinstance(value_node, yaml.ScalarNode)
+        }
+        # Type 1: Mapping with separate 'repository' and 'tag' keys
+        has_repo_tag_keys = "repository" in scalars and "tag" in scalars
+        if has_repo_tag_keys:
+            tag_span = document.span(scalars["tag"])
+            tag, digest = split_digest(tag_span.value)
             images.append(
                 {
                     "path": ".".join(path_parts),
-                    "repository_obj": data,  # Reference to the dictionary holding 'repository' and 'tag'
                     "repository_key": "repository",
                     "tag_key": "tag",
-                    "current_repository": data["repository"],
-                    "current_tag": data["tag"],
+                    "current_repository": scalar_text(scalars["repository"]),
+                    "current_tag": tag,
+                    "current_digest": digest,
+                    "span": tag_span,  # Source span of the tag scalar
                     "type": "repo_tag_keys",
                 }
             )
 
         # Type 2: Key named 'image' (or similar) with a string value like "repo/image:tag"
-        for key, value in data.items():
-            if isinstance(value, str) and (
-                key == "image" or key.endswith("Image")
+        for key_node, value_node in node.value:
+            key = str(key_node.value)
+            if (
+                isinstance(value_node, yaml.ScalarNode)
+                and value_node.tag == STR_TAG
+                and (key == "image" or key.endswith("Image"))
             ):  # Heuristic for image strings
-                full_image_str = value
-                repository = full_image_str
+                image_span = document.span(value_node)
+                repository, digest = split_digest(image_span.value)
                 tag = ""
 
                 # Attempt to parse into repository and tag
-                if ":" in full_image_str:
-                    repository, tag = full_image_str.rsplit(":", 1)
+                if ":" in repository:
+                    repository, tag = repository.rsplit(":", 1)
 
                 # Avoid adding duplicates if already caught by Type 1 (e.g. `image: {repository: foo, tag: bar}`)
-                # This might happen if 'image' is a sub-key of a larger image object
-                if "repository" not in data or "tag" not in data:
+                if not has_repo_tag_keys:
                     images.append(
                         {
-                            "path": ".".join(path_parts + [str(key)]),
-                            "repository_obj": data,  # Reference to the dictionary holding the image string
-                            "repository_key": str(
-                                key
-                            ),  # The key itself (e.g., 'image')
+                            "path": ".".join(path_parts + [key]),
+                            "repository_key": key,  # The key itself (e.g., 'image')
                             "tag_key": None,  # No separate tag key for this type
                             "current_repository": repository,
                             "current_tag": tag,
+                            "current_digest": digest,
+                            "span": image_span,  # Source span of the whole image string
                             "type": "image_string",
                         }
                     )
 
-            # Recurse for nested dictionaries and lists
-            images.extend(find_images_in_values(value, path_parts + [str(key)]))
-    elif isinstance(data, list):
-        for index, item in enumerate(data):
-            images.extend(find_images_in_values(item, path_parts + [str(index)]))
+            # Recurse for nested mappings and sequences
+            images.extend(
+                find_images_in_values(document, value_node, path_parts + [key])
+            )
+    elif isinstance(node, yaml.SequenceNode):
+        for index, item in enumerate(node.value):
+            images.extend(
+                find_images_in_values(document, item, path_parts + [str(index)])
+            )
 
     return images
 
@@ -148,40 +248,196 @@ def get_registry_type(repository: str) -> str:
     return "unknown"
 
 
-def get_docker_hub_tags(repository: str) -> list[tuple[str, datetime.datetime]]:
+@dataclass
+class RegistrySession:
+    """Pooled HTTP client plus token and tag caches shared by every lookup."""
+
+    http: AsyncHttpClient
+    cache: RegistryCache | None = None
+    tokens: dict[str, str] = field(default_factory=dict)
+    created: dict[str, datetime.datetime] = field(default_factory=dict)
+
+
+def listing_key(repository: str, name_filter: str | None) -> str:
+    """Cache key of a tag listing, kept apart per name filter."""
+    return f"{repository}?name={name_filter}" if name_filter else repository
+
+
+def get_cached_listing(
+    session: RegistrySession, registry: str, repository: str
+) -> tuple[CachedTags | None, dict[str, str]]:
+    cached = session.cache.get_tags(registry, repository) if session.cache else None
+    # A 304 only vouches for the first page, so partial listings are refetched.
+    revalidate = cached is not None and cached.complete and cached.etag
+    headers = {"If-None-Match": cached.etag} if revalidate else {}
+    return cached, headers
+
+
+def store_listing(
+    session: RegistrySession,
+    registry: str,
+    repository: str,
+    tags: list,
+    etag: str | None,
+    complete: bool = True,
+) -> None:
+    if session.cache is not None and tags:
+        session.cache.put_tags(registry, repository, tags, etag, complete)
+
+
+async def get_bearer_token(
+    session: RegistrySession, token_url: str, scope_key: str
+) -> str | None:
+    token = session.tokens.get(scope_key)
+    if token:
+        return token
+    if session.cache is not None:
+        token = session.cache.get_token(scope_key)
+        if token:
+            session.tokens[scope_key] = token
+            return token
+
+    response = await session.http.get(token_url)
+    response.raise_for_status()
+    data = response.json()
+    token = data.get("token") or data.get("access_token")
+    if token:
+        session.tokens[scope_key] = token
+        if session.cache is not None:
+            expires_in = float(data.get("expires_in") or DEFAULT_TOKEN_TTL_SECONDS)
+            session.cache.put_token(scope_key, token, max(expires_in - 30, 0))
+    return token
+
+
+@dataclass(frozen=True)
+class TagWindow:
+    """Where a newest-first tag walk may stop.
+
+    Once every tag in ``current_tags`` has been seen, pages older than the
+    oldest of them cannot hold an upgrade. ``not_before`` bounds the walk by
+    a lookback window even when a current tag never shows up.
+    """
+
+    current_tags: frozenset[str] = frozenset()
+    not_before: datetime.datetime | None = None
+
+    def passed(
+        self, oldest: datetime.datetime, current_dates: dict[str, datetime.datetime]
+    ) -> bool:
+        if self.not_before is not None and oldest < self.not_before:
+            return True
+        if self.current_tags and self.current_tags.issubset(current_dates):
+            return oldest < min(current_dates[tag] for tag in self.current_tags)
+        return False
+
+    def covers(self, tags: list) -> bool:
+        """Whether a newest-first listing cut short at ``tags`` reaches past this window."""
+        dated = [tag for tag in tags if isinstance(tag, tuple)]
+        if not dated:
+            return False
+        current_dates = {
+            name: timestamp for name, timestamp in dated if name in self.current_tags
+        }
+        return self.passed(min(timestamp for _, timestamp in dated), current_dates)
+
+
+async def collect_tag_pages(pages, window: TagWindow | None) -> list:
+    """Consume newest-first tag pages until they fall past ``window``."""
+    tags_with_dates = []
+    current_dates: dict[str, datetime.datetime] = {}
+    try:
+        async for page in pages:
+            tags_with_dates.extend(page)
+            if window is None or not page:
+                continue
+            for name, timestamp in page:
+                if name in window.current_tags:
+                    current_dates[name] = timestamp
+            if window.passed(min(timestamp for _, timestamp in page), current_dates):
+                break
+    finally:
+        await pages.aclose()
+    return tags_with_dates
+
+
+def parse_tag_timestamps(
+    repository: str, entries: list[dict], date_key: str
+) -> list[tuple[str, datetime.datetime]]:
+    page = []
+    for t in entries:
+        try:
+            # Docker Hub's last_updated and Quay's last_modified are ISO 8601 strings
+            timestamp = datetime.datetime.fromisoformat(
+                t[date_key].replace("Z", "+00:00")
+            )
+        except (ValueError, KeyError) as e:
+            print(
+                f"Warning: Could not parse timestamp for tag {t['name']} in {repository}: {e}",
+                file=sys.stderr,
+            )
+            continue
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+        page.append((t["name"], timestamp))
+    return page
+
+
+async def iter_docker_hub_tag_pages(
+    repository: str, session: RegistrySession, name_filter: str | None = None
+):
+    """Yield Docker Hub tag pages, most recently updated first."""
     repo_name = repository
     if "/" not in repo_name and not repo_name.startswith("library/"):
         repo_name = f"library/{repo_name}"
 
-    url = f"https://hub.docker.com/v2/repositories/{repo_name}/tags/?page_size=100"
-    tags_with_dates = []
-    while url:
-        try:
-            response = requests.get(url, timeout=10)
+    key = listing_key(repository, name_filter)
+    cached, headers = get_cached_listing(session, "docker.io", key)
+    query = {"page_size": "100", "ordering": "last_updated"}
+    if name_filter:
+        query["name"] = name_filter
+    url = f"https://hub.docker.com/v2/repositories/{repo_name}/tags/?{urlencode(query)}"
+    collected = []
+    etag = None
+    first_page = True
+    try:
+        while url:
+            response = await session.http.get(url, headers if first_page else None)
+            if first_page:
+                if cached is not None and headers and response.status == 304:
+                    session.cache.touch_tags("docker.io", key)
+                    yield cached.tags
+                    return
+                etag = response.header("ETag")
+                first_page = False
             response.raise_for_status()
             data = response.json()
-            for t in data["results"]:
-                try:
-                    # Docker Hub's last_updated is ISO 8601 string
-                    timestamp = datetime.datetime.fromisoformat(
-                        t["last_updated"].replace("Z", "+00:00")
-                    )
-                    tags_with_dates.append((t["name"], timestamp))
-                except (ValueError, KeyError) as e:
-                    print(
-                        f"Warning: Could not parse timestamp for tag {t['name']} in {repository}: {e}",
-                        file=sys.stderr,
-                    )
+            page = parse_tag_timestamps(repository, data["results"], "last_updated")
+            collected.extend(page)
+            yield page
             url = data["next"]
-        except requests.exceptions.RequestException as e:
-            print(
-                f"Error fetching Docker Hub tags for {repository}: {e}", file=sys.stderr
-            )
-            return []
-    return tags_with_dates
+    except GeneratorExit:
+        # Stopped early by a TagWindow: keep the pages seen as a partial listing.
+        store_listing(session, "docker.io", key, collected, etag, complete=False)
+        raise
+    store_listing(session, "docker.io", key, collected, etag)
+
+
+async def get_docker_hub_tags(
+    repository: str,
+    session: RegistrySession,
+    window: TagWindow | None = None,
+    name_filter: str | None = None,
+) -> list[tuple[str, datetime.datetime]]:
+    try:
+        return await collect_tag_pages(
+            iter_docker_hub_tag_pages(repository, session, name_filter), window
+        )
+    except REQUEST_ERRORS as e:
+        print(f"Error fetching Docker Hub tags for {repository}: {e}", file=sys.stderr)
+        return []
 
 
-def get_ghcr_tags(repository: str) -> list[str]:
+async def get_ghcr_tags(repository: str, session: RegistrySession) -> list[str]:
     parts = repository.split("/")
     if len(parts) < 3:
         print(f"Invalid ghcr.io repository format: {repository}", file=sys.stderr)
@@ -191,69 +447,92 @@ def get_ghcr_tags(repository: str) -> list[str]:
 
     token_url = f"https://ghcr.io/token?scope=repository:{repo_path}:pull"
     try:
-        response = requests.get(token_url, timeout=10)
-        response.raise_for_status()
-        token = response.json().get("token")
+        token = await get_bearer_token(
+            session, token_url, f"ghcr.io:repository:{repo_path}:pull"
+        )
         if not token:
             print(f"Error: GHCR token not found for {repository}", file=sys.stderr)
             return []
-    except requests.exceptions.RequestException as e:
+    except REQUEST_ERRORS as e:
         print(f"Error getting GHCR token for {repository}: {e}", file=sys.stderr)
         return []
 
     tags_url = f"https://ghcr.io/v2/{repo_path}/tags/list"
     try:
-        response = requests.get(
-            tags_url,
-            headers={"Authorization": f"Bearer {token}"},
-            timeout=10,
-        )
-        response.raise_for_status()
-        return response.json().get("tags", []) or []
-    except requests.exceptions.RequestException as e:
+        return await get_oci_tag_list(session, "ghcr.io", repository, tags_url, token)
+    except REQUEST_ERRORS as e:
         print(f"Error fetching GHCR tags for {repository}: {e}", file=sys.stderr)
         return []
 
 
-def get_quay_tags(repository: str) -> list[tuple[str, datetime.datetime]]:
+async def iter_quay_tag_pages(
+    repository: str, session: RegistrySession, name_filter: str | None = None
+):
+    """Yield Quay.io tag pages of active tags, most recently pushed first."""
     parts = repository.split("/")
-    if len(parts) < 3:
-        print(f"Invalid quay.io repository format: {repository}", file=sys.stderr)
-        return []
-
     org = parts[1]
     repo_name = parts[2]
 
-    url = f"https://quay.io/api/v1/repository/{org}/{repo_name}/tag/"
-    tags_with_dates = []
-    while url:
-        try:
-            response = requests.get(url, timeout=10)
+    key = listing_key(repository, name_filter)
+    cached, headers = get_cached_listing(session, "quay.io", key)
+    query = {"limit": "100", "onlyActiveTags": "true", "page": "1"}
+    if name_filter:
+        query["filter_tag_name"] = f"like:{name_filter}"
+    base_url = f"https://quay.io/api/v1/repository/{org}/{repo_name}/tag/"
+    url = f"{base_url}?{urlencode(query)}"
+    collected = []
+    etag = None
+    first_page = True
+    try:
+        while url:
+            response = await session.http.get(url, headers if first_page else None)
+            if first_page:
+                if cached is not None and headers and response.status == 304:
+                    session.cache.touch_tags("quay.io", key)
+                    yield cached.tags
+                    return
+                etag = response.header("ETag")
+                first_page = False
             response.raise_for_status()
             data = response.json()
-            for t in data["tags"]:
-                try:
-                    # Quay.io's last_modified is ISO 8601 string
-                    timestamp = datetime.datetime.fromisoformat(
-                        t["last_modified"].replace("Z", "+00:00")
-                    )
-                    tags_with_dates.append((t["name"], timestamp))
-                except (ValueError, KeyError) as e:
-                    print(
-                        f"Warning: Could not parse timestamp for tag {t['name']} in {repository}: {e}",
-                        file=sys.stderr,
-                    )
-            if "next_page" in data and data["next_page"]:
+            page = parse_tag_timestamps(repository, data["tags"], "last_modified")
+            collected.extend(page)
+            yield page
+            if data.get("next_page"):
                 url = f"https://quay.io{data['next_page']}"
+            elif data.get("has_additional"):
+                query["page"] = str(int(data.get("page", query["page"])) + 1)
+                url = f"{base_url}?{urlencode(query)}"
             else:
                 url = None
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching Quay.io tags for {repository}: {e}", file=sys.stderr)
-            return []
-    return tags_with_dates
+    except GeneratorExit:
+        # Stopped early by a TagWindow: keep the pages seen as a partial listing.
+        store_listing(session, "quay.io", key, collected, etag, complete=False)
+        raise
+    store_listing(session, "quay.io", key, collected, etag)
+
+
+async def get_quay_tags(
+    repository: str,
+    session: RegistrySession,
+    window: TagWindow | None = None,
+    name_filter: str | None = None,
+) -> list[tuple[str, datetime.datetime]]:
+    parts = repository.split("/")
+    if len(parts) < 3:
+        print(f"Invalid quay.io repository format: {repository}", file=sys.stderr)
+        return []
+
+    try:
+        return await collect_tag_pages(
+            iter_quay_tag_pages(repository, session, name_filter), window
+        )
+    except REQUEST_ERRORS as e:
+        print(f"Error fetching Quay.io tags for {repository}: {e}", file=sys.stderr)
+        return []
 
 
-def get_mcr_tags(repository: str) -> list[str]:
+async def get_mcr_tags(repository: str, session: RegistrySession) -> list[str]:
     parts = repository.split("/", 1)
     if len(parts) < 2:
         print(f"Invalid MCR repository format: {repository}", file=sys.stderr)
@@ -265,102 +544,399 @@ def get_mcr_tags(repository: str) -> list[str]:
     # 1. Get token
     auth_url = f"https://{registry}/oauth2/token?service={registry}&scope=repository:{repo_path}:pull"
     try:
-        response = requests.get(auth_url, timeout=10)
-        response.raise_for_status()
-        token_data = response.json()
-        token = token_data.get("access_token")
+        token = await get_bearer_token(
+            session, auth_url, f"{registry}:repository:{repo_path}:pull"
+        )
         if not token:
             print(
                 f"Error: MCR access token not found for {repository}", file=sys.stderr
             )
             return []
-    except requests.exceptions.RequestException as e:
+    except REQUEST_ERRORS as e:
         print(f"Error getting MCR token for {repository}: {e}", file=sys.stderr)
         return []
 
     tags_url = f"https://{registry}/v2/{repo_path}/tags/list"
+    try:
+        return await get_oci_tag_list(session, registry, repository, tags_url, token)
+    except REQUEST_ERRORS as e:
+        print(f"Error fetching MCR tags for {repository}: {e}", file=sys.stderr)
+        return []
+
+
+async def get_oci_tag_list(
+    session: RegistrySession,
+    registry: str,
+    repository: str,
+    tags_url: str,
+    token: str,
+) -> list[str]:
+    """Fetch an OCI distribution tags/list, following ``Link`` pagination."""
+    cached, conditional = get_cached_listing(session, registry, repository)
     headers = {"Authorization": f"Bearer {token}"}
     all_tags = []
+    etag = None
+    first_page = True
     current_tags_url = tags_url
     while current_tags_url:
-        try:
-            response = requests.get(current_tags_url, headers=headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            all_tags.extend(data.get("tags", []))
+        response = await session.http.get(
+            current_tags_url,
+            {**headers, **conditional} if first_page else headers,
+        )
+        if first_page:
+            if cached is not None and conditional and response.status == 304:
+                session.cache.touch_tags(registry, repository)
+                return cached.tags
+            etag = response.header("ETag")
+            first_page = False
+        response.raise_for_status()
+        data = response.json()
+        all_tags.extend(data.get("tags", []) or [])
+
+        current_tags_url = None
+        link_header = response.header("Link")
+        if link_header:
+            match = re.search(r'<(.*)>; rel="next"', link_header)
+            if match:
+                current_tags_url = urljoin(tags_url, match.group(1))
+    store_listing(session, registry, repository, all_tags, etag)
+    return all_tags
 
-            current_tags_url = None
-            if "Link" in response.headers:
-                link_header = response.headers["Link"]
-                match = re.search(r'<(.*)>; rel="next"', link_header)
-                if match:
-                    current_tags_url = match.group(1)
 
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching MCR tags for {repository}: {e}", file=sys.stderr)
-            return []
-    return all_tags
+# --- Publish Dates ---
+def registry_pull_scope(registry_type: str, repository: str) -> tuple[str, str, str]:
+    """Return the registry host, repository path and token URL for pulls."""
+    if registry_type == "docker.io":
+        # Docker Hub serves the distribution API from a separate host.
+        repo_path = repository.removeprefix("docker.io/")
+        if "/" not in repo_path:
+            repo_path = f"library/{repo_path}"
+        registry = "registry-1.docker.io"
+        token_url = f"https://auth.docker.io/token?service=registry.docker.io&scope=repository:{repo_path}:pull"
+        return registry, repo_path, token_url
+
+    registry, _, repo_path = repository.partition("/")
+    if registry_type == "ghcr.io":
+        token_url = f"https://ghcr.io/token?scope=repository:{repo_path}:pull"
+    elif registry_type == "quay.io":
+        token_url = (
+            f"https://quay.io/v2/auth?service=quay.io&scope=repository:{repo_path}:pull"
+        )
+    else:
+        token_url = f"https://{registry}/oauth2/token?service={registry}&scope=repository:{repo_path}:pull"
+    return registry, repo_path, token_url
 
 
-# --- Tag Filtering and Selection ---
-def get_latest_stable_tag(
-    tags_with_dates: list[tuple[str, datetime.datetime]], min_age_days: int = 0
+async def registry_pull_headers(
+    session: RegistrySession, registry_type: str, repository: str
+) -> tuple[str, dict[str, str]]:
+    """Return the ``/v2/<repository>`` base URL and headers for manifest reads."""
+    registry, repo_path, token_url = registry_pull_scope(registry_type, repository)
+    token = await get_bearer_token(
+        session, token_url, f"{registry}:repository:{repo_path}:pull"
+    )
+    headers = {"Accept": MANIFEST_ACCEPT}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    return f"https://{registry}/v2/{repo_path}", headers
+
+
+async def get_manifest_digest(
+    session: RegistrySession, registry_type: str, repository: str, tag: str
 ) -> str | None:
-    stable_tags = []
-    now = datetime.datetime.now(datetime.timezone.utc)
+    """Resolve ``tag`` to the digest of its manifest list (or manifest)."""
+    base_url, headers = await registry_pull_headers(session, registry_type, repository)
+    response = await session.http.head(f"{base_url}/manifests/{tag}", headers)
+    response.raise_for_status()
+    return response.header("Docker-Content-Digest")
 
-    for tag, timestamp in tags_with_dates:
-        # Filter out common non-stable indicators
-        if re.search(
-            r"\b(latest|snapshot|dev|nightly|test|alpha|beta|rc)\b", tag.lower()
-        ):
-            continue
 
-        # Apply age filter if required and timestamp is available
-        if min_age_days > 0 and timestamp != datetime.datetime.min:
-            if (now - timestamp).days < min_age_days:
-                # print(f"  Skipping {tag} (too new - published less than {min_age_days} days ago)")
-                continue
+def parse_created(value: Any) -> datetime.datetime | None:
+    if not isinstance(value, str) or not value:
+        return None
+    # Image configs carry RFC 3339 timestamps, often with nanoseconds.
+    match = re.match(r"(.*T\d{2}:\d{2}:\d{2})(\.\d+)?(Z|[+-]\d{2}:\d{2})?$", value)
+    if not match:
+        return None
+    seconds, fraction, offset = match.groups()
+    text = seconds + (fraction or "")[:7] + (offset or "Z").replace("Z", "+00:00")
+    try:
+        return datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return None
 
-        try:
-            version = parse_version(tag)
-            # Exclude pre-release and development versions
-            if not version.is_prerelease and not version.is_devrelease:
-                stable_tags.append(tag)
-        except InvalidVersion:
-            # If packaging.version can't parse it, it's not a version we care about for auto-upgrade
-            continue
 
-    if not stable_tags:
+def select_platform_manifest(manifests: list[dict]) -> dict | None:
+    for manifest in manifests:
+        platform = manifest.get("platform") or {}
+        if platform.get("os") == "linux" and platform.get("architecture") == "amd64":
+            return manifest
+    return manifests[0] if manifests else None
+
+
+async def get_tag_publish_date(
+    session: RegistrySession, registry_type: str, repository: str, tag: str
+) -> datetime.datetime | None:
+    """Return when ``tag`` was built, from its image config ``created`` field.
+
+    A HEAD request resolves the tag to a digest; dates are cached per digest
+    and the tag's digest for the cache TTL, so a known image costs no request
+    on a rerun and only the HEAD once the TTL has passed.
+    """
+    registry, name = repository_key(registry_type, repository)
+    cache = session.cache
+    if cache is not None:
+        digest = cache.get_digest(registry, name, tag)
+        if digest:
+            created = session.created.get(digest) or cache.get_created(digest)
+            if created is not None:
+                session.created[digest] = created
+                return created
+
+    base_url, headers = await registry_pull_headers(session, registry_type, repository)
+    manifest_url = f"{base_url}/manifests/{tag}"
+
+    response = await session.http.head(manifest_url, headers)
+    response.raise_for_status()
+    digest = response.header("Docker-Content-Digest")
+    if digest:
+        created = session.created.get(digest)
+        if created is None and cache is not None:
+            created = cache.get_created(digest)
+        if created is not None:
+            session.created[digest] = created
+            if cache is not None:
+                cache.put_digest(registry, name, tag, digest)
+            return created
+
+    response = await session.http.get(manifest_url, headers)
+    response.raise_for_status()
+    digest = digest or response.header("Docker-Content-Digest")
+    manifest = response.json()
+    if "manifests" in manifest:
+        child = select_platform_manifest(manifest["manifests"])
+        if child is None:
+            return None
+        response = await session.http.get(
+            f"{base_url}/manifests/{child['digest']}", headers
+        )
+        response.raise_for_status()
+        manifest = response.json()
+
+    config_digest = (manifest.get("config") or {}).get("digest")
+    if not config_digest:
         return None
+    blob_headers = (
+        {"Authorization": headers["Authorization"]}
+        if "Authorization" in headers
+        else None
+    )
+    response = await session.http.get(f"{base_url}/blobs/{config_digest}", blob_headers)
+    response.raise_for_status()
+    created = parse_created(response.json().get("created"))
+    if created is not None and digest:
+        session.created[digest] = created
+        if cache is not None:
+            cache.put_created(digest, created)
+            cache.put_digest(registry, name, tag, digest)
+    return created
+
+
+async def find_old_enough_tag(
+    session: RegistrySession,
+    registry_type: str,
+    repository: str,
+    candidates: list[str],
+    min_age_days: int,
+    stop_at: str | None = None,
+) -> tuple[str | None, datetime.datetime | None, int]:
+    """Return the best-ranked candidate at least ``min_age_days`` old.
+
+    Candidates are checked in small concurrent batches in rank order. Reaching
+    ``stop_at`` (the current tag) ends the search without a date lookup,
+    since nothing ranked below it is an upgrade. Also returns the candidate's
+    publish date and the number of dates looked up.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    lookups = 0
+    for start in range(
+        0, DATE_LOOKUP_BATCH_SIZE * DATE_LOOKUP_MAX_BATCHES, DATE_LOOKUP_BATCH_SIZE
+    ):
+        batch = candidates[start : start + DATE_LOOKUP_BATCH_SIZE]
+        if not batch:
+            break
+        reached_current = stop_at in batch
+        if reached_current:
+            batch = batch[: batch.index(stop_at)]
+        results = await asyncio.gather(
+            *(
+                get_tag_publish_date(session, registry_type, repository, tag)
+                for tag in batch
+            ),
+            return_exceptions=True,
+        )
+        lookups += len(batch)
+        for tag, created in zip(batch, results):
+            if isinstance(created, datetime.datetime):
+                if (now - created).days >= min_age_days:
+                    return tag, created, lookups
+            elif isinstance(created, BaseException) and not isinstance(
+                created, REQUEST_ERRORS
+            ):
+                raise created
+        if reached_current:
+            return stop_at, None, lookups
+    return None, None, lookups
 
-    # Sort versions and return the latest
-    def version_sort_key(tag_name):
-        clean_tag = tag_name.lstrip("v")
-        try:
-            return parse_version(clean_tag)
-        except InvalidVersion:
-            return parse_version("0.0.0")  # Fallback for malformed tags
 
-    stable_tags.sort(key=version_sort_key, reverse=True)
+# --- Tag Filtering and Selection ---
+def get_latest_stable_tag(
+    tags_with_dates: list[tuple[str, datetime.datetime]],
+    min_age_days: int = 0,
+    rule: PolicyRule | None = None,
+    current_tag: str | None = None,
+) -> str | None:
+    policy = compile_policy(rule or PolicyRule())
+    return policy.select(tags_with_dates, current_tag, min_age_days)
 
-    return stable_tags[0]
 
+async def get_tags_for_repository(
+    registry_type: str,
+    repository: str,
+    session: RegistrySession,
+    window: TagWindow | None = None,
+):
+    if session.cache is not None:
+        cached = session.cache.fresh_tags(registry_type, repository)
+        if cached is not None and (
+            cached.complete or (window is not None and window.covers(cached.tags))
+        ):
+            return cached.tags
 
-def get_tags_for_repository(registry_type: str, repository: str):
     if registry_type == "docker.io":
-        return get_docker_hub_tags(repository)
+        return await get_docker_hub_tags(repository, session, window=window)
     if registry_type == "ghcr.io":
-        return get_ghcr_tags(repository)
+        return await get_ghcr_tags(repository, session)
     if registry_type == "quay.io":
-        return get_quay_tags(repository)
+        return await get_quay_tags(repository, session, window=window)
     if registry_type == "mcr.microsoft.com":
-        return get_mcr_tags(repository)
+        return await get_mcr_tags(repository, session)
     return None
 
 
+def repository_key(registry_type: str, repository: str) -> tuple[str, str]:
+    if registry_type == "docker.io":
+        repository = repository.removeprefix("library/")
+    return registry_type, repository
+
+
+class TagResolver:
+    """Share one tag lookup per (registry, repository) across every chart.
+
+    Current tags are registered during planning so a single newest-first walk
+    can stop once it is past all of them. The first request for a repository
+    starts a task; later requests await that task instead of querying the
+    registry again.
+    """
+
+    def __init__(
+        self,
+        image_semaphore: asyncio.Semaphore,
+        session: RegistrySession,
+        lookback_days: int = DEFAULT_TAG_LOOKBACK_DAYS,
+        pin_digests: bool = False,
+    ) -> None:
+        self.image_semaphore = image_semaphore
+        self.session = session
+        self.pin_digests = pin_digests
+        self.not_before = (
+            datetime.datetime.now(datetime.timezone.utc)
+            - datetime.timedelta(days=lookback_days)
+            if lookback_days > 0
+            else None
+        )
+        self._current_tags: dict[tuple[str, str], set[str]] = {}
+        self._lookups: dict[tuple[str, str], asyncio.Task] = {}
+        self._digests: dict[tuple[str, str, str], asyncio.Task] = {}
+
+    @property
+    def lookup_count(self) -> int:
+        return len(self._lookups)
+
+    def register(self, registry_type: str, repository: str, current_tag: str) -> None:
+        key = repository_key(registry_type, repository)
+        self._current_tags.setdefault(key, set()).add(current_tag)
+
+    def get_tags(
+        self, registry_type: str, repository: str, current_tag: str | None = None
+    ) -> asyncio.Task:
+        key = repository_key(registry_type, repository)
+        lookup = self._lookups.get(key)
+        if lookup is None:
+            if current_tag:
+                self.register(registry_type, repository, current_tag)
+            window = TagWindow(
+                frozenset(self._current_tags.get(key, ())), self.not_before
+            )
+            lookup = asyncio.ensure_future(
+                self._fetch(registry_type, repository, window)
+            )
+            self._lookups[key] = lookup
+        return lookup
+
+    async def _fetch(self, registry_type: str, repository: str, window: TagWindow):
+        async with self.image_semaphore:
+            return await get_tags_for_repository(
+                registry_type, repository, self.session, window
+            )
+
+    def get_digest(
+        self, registry_type: str, repository: str, tag: str, observed: str = ""
+    ) -> asyncio.Task:
+        """Resolve ``tag`` to its manifest digest once per run.
+
+        ``observed`` is the tag's listed update time; while it matches the
+        cached entry the digest is reused without a registry request.
+        """
+        key = (*repository_key(registry_type, repository), tag)
+        lookup = self._digests.get(key)
+        if lookup is None:
+            lookup = asyncio.ensure_future(
+                self._fetch_digest(registry_type, repository, tag, observed)
+            )
+            self._digests[key] = lookup
+        return lookup
+
+    async def _fetch_digest(
+        self, registry_type: str, repository: str, tag: str, observed: str
+    ) -> str | None:
+        registry, name = repository_key(registry_type, repository)
+        cache = self.session.cache
+        if cache is not None:
+            digest = cache.get_digest(registry, name, tag, observed)
+            if digest:
+                return digest
+        async with self.image_semaphore:
+            try:
+                digest = await get_manifest_digest(
+                    self.session, registry_type, repository, tag
+                )
+            except REQUEST_ERRORS as e:
+                print(
+                    f"Error resolving digest for {repository}:{tag}: {e}",
+                    file=sys.stderr,
+                )
+                return None
+        if digest and cache is not None:
+            cache.put_digest(registry, name, tag, digest, observed)
+        return digest
+
+
 async def resolve_image_update(
-    img_info, min_tag_age_days: int, image_semaphore: asyncio.Semaphore
+    img_info,
+    min_tag_age_days: int,
+    resolver: TagResolver,
+    rule: PolicyRule | None = None,
 ):
     current_repository = img_info["current_repository"]
     current_tag = img_info["current_tag"]
@@ -383,68 +959,247 @@ async def resolve_image_update(
         )
         return None, logs
 
-    async with image_semaphore:
-        tags_raw = await asyncio.to_thread(
-            get_tags_for_repository, registry_type, current_repository
-        )
+    tags_raw = await resolver.get_tags(registry_type, current_repository, current_tag)
 
     tags_with_dates = []
     if tags_raw and isinstance(tags_raw[0], tuple):
         tags_with_dates = tags_raw
     elif tags_raw:
-        logs.append(
-            f"  Warning: Age filtering not available for {current_repository} (registry type: {registry_type}). All tags considered old enough."
-        )
         tags_with_dates = [(tag, datetime.datetime.min) for tag in tags_raw]
 
-    latest_stable_tag = get_latest_stable_tag(
-        tags_with_dates, min_age_days=min_tag_age_days
-    )
+    rule = rule or PolicyRule()
+    published = None
+    if tags_with_dates and tags_with_dates[0][1] == datetime.datetime.min:
+        # The registry lists tags without dates, so only look up publish
+        # dates for the few best-ranked candidates.
+        candidates = compile_policy(rule).rank(tags_with_dates, str(current_tag))
+        if min_tag_age_days > 0 and candidates:
+            latest_stable_tag, published, lookups = await find_old_enough_tag(
+                resolver.session,
+                registry_type,
+                current_repository,
+                candidates,
+                min_tag_age_days,
+                stop_at=str(current_tag),
+            )
+            logs.append(
+                f"    Looked up publish dates for {lookups} candidate tag(s) of {current_repository}."
+            )
+        else:
+            latest_stable_tag = candidates[0] if candidates else None
+    else:
+        latest_stable_tag = get_latest_stable_tag(
+            tags_with_dates, min_tag_age_days, rule, str(current_tag)
+        )
+        published = next(
+            (date for tag, date in tags_with_dates if tag == latest_stable_tag), None
+        )
 
+    new_tag = None
     if latest_stable_tag and latest_stable_tag != current_tag:
         logs.append(
             f"    Found new version: {latest_stable_tag} (current: {current_tag})"
         )
-        return {"info": img_info, "new_tag": latest_stable_tag}, logs
-    if latest_stable_tag:
+        new_tag = latest_stable_tag
+    elif latest_stable_tag:
         logs.append(f"    Already at latest stable version: {current_tag}")
-        return None, logs
+    else:
+        logs.append(
+            f"    No stable version found for {current_repository} with age >= {min_tag_age_days} days."
+        )
 
-    logs.append(
-        f"    No stable version found for {current_repository} with age >= {min_tag_age_days} days."
+    update_item = {
+        "info": img_info,
+        "new_tag": new_tag or current_tag,
+        "published": published,
+        "registry": registry_type,
+    }
+    current_digest = img_info.get("current_digest")
+    target_tag = update_item["new_tag"]
+    if (resolver.pin_digests or current_digest) and target_tag:
+        observed = next(
+            (
+                date.isoformat()
+                for tag, date in tags_with_dates
+                if tag == target_tag and date != datetime.datetime.min
+            ),
+            "",
+        )
+        digest = await resolver.get_digest(
+            registry_type, current_repository, target_tag, observed
+        )
+        if digest is None and current_digest:
+            # Never drop or keep a stale pin for a tag whose digest is unknown.
+            logs.append(
+                f"    Warning: Could not resolve a digest for {current_repository}:{target_tag}. Leaving it unchanged."
+            )
+            return None, logs
+        if digest is None:
+            # Nothing is pinned yet, so the tag upgrade can still go ahead.
+            logs.append(
+                f"    Warning: Could not resolve a digest for {current_repository}:{target_tag}. Skipping the pin."
+            )
+        elif digest != current_digest:
+            logs.append(f"    Pinned {target_tag} to {digest}")
+        elif new_tag is None:
+            return None, logs
+        if digest is not None:
+            update_item["digest"] = digest
+            return update_item, logs
+
+    return (update_item if new_tag else None), logs
+
+
+@dataclass
+class ChartPlan:
+    chart_path: Path
+    logs: list[str]
+    exit_code: int = 0
+    values_document: YamlDocument | None = None
+    chart_document: YamlDocument | None = None
+    chart_data: Any = None
+    images: list[dict] = field(default_factory=list)
+    policies: PolicySet = field(default_factory=PolicySet)
+    updates: list[dict] = field(default_factory=list)
+
+    @property
+    def values_yaml_path(self) -> Path:
+        return self.chart_path / "values.yaml"
+
+    @property
+    def chart_yaml_path(self) -> Path:
+        return self.chart_path / "Chart.yaml"
+
+
+def load_chart_plan(chart_path: Path, policies: PolicySet | None = None) -> ChartPlan:
+    plan = ChartPlan(
+        chart_path=chart_path, logs=[f"Processing chart: {chart_path.name}"]
     )
-    return None, logs
-
-
-async def process_chart(
-    chart_path: Path, min_tag_age_days: int, image_semaphore: asyncio.Semaphore
-):
-    logs = [f"Processing chart: {chart_path.name}"]
+    logs = plan.logs
 
     if not chart_path.is_dir():
         logs.append(f"Error: Chart path '{chart_path}' is not a directory.")
-        return 1, logs
-
-    chart_yaml_path = chart_path / "Chart.yaml"
-    values_yaml_path = chart_path / "values.yaml"
+        plan.exit_code = 1
+        return plan
 
-    if not chart_yaml_path.is_file():
+    if not plan.chart_yaml_path.is_file():
         logs.append(f"Error: Chart.yaml not found in '{chart_path}'.")
-        return 1, logs
+        plan.exit_code = 1
+        return plan
 
-    values_data = {}
-    if values_yaml_path.is_file():
-        values_data = load_yaml_file(values_yaml_path)
+    if plan.values_yaml_path.is_file():
+        plan.values_document = YamlDocument(
+            plan.values_yaml_path.read_text(encoding="utf-8")
+        )
     else:
         logs.append(
             f"Warning: values.yaml not found in '{chart_path}'. Only Chart.yaml appVersion will be considered for upgrade if applicable."
         )
 
-    chart_data = load_yaml_file(chart_yaml_path)
-    images_in_values = find_images_in_values(values_data)
+    plan.chart_document = YamlDocument(plan.chart_yaml_path.read_text(encoding="utf-8"))
+    plan.chart_data = yaml.load(plan.chart_document.text, Loader=SafeLoader)
+    try:
+        plan.policies = (policies or PolicySet()).merged(
+            chart_policies(plan.chart_data)
+        )
+    except (ValueError, TypeError, re.error) as e:
+        logs.append(f"Error: Invalid {POLICY_ANNOTATION} annotation: {e}")
+        plan.exit_code = 1
+        return plan
+    if plan.values_document is not None:
+        plan.images = find_images_in_values(plan.values_document)
+    return plan
+
+
+def prefetch_plan_tags(plans: list[ChartPlan], resolver: TagResolver) -> int:
+    references = 0
+    keys = []
+    for plan in plans:
+        for img_info in plan.images:
+            repository = img_info["current_repository"]
+            registry_type = get_registry_type(repository) if repository else "unknown"
+            if registry_type == "unknown":
+                continue
+            references += 1
+            keys.append((registry_type, repository))
+            resolver.register(registry_type, repository, str(img_info["current_tag"]))
+    for registry_type, repository in keys:
+        resolver.get_tags(registry_type, repository)
+    return references
+
+
+async def process_chart(
+    chart_path: Path,
+    min_tag_age_days: int,
+    image_semaphore: asyncio.Semaphore,
+    cache: RegistryCache | None = None,
+    lookback_days: int = DEFAULT_TAG_LOOKBACK_DAYS,
+    policies: PolicySet | None = None,
+):
+    plan = load_chart_plan(chart_path, policies)
+    async with AsyncHttpClient() as http:
+        resolver = TagResolver(
+            image_semaphore, RegistrySession(http, cache), lookback_days
+        )
+        prefetch_plan_tags([plan], resolver)
+        return await apply_chart_plan(plan, min_tag_age_days, resolver)
+
+
+def new_image_value(update_item: dict) -> str:
+    img_info = update_item["info"]
+    tag = update_item["new_tag"]
+    if update_item.get("digest"):
+        tag = f"{tag}@{update_item['digest']}"
+    if img_info["type"] == "image_string":
+        return f"{img_info['current_repository']}:{tag}"
+    return tag
+
+
+def describe_image_update(update_item: dict) -> str:
+    img_info = update_item["info"]
+    if img_info["type"] == "repo_tag_keys":
+        return f"Updated {img_info['path']}.{img_info['tag_key']} to {new_image_value(update_item)}"
+    return f"Updated {img_info['path']} to {new_image_value(update_item)}"
+
+
+def write_values_updates(plan: ChartPlan, images_to_update: list[dict]) -> None:
+    """Patch only the changed tag scalars, keeping the rest of values.yaml as is."""
+    replacements = [
+        (update_item["info"]["span"], new_image_value(update_item))
+        for update_item in images_to_update
+    ]
+    plan.values_yaml_path.write_text(
+        patch_scalars(plan.values_document.text, replacements), encoding="utf-8"
+    )
+
+
+def is_multi_container(images_in_values: list[dict]) -> bool:
+    # A chart is considered multi-container if it has more than one image definition found,
+    # or if the single image definition is not the top-level 'image' object
+    # (e.g., if it's nested like 'someApp.image').
+    return len(images_in_values) > 1 or (
+        len(images_in_values) == 1 and images_in_values[0]["path"] != "image"
+    )
+
+
+async def apply_chart_plan(
+    plan: ChartPlan, min_tag_age_days: int, resolver: TagResolver, write: bool = True
+):
+    logs = plan.logs
+    if plan.exit_code != 0:
+        return plan.exit_code, logs
+
+    images_in_values = plan.images
 
     image_tasks = [
-        resolve_image_update(img_info, min_tag_age_days, image_semaphore)
+        resolve_image_update(
+            img_info,
+            min_tag_age_days,
+            resolver,
+            plan.policies.for_image(
+                str(img_info["current_repository"]), img_info["path"]
+            ),
+        )
         for img_info in images_in_values
     ]
     image_results = await asyncio.gather(*image_tasks)
@@ -454,101 +1209,179 @@ async def process_chart(
         logs.extend(image_logs)
         if update_item:
             images_to_update.append(update_item)
+    plan.updates = images_to_update
 
-    # A chart is considered multi-container if it has more than one image definition found,
-    # or if the single image definition is not the top-level 'image' object
-    # (e.g., if it's nested like 'someApp.image').
-    is_multi_container = len(images_in_values) > 1 or (
-        len(images_in_values) == 1 and images_in_values[0]["path"] != "image"
-    )
+    if write:
+        write_chart_updates(plan, images_to_update)
+    else:
+        logs.append(f"  Planned {len(images_to_update)} image update(s).")
+        logs.append(f"Finished processing chart: {plan.chart_path.name}")
+    return 0, logs
+
+
+def write_chart_updates(
+    plan: ChartPlan, images_to_update: list[dict], app_version: bool | None = None
+) -> None:
+    """Write ``images_to_update``, bumping appVersion for single-image charts.
+
+    ``app_version`` overrides that choice, as recorded by an upgrade plan.
+    """
+    logs = plan.logs
+    chart_path = plan.chart_path
+    if app_version is None:
+        app_version = not is_multi_container(plan.images)
 
     # Determine update strategy
-    if is_multi_container:
+    if not app_version:
         logs.append(
             "  Chart identified as multi-container (or multiple images need update). Updating tags in values.yaml."
         )
         for update_item in images_to_update:
-            img_info = update_item["info"]
-            if img_info["type"] == "repo_tag_keys":
-                existing_value = img_info["repository_obj"][img_info["tag_key"]]
-                img_info["repository_obj"][img_info["tag_key"]] = apply_scalar_style(
-                    update_item["new_tag"], existing_value
-                )
-                logs.append(
-                    f"    Updated {img_info['path']}.{img_info['tag_key']} to {update_item['new_tag']}"
-                )
-            elif img_info["type"] == "image_string":
-                new_full_image = (
-                    f"{img_info['current_repository']}:{update_item['new_tag']}"
-                )
-                existing_value = img_info["repository_obj"][img_info["repository_key"]]
-                img_info["repository_obj"][img_info["repository_key"]] = (
-                    apply_scalar_style(new_full_image, existing_value)
-                )
-                logs.append(f"    Updated {img_info['path']} to {new_full_image}")
+            logs.append(f"    {describe_image_update(update_item)}")
 
         if images_to_update:
-            save_yaml_file(values_yaml_path, values_data)
+            write_values_updates(plan, images_to_update)
             logs.append(f"  Updated values.yaml for {chart_path.name}")
 
     elif (
         images_to_update
     ):  # Single image found in values.yaml, and it's the main 'image' object or string
         update_item = images_to_update[0]
-        img_info = update_item["info"]
 
         logs.append(
             "  Chart identified as single-container. Updating appVersion in Chart.yaml and tag in values.yaml."
         )
         # Update values.yaml
-        if img_info["type"] == "repo_tag_keys":
-            existing_value = img_info["repository_obj"][img_info["tag_key"]]
-            img_info["repository_obj"][img_info["tag_key"]] = apply_scalar_style(
-                update_item["new_tag"], existing_value
-            )
-            logs.append(
-                f"    Updated {img_info['path']}.{img_info['tag_key']} to {update_item['new_tag']} in values.yaml"
-            )
-        elif img_info["type"] == "image_string":
-            new_full_image = (
-                f"{img_info['current_repository']}:{update_item['new_tag']}"
-            )
-            existing_value = img_info["repository_obj"][img_info["repository_key"]]
-            img_info["repository_obj"][img_info["repository_key"]] = apply_scalar_style(
-                new_full_image, existing_value
-            )
-            logs.append(
-                f"    Updated {img_info['path']} to {new_full_image} in values.yaml"
-            )
-
-        save_yaml_file(values_yaml_path, values_data)
+        write_values_updates(plan, images_to_update)
+        logs.append(f"    {describe_image_update(update_item)} in values.yaml")
 
         # Update Chart.yaml appVersion
-        chart_data["appVersion"] = apply_scalar_style(
-            update_item["new_tag"], chart_data.get("appVersion")
+        plan.chart_yaml_path.write_text(
+            set_top_level_scalar(
+                plan.chart_document, "appVersion", update_item["new_tag"]
+            ),
+            encoding="utf-8",
         )
-        save_yaml_file(chart_yaml_path, chart_data)
         logs.append(f"    Updated appVersion in Chart.yaml to {update_item['new_tag']}")
     else:
         logs.append("  No upgradeable images found or no changes needed.")
 
     logs.append(f"Finished processing chart: {chart_path.name}")
-    return 0, logs
 
 
-async def process_chart_with_semaphore(
-    chart_path: Path,
+async def apply_chart_plan_with_semaphore(
+    plan: ChartPlan,
     min_tag_age_days: int,
     chart_semaphore: asyncio.Semaphore,
-    image_semaphore: asyncio.Semaphore,
+    resolver: TagResolver,
+    write: bool = True,
 ):
     async with chart_semaphore:
-        return chart_path, await process_chart(
-            chart_path, min_tag_age_days, image_semaphore
+        return plan.chart_path, await apply_chart_plan(
+            plan, min_tag_age_days, resolver, write
         )
 
 
+# --- Upgrade Plans ---
+PLAN_FORMAT_VERSION = 1
+
+
+def plan_change(plan: ChartPlan, update_item: dict) -> dict:
+    img_info = update_item["info"]
+    published = update_item.get("published")
+    if published == datetime.datetime.min:
+        published = None
+    return {
+        "chart": plan.chart_path.as_posix(),
+        "path": img_info["path"],
+        "type": img_info["type"],
+        "repository": img_info["current_repository"],
+        "registry": update_item.get("registry"),
+        "oldTag": img_info["current_tag"],
+        "newTag": update_item["new_tag"],
+        "digest": update_item.get("digest"),
+        "published": published.isoformat() if published else None,
+        "appVersion": not is_multi_container(plan.images),
+    }
+
+
+def build_upgrade_plan(plans: list[ChartPlan], min_tag_age_days: int) -> dict:
+    return {
+        "version": PLAN_FORMAT_VERSION,
+        "generated": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "minTagAgeDays": min_tag_age_days,
+        "changes": [
+            plan_change(plan, update_item)
+            for plan in plans
+            for update_item in plan.updates
+        ],
+    }
+
+
+def apply_upgrade_plan(upgrade_plan: dict, chart_paths: list[Path]) -> int:
+    """Write the changes recorded in an upgrade plan without any network access.
+
+    Changes whose current tag no longer matches the plan's old tag are skipped,
+    so a stale plan never overwrites newer edits. ``chart_paths`` limits the
+    charts touched, which lets one plan feed separate per-chart jobs.
+    """
+    if upgrade_plan.get("version") != PLAN_FORMAT_VERSION:
+        print(
+            f"Error: Unsupported upgrade plan version {upgrade_plan.get('version')!r}.",
+            file=sys.stderr,
+        )
+        return 1
+
+    selected = {path.resolve() for path in chart_paths}
+    changes_by_chart: dict[Path, list[dict]] = {}
+    for change in upgrade_plan.get("changes", []):
+        chart_path = Path(change["chart"])
+        if selected and chart_path.resolve() not in selected:
+            continue
+        changes_by_chart.setdefault(chart_path, []).append(change)
+
+    overall_exit_code = 0
+    for chart_path, changes in changes_by_chart.items():
+        plan = load_chart_plan(chart_path)
+        if plan.exit_code == 0:
+            images = {(img["path"], img["type"]): img for img in plan.images}
+            images_to_update = []
+            for change in changes:
+                img_info = images.get((change["path"], change["type"]))
+                if img_info is None or img_info["current_tag"] != change["oldTag"]:
+                    plan.logs.append(
+                        f"  Warning: Skipping {change['path']}: expected tag {change['oldTag']} is no longer present."
+                    )
+                    continue
+                images_to_update.append(
+                    {
+                        "info": img_info,
+                        "new_tag": change["newTag"],
+                        "digest": change.get("digest"),
+                    }
+                )
+            write_chart_updates(
+                plan,
+                images_to_update,
+                app_version=any(change.get("appVersion") for change in changes),
+            )
+        for line in plan.logs:
+            print(line)
+        overall_exit_code = overall_exit_code or plan.exit_code
+    return overall_exit_code
+
+
 async def async_main(args) -> int:
+    if args.apply:
+        try:
+            upgrade_plan = json.loads(args.apply.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not read plan {args.apply}: {e}", file=sys.stderr)
+            return 1
+        return apply_upgrade_plan(upgrade_plan, args.chart_paths)
+    if not args.chart_paths:
+        print("Error: at least one chart path is required.", file=sys.stderr)
+        return 1
     if args.min_tag_age_days < 0:
         print("Error: --min-tag-age-days cannot be negative.", file=sys.stderr)
         return 1
@@ -558,30 +1391,95 @@ async def async_main(args) -> int:
     if args.image_concurrency < 1:
         print("Error: --image-concurrency must be at least 1.", file=sys.stderr)
         return 1
+    if args.cache_ttl_hours < 0:
+        print("Error: --cache-ttl-hours cannot be negative.", file=sys.stderr)
+        return 1
+    if args.tag_lookback_days < 0:
+        print("Error: --tag-lookback-days cannot be negative.", file=sys.stderr)
+        return 1
+
+    policies = PolicySet()
+    if args.policy_file:
+        try:
+            policies = load_policy_file(args.policy_file)
+        except (OSError, ValueError, TypeError, re.error) as e:
+            print(
+                f"Error: Could not load policy file {args.policy_file}: {e}",
+                file=sys.stderr,
+            )
+            return 1
 
     chart_semaphore = asyncio.Semaphore(args.chart_concurrency)
     image_semaphore = asyncio.Semaphore(args.image_concurrency)
+    cache = RegistryCache(
+        args.cache_path, args.cache_ttl_hours * 3600, refresh=args.refresh
+    )
+    http = AsyncHttpClient(
+        max_connections_per_host=args.image_concurrency,
+        origin_overrides=dict(args.registry_origin),
+    )
+    resolver = TagResolver(
+        image_semaphore,
+        RegistrySession(http, cache),
+        args.tag_lookback_days,
+        pin_digests=args.pin_digests,
+    )
+
+    # Plan every chart first so each distinct repository is resolved once,
+    # no matter how many charts or values paths reference it.
+    plans = [load_chart_plan(chart_path, policies) for chart_path in args.chart_paths]
+    references = prefetch_plan_tags(plans, resolver)
+    print(
+        f"Resolving {resolver.lookup_count} unique repositories for "
+        f"{references} image references across {len(plans)} charts"
+    )
+
     tasks = [
-        process_chart_with_semaphore(
-            chart_path,
+        apply_chart_plan_with_semaphore(
+            plan,
             args.min_tag_age_days,
             chart_semaphore,
-            image_semaphore,
+            resolver,
+            write=args.plan is None,
         )
-        for chart_path in args.chart_paths
+        for plan in plans
     ]
 
     overall_exit_code = 0
-    for chart_path, (exit_code, logs) in await asyncio.gather(*tasks):
-        del chart_path
+    try:
+        results = await asyncio.gather(*tasks)
+    finally:
+        await http.close()
+        cache.close()
+    for _, (exit_code, logs) in results:
         for line in logs:
             print(line)
         if exit_code != 0:
             overall_exit_code = exit_code
 
+    for line in format_http_stats(http):
+        print(line)
+
+    if args.plan is not None:
+        upgrade_plan = build_upgrade_plan(plans, args.min_tag_age_days)
+        args.plan.write_text(
+            json.dumps(upgrade_plan, indent=2) + "\n", encoding="utf-8"
+        )
+        print(f"Wrote {len(upgrade_plan['changes'])} planned change(s) to {args.plan}")
     return overall_exit_code
 
 
+def format_http_stats(http: AsyncHttpClient) -> list[str]:
+    if not http.stats:
+        return []
+    lines = ["Registry traffic:"]
+    for host, stats in sorted(http.stats.items()):
+        lines.append(
+            f"  {host}: {stats.requests} requests, {stats.bytes / 1024:.1f} KiB"
+        )
+    return lines
+
+
 def main():
     args = parse_args()
     raise SystemExit(asyncio.run(async_main(args)))
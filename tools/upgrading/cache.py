@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+
+DEFAULT_CACHE_TTL_HOURS = 6.0
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tag_lists (
+    registry TEXT NOT NULL,
+    repository TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    etag TEXT,
+    fetched_at REAL NOT NULL,
+    complete INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (registry, repository)
+);
+CREATE TABLE IF NOT EXISTS tokens (
+    scope TEXT PRIMARY KEY,
+    token TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tag_digests (
+    registry TEXT NOT NULL,
+    repository TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    observed TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (registry, repository, tag)
+);
+CREATE TABLE IF NOT EXISTS image_dates (
+    digest TEXT PRIMARY KEY,
+    created TEXT NOT NULL
+);
+"""
+
+
+def default_cache_path() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base) / "helm-charts" / "registry-cache.sqlite3"
+
+
+def encode_tags(tags: list[Any]) -> str:
+    encoded = []
+    for tag in tags:
+        if isinstance(tag, tuple):
+            name, timestamp = tag
+            encoded.append([name, timestamp.isoformat()])
+        else:
+            encoded.append(tag)
+    return json.dumps(encoded, separators=(",", ":"))
+
+
+def decode_tags(payload: str) -> list[Any]:
+    decoded = []
+    for tag in json.loads(payload):
+        if isinstance(tag, list):
+            decoded.append((tag[0], datetime.datetime.fromisoformat(tag[1])))
+        else:
+            decoded.append(tag)
+    return decoded
+
+
+@dataclass(frozen=True)
+class CachedTags:
+    tags: list[Any]
+    etag: Optional[str]
+    fetched_at: float
+    complete: bool = True
+
+
+class RegistryCache:
+    """SQLite-backed cache of registry tag lists, ETags, bearer tokens, tag
+    digests and image publish dates.
+
+    - Tag lists younger than ``ttl_seconds`` are served without touching the
+      network; older ones keep their ETag so fetchers can revalidate with
+      ``If-None-Match``. A newest-first walk that stopped early is stored as
+      partial, and callers only serve it for windows it reaches past.
+    - Tokens are served until the expiry the registry gave them.
+    - Tag digests stay valid while the tag's listed update time is unchanged,
+      or for ``ttl_seconds`` where the registry lists no dates.
+    - Publish dates are keyed by manifest digest and never expire.
+
+    ``refresh`` ignores everything cached but still records new results.
+    Because the file holds bearer tokens, it is created readable and
+    writable by its owner only (mode 0600).
+    """
+
+    def __init__(self, path: Path, ttl_seconds: float, refresh: bool = False) -> None:
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        os.chmod(path, 0o600)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tag_lists)")}
+        if "complete" not in columns:
+            # Caches written before partial listings were kept.
+            self._conn.execute(
+                "ALTER TABLE tag_lists ADD COLUMN complete INTEGER NOT NULL DEFAULT 1"
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def get_tags(self, registry: str, repository: str) -> Optional[CachedTags]:
+        if self.refresh:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tags, etag, fetched_at, complete FROM tag_lists "
+                "WHERE registry = ? AND repository = ?",
+                (registry, repository),
+            ).fetchone()
+        if row is None:
+            return None
+        return CachedTags(
+            tags=decode_tags(row[0]),
+            etag=row[1],
+            fetched_at=row[2],
+            complete=bool(row[3]),
+        )
+
+    def fresh_tags(self, registry: str, repository: str) -> Optional[CachedTags]:
+        cached = self.get_tags(registry, repository)
+        if cached is None or time.time() - cached.fetched_at > self.ttl_seconds:
+            return None
+        return cached
+
+    def put_tags(
+        self,
+        registry: str,
+        repository: str,
+        tags: list[Any],
+        etag: Optional[str] = None,
+        complete: bool = True,
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tag_lists "
+                "(registry, repository, tags, etag, fetched_at, complete) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (registry, repository, encode_tags(tags), etag, time.time(), complete),
+            )
+
+    def touch_tags(self, registry: str, repository: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE tag_lists SET fetched_at = ? WHERE registry = ? AND repository = ?",
+                (time.time(), registry, repository),
+            )
+
+    def get_token(self, scope: str) -> Optional[str]:
+        if self.refresh:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT token, expires_at FROM tokens WHERE scope = ?", (scope,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0]
+
+    def put_token(self, scope: str, token: str, expires_in: float) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tokens (scope, token, expires_at) VALUES (?, ?, ?)",
+                (scope, token, time.time() + expires_in),
+            )
+
+    def get_created(self, digest: str) -> Optional[datetime.datetime]:
+        if self.refresh:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created FROM image_dates WHERE digest = ?", (digest,)
+            ).fetchone()
+        if row is None:
+            return None
+        return datetime.datetime.fromisoformat(row[0])
+
+    def put_created(self, digest: str, created: datetime.datetime) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO image_dates (digest, created) VALUES (?, ?)",
+                (digest, created.isoformat()),
+            )
+
+    def get_digest(
+        self, registry: str, repository: str, tag: str, observed: str = ""
+    ) -> Optional[str]:
+        """Return the cached digest of ``tag`` if the tag has not moved.
+
+        ``observed`` is the tag's last update time from the registry listing.
+        Registries that list no dates fall back to the cache TTL.
+        """
+        if self.refresh:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT digest, observed, fetched_at FROM tag_digests "
+                "WHERE registry = ? AND repository = ? AND tag = ?",
+                (registry, repository, tag),
+            ).fetchone()
+        if row is None:
+            return None
+        if observed:
+            return row[0] if row[1] == observed else None
+        return row[0] if time.time() - row[2] <= self.ttl_seconds else None
+
+    def put_digest(
+        self, registry: str, repository: str, tag: str, digest: str, observed: str = ""
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tag_digests "
+                "(registry, repository, tag, digest, observed, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (registry, repository, tag, digest, observed, time.time()),
+            )
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+
+DEFAULT_TIMEOUT_SECONDS = 10.0
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF_SECONDS = 0.5
+MAX_REDIRECTS = 5
+# Anonymous Docker Hub and Quay API calls are rate limited per client IP, so
+# keep fewer sockets open to them than to the OCI registries.
+DEFAULT_HOST_CONNECTION_LIMITS = {"hub.docker.com": 4, "quay.io": 4}
+USER_AGENT = "helm-charts-upgrade/1.0"
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, url: str) -> None:
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+        self.url = url
+
+
+@dataclass
+class HttpResponse:
+    status: int
+    headers: dict[str, str]
+    body: bytes
+    url: str
+
+    def header(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return self.headers.get(name.lower(), default)
+
+    def json(self) -> Any:
+        return json.loads(self.body.decode("utf-8"))
+
+    def raise_for_status(self) -> None:
+        if self.status >= 400:
+            raise HttpError(self.status, self.url)
+
+
+@dataclass
+class HostStats:
+    requests: int = 0
+    bytes: int = 0
+
+
+# Errors that may be raised while talking to a registry: error statuses,
+# transport failures and timeouts, and bodies that are not valid JSON.
+REQUEST_ERRORS = (HttpError, httpx.HTTPError, json.JSONDecodeError)
+
+
+class _OriginOverride(httpx.AsyncBaseTransport):
+    """Send a host's requests to another origin, keeping their ``Host`` header."""
+
+    def __init__(self, origin: str) -> None:
+        url = httpx.URL(origin)
+        self.scheme = url.scheme
+        self.host = url.host
+        self.port = url.port
+        self.transport = httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        # Forward a copy so redirects still resolve against the original URL.
+        forwarded = httpx.Request(
+            request.method,
+            request.url.copy_with(scheme=self.scheme, host=self.host, port=self.port),
+            headers=request.headers,
+            stream=request.stream,
+            extensions=request.extensions,
+        )
+        return await self.transport.handle_async_request(forwarded)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class AsyncHttpClient:
+    """Registry HTTP client on top of a pooled ``httpx.AsyncClient``.
+
+    Each host gets a semaphore capping its concurrent requests. 429
+    responses are retried with exponential backoff, honouring
+    ``Retry-After`` when the server sends one. Proxies come from the usual
+    ``HTTPS_PROXY``/``HTTP_PROXY``/``NO_PROXY`` variables.
+    ``origin_overrides`` sends requests for a host to another origin, such
+    as a local replay server, while keeping the original ``Host`` header.
+    """
+
+    def __init__(
+        self,
+        max_connections_per_host: int = 8,
+        host_limits: Optional[dict[str, int]] = None,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff: float = DEFAULT_BACKOFF_SECONDS,
+        origin_overrides: Optional[dict[str, str]] = None,
+    ) -> None:
+        self.max_connections_per_host = max_connections_per_host
+        self.host_limits = (
+            dict(DEFAULT_HOST_CONNECTION_LIMITS) if host_limits is None else host_limits
+        )
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.stats: dict[str, HostStats] = {}
+        self._slots: dict[str, asyncio.Semaphore] = {}
+        self._client = httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT},
+            timeout=timeout,
+            follow_redirects=True,
+            max_redirects=MAX_REDIRECTS,
+            # The per-host semaphores bound the sockets; keep them all alive.
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=None),
+            mounts={
+                f"all://{host}": _OriginOverride(origin)
+                for host, origin in (origin_overrides or {}).items()
+            },
+            event_hooks={"response": [self._count_response]},
+        )
+
+    async def __aenter__(self) -> AsyncHttpClient:
+        return self
+
+    async def __aexit__(self, *_exc: object) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+    async def get(
+        self, url: str, headers: Optional[dict[str, str]] = None
+    ) -> HttpResponse:
+        return await self.request("GET", url, headers=headers)
+
+    async def head(
+        self, url: str, headers: Optional[dict[str, str]] = None
+    ) -> HttpResponse:
+        return await self.request("HEAD", url, headers=headers)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[dict[str, str]] = None,
+        body: Optional[bytes] = None,
+    ) -> HttpResponse:
+        host = urlsplit(url).hostname or ""
+        attempt = 0
+        while True:
+            async with self._slot(host):
+                response = await self._client.request(
+                    method, url, headers=headers, content=body
+                )
+            stats = self.stats.setdefault(host, HostStats())
+            stats.bytes += response.num_bytes_downloaded
+            result = HttpResponse(
+                response.status_code,
+                {key.lower(): value for key, value in response.headers.items()},
+                response.content,
+                str(response.url),
+            )
+            if result.status == 429 and attempt < self.max_retries:
+                await asyncio.sleep(self._retry_delay(result, attempt))
+                attempt += 1
+                continue
+            return result
+
+    async def _count_response(self, response: httpx.Response) -> None:
+        # Runs once per hop, so redirects and retries are counted too.
+        host = response.request.url.host
+        self.stats.setdefault(host, HostStats()).requests += 1
+
+    def _retry_delay(self, response: HttpResponse, attempt: int) -> float:
+        retry_after = response.header("retry-after")
+        if retry_after:
+            try:
+                return max(float(retry_after), 0.0)
+            except ValueError:
+                pass
+            try:
+                parsed = email.utils.parsedate_to_datetime(retry_after)
+            except ValueError:
+                parsed = None
+            if parsed is not None:
+                return max(parsed.timestamp() - time.time(), 0.0)
+        return self.backoff * (2**attempt)
+
+    def _slot(self, host: str) -> asyncio.Semaphore:
+        slot = self._slots.get(host)
+        if slot is None:
+            limit = min(
+                self.max_connections_per_host,
+                self.host_limits.get(host, self.max_connections_per_host),
+            )
+            slot = asyncio.Semaphore(max(limit, 1))
+            self._slots[host] = slot
+        return slot
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import datetime
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from packaging.version import InvalidVersion, Version
+from packaging.version import parse as parse_version
+from ruamel.yaml import YAML
+
+
+POLICY_ANNOTATION = "mbround18.github.io/upgrade-policy"
+UNSTABLE_TAG_RE = re.compile(r"\b(latest|snapshot|dev|nightly|test|alpha|beta|rc)\b")
+RULE_KEYS = {
+    "pattern": "pattern",
+    "variant": "variant",
+    "pinMajor": "pin_major",
+    "lookbackDays": "lookback_days",
+}
+
+
+# Large enough for every tag of the busiest repository in one run, while
+# keeping a long-lived process from growing without bound.
+@lru_cache(maxsize=65_536)
+def parse_stable_version(tag: str) -> Optional[Version]:
+    """Parse ``tag`` as a stable release version, or return None."""
+    if UNSTABLE_TAG_RE.search(tag.lower()):
+        return None
+    try:
+        version = parse_version(tag)
+    except InvalidVersion:
+        return None
+    if version.is_prerelease or version.is_devrelease:
+        return None
+    return version
+
+
+@dataclass(frozen=True)
+class PolicyRule:
+    """Which tags an image may move to.
+
+    ``pattern`` must match the whole tag, ``variant`` keeps the image on one
+    ``-suffix`` family (``alpine`` for ``8-alpine``), ``pin_major`` holds the
+    current major version and ``lookback_days`` ignores tags older than that.
+    """
+
+    pattern: Optional[str] = None
+    variant: Optional[str] = None
+    pin_major: bool = False
+    lookback_days: Optional[int] = None
+
+    @classmethod
+    def from_mapping(cls, data: Any) -> PolicyRule:
+        if not isinstance(data, dict):
+            raise ValueError(f"upgrade policy must be a mapping, got {data!r}")
+        unknown = sorted(set(data) - set(RULE_KEYS))
+        if unknown:
+            raise ValueError(f"unknown upgrade policy keys: {', '.join(unknown)}")
+        rule = cls(**{RULE_KEYS[key]: value for key, value in data.items()})
+        if rule.pattern is not None:
+            re.compile(rule.pattern)
+        if rule.lookback_days is not None and rule.lookback_days < 0:
+            raise ValueError("lookbackDays cannot be negative")
+        return rule
+
+
+class CompiledPolicy:
+    """A ``PolicyRule`` with its pattern compiled, ready to pick tags."""
+
+    def __init__(self, rule: PolicyRule) -> None:
+        self.rule = rule
+        self.pattern = re.compile(rule.pattern) if rule.pattern else None
+        self.suffix = f"-{rule.variant}" if rule.variant else None
+        self.lookback = (
+            datetime.timedelta(days=rule.lookback_days) if rule.lookback_days else None
+        )
+
+    def version_of(self, tag: str) -> Optional[Version]:
+        if self.pattern is not None and not self.pattern.fullmatch(tag):
+            return None
+        if self.suffix is not None:
+            if not tag.endswith(self.suffix):
+                return None
+            tag = tag[: -len(self.suffix)]
+        return parse_stable_version(tag)
+
+    def pinned_major(self, current_tag: Optional[str]) -> Optional[int]:
+        if not self.rule.pin_major or not current_tag:
+            return None
+        version = self.version_of(current_tag)
+        return version.major if version is not None else None
+
+    def candidates(
+        self,
+        tags_with_dates: Iterable[tuple[str, datetime.datetime]],
+        current_tag: Optional[str] = None,
+        min_age_days: int = 0,
+        now: Optional[datetime.datetime] = None,
+    ) -> Iterable[tuple[Version, str]]:
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        major = self.pinned_major(current_tag)
+        for tag, timestamp in tags_with_dates:
+            if timestamp != datetime.datetime.min:
+                age = now - timestamp
+                if min_age_days > 0 and age.days < min_age_days:
+                    continue
+                if self.lookback is not None and age > self.lookback:
+                    continue
+            version = self.version_of(tag)
+            if version is None or (major is not None and version.major != major):
+                continue
+            yield version, tag
+
+    def select(
+        self,
+        tags_with_dates: Iterable[tuple[str, datetime.datetime]],
+        current_tag: Optional[str] = None,
+        min_age_days: int = 0,
+        now: Optional[datetime.datetime] = None,
+    ) -> Optional[str]:
+        """Return the highest allowed tag in a single pass."""
+        best_version = None
+        best_tag = None
+        for version, tag in self.candidates(
+            tags_with_dates, current_tag, min_age_days, now
+        ):
+            if best_version is None or version > best_version:
+                best_version = version
+                best_tag = tag
+        return best_tag
+
+    def rank(
+        self,
+        tags_with_dates: Iterable[tuple[str, datetime.datetime]],
+        current_tag: Optional[str] = None,
+        min_age_days: int = 0,
+    ) -> list[str]:
+        """Return every allowed tag, highest version first."""
+        ranked = sorted(
+            self.candidates(tags_with_dates, current_tag, min_age_days),
+            key=lambda candidate: candidate[0],
+            reverse=True,
+        )
+        return [tag for _, tag in ranked]
+
+
+@lru_cache(maxsize=256)
+def compile_policy(rule: PolicyRule) -> CompiledPolicy:
+    return CompiledPolicy(rule)
+
+
+def normalize_image_name(repository: str) -> str:
+    for prefix in ("docker.io/", "index.docker.io/"):
+        if repository.startswith(prefix):
+            repository = repository[len(prefix) :]
+    return repository.removeprefix("library/")
+
+
+@dataclass
+class PolicySet:
+    """Policy rules keyed by image repository or values path."""
+
+    default: PolicyRule = field(default_factory=PolicyRule)
+    images: dict[str, PolicyRule] = field(default_factory=dict)
+
+    @classmethod
+    def from_mapping(cls, data: Any) -> PolicySet:
+        if data is None:
+            return cls()
+        if not isinstance(data, dict):
+            raise ValueError("upgrade policies must be a mapping")
+        default = PolicyRule.from_mapping(data.get("default") or {})
+        images = {
+            normalize_image_name(str(name)): PolicyRule.from_mapping(rule)
+            for name, rule in (data.get("images") or {}).items()
+        }
+        return cls(default, images)
+
+    def merged(self, other: PolicySet) -> PolicySet:
+        images = dict(self.images)
+        images.update(other.images)
+        default = other.default if other.default != PolicyRule() else self.default
+        return PolicySet(default, images)
+
+    def for_image(self, repository: str, path: str = "") -> PolicyRule:
+        rule = self.images.get(path) if path else None
+        if rule is None:
+            rule = self.images.get(normalize_image_name(repository), self.default)
+        return rule
+
+
+def load_policy_file(path: Path) -> PolicySet:
+    with path.open(encoding="utf-8") as handle:
+        return PolicySet.from_mapping(YAML(typ="safe").load(handle))
+
+
+def chart_policies(chart_data: Any) -> PolicySet:
+    """Read the ``images`` policies a chart declares in its annotations."""
+    annotations = (chart_data or {}).get("annotations") or {}
+    raw = annotations.get(POLICY_ANNOTATION)
+    if not raw:
+        return PolicySet()
+    # Round-trip loaders hand back str subclasses the safe loader rejects.
+    return PolicySet.from_mapping({"images": YAML(typ="safe").load(str(raw))})
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # pragma: no cover - libyaml is optional
+    from yaml import SafeLoader
+
+
+STR_TAG = "tag:yaml.org,2002:str"
+NULL_TAG = "tag:yaml.org,2002:null"
+# Node properties (``&anchor`` and ``!tag``) that precede a scalar's value.
+NODE_PROPERTIES_RE = re.compile(r"(?:[&!]\S*\s*)*")
+
+
+@dataclass(frozen=True)
+class ScalarSpan:
+    """Where a scalar sits in its source text, quotes included."""
+
+    start: int
+    end: int
+    style: Optional[str]
+    value: str
+
+
+class YamlDocument:
+    """A YAML document composed with source marks for in-place edits.
+
+    Composing skips constructing Python objects and the round-trip comment
+    model, so finding scalars is cheap even for large values files.
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.root = yaml.compose(text, Loader=SafeLoader)
+        self._line_starts = [0] + [match.end() for match in re.finditer("\n", text)]
+
+    def offset(self, mark: Any) -> int:
+        return self._line_starts[mark.line] + mark.column
+
+    def span(self, node: yaml.ScalarNode) -> ScalarSpan:
+        # A node's start mark sits on its anchor or tag when it has one; the
+        # span covers only the value so patching keeps both.
+        end = self.offset(node.end_mark)
+        start = NODE_PROPERTIES_RE.match(
+            self.text, self.offset(node.start_mark), end
+        ).end()
+        return ScalarSpan(
+            start,
+            end,
+            node.style or None,
+            scalar_text(node),
+        )
+
+    def top_level_scalar(self, key: str) -> Optional[ScalarSpan]:
+        if not isinstance(self.root, yaml.MappingNode):
+            return None
+        for key_node, value_node in self.root.value:
+            if key_node.value == key and isinstance(value_node, yaml.ScalarNode):
+                return self.span(value_node)
+        return None
+
+
+def scalar_text(node: yaml.ScalarNode) -> str:
+    return "" if node.tag == NULL_TAG else node.value
+
+
+def render_scalar(value: str, style: Optional[str]) -> str:
+    """Render ``value`` in ``style``, quoting plain text YAML would retype."""
+    if style == '"':
+        return json.dumps(value)
+    if style == "'" or not is_plain_string(value):
+        return "'" + value.replace("'", "''") + "'"
+    return value
+
+
+def is_plain_string(value: str) -> bool:
+    try:
+        return yaml.load(value, Loader=SafeLoader) == value
+    except yaml.YAMLError:
+        return False
+
+
+def patch_scalars(text: str, replacements: list[tuple[ScalarSpan, str]]) -> str:
+    """Rewrite each span with its new value, leaving every other byte alone."""
+    pieces = []
+    cursor = 0
+    seen = set()
+    for span, value in sorted(replacements, key=lambda item: item[0].start):
+        if span.start in seen:
+            # Aliased scalars resolve to the same anchored node.
+            continue
+        seen.add(span.start)
+        pieces.append(text[cursor : span.start])
+        if span.start == span.end and not text[span.start - 1 : span.start].isspace():
+            # An empty value sits right after ``key:`` or its anchor.
+            pieces.append(" ")
+        pieces.append(render_scalar(value, span.style))
+        cursor = span.end
+    pieces.append(text[cursor:])
+    return "".join(pieces)
+
+
+def set_top_level_scalar(document: YamlDocument, key: str, value: str) -> str:
+    span = document.top_level_scalar(key)
+    if span is not None:
+        return patch_scalars(document.text, [(span, value)])
+    text = document.text
+    if text and not text.endswith("\n"):
+        text += "\n"
+    return f"{text}{key}: {render_scalar(value, None)}\n"
@@ -1,12 +1,16 @@
 from __future__ import annotations
 
+import datetime
+import hashlib
+import json
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
 import yaml
 
-from tools.versioning.common import log
+from tools.versioning.common import log, parse_semver
 
 
 def list_chart_dirs(charts_root: Path) -> list[Path]:
@@ -44,6 +48,36 @@ def write_chart_version(chart_yaml: Path, new_version: str) -> None:
     write_yaml(chart_yaml, data)
 
 
+def local_dependency_dir(chart_dir: Path, repository: object) -> str | None:
+    """Name of the sibling chart directory a ``file://`` repository points at.
+
+    Charts are keyed by directory, which can differ from the ``name`` in
+    their Chart.yaml (``charts/bubbles-ttrpg`` is ``bubble-ttrpg``).
+    """
+    if not isinstance(repository, str) or not repository.startswith("file://"):
+        return None
+    target = (chart_dir / repository.removeprefix("file://")).resolve()
+    if target.parent != chart_dir.resolve().parent:
+        return None
+    return target.name
+
+
+def local_dependency_graph(charts_root: Path) -> dict[str, set[str]]:
+    """Map each chart directory to the chart directories it pulls in via ``file://``."""
+    graph: dict[str, set[str]] = {}
+    for chart_dir in list_chart_dirs(charts_root):
+        dependencies = load_yaml(chart_dir / "Chart.yaml").get("dependencies")
+        graph[chart_dir.name] = {
+            target
+            for dependency in dependencies or []
+            if isinstance(dependency, dict)
+            and (
+                target := local_dependency_dir(chart_dir, dependency.get("repository"))
+            )
+        }
+    return graph
+
+
 def sync_local_dependency_versions(
     charts_root: Path,
     bumped_versions: dict[str, str],
@@ -76,7 +110,9 @@ def sync_local_dependency_versions(
             ):
                 continue
 
-            target_version = bumped_versions.get(dependency_name)
+            target_version = bumped_versions.get(
+                local_dependency_dir(chart_dir, repository) or dependency_name
+            )
             if target_version and dependency_version != target_version:
                 log(
                     "INFO",
@@ -95,22 +131,173 @@ def sync_local_dependency_versions(
     return updated_chart_dirs
 
 
-def refresh_dependency_locks(chart_dirs: list[Path]) -> list[Path]:
-    updated_lockfiles: list[Path] = []
+# Field order and omitempty rules of Helm's chart.Dependency, which its lock
+# digest is computed over.
+DEPENDENCY_FIELDS = (
+    ("name", False),
+    ("version", True),
+    ("repository", False),
+    ("condition", True),
+    ("tags", True),
+    ("enabled", True),
+    ("import-values", True),
+    ("alias", True),
+)
+DEFAULT_LOCK_WORKERS = 8
 
-    for chart_dir in chart_dirs:
-        lock_path = chart_dir / "Chart.lock"
-        log("INFO", f"Refreshing dependency lock for {chart_dir.name}")
 
-        # Once Chart.yaml dependency versions change, Helm refuses to build from a
-        # stale Chart.lock. Remove it first so dependency build regenerates the
-        # lockfile from current dependency metadata.
-        lock_path.unlink(missing_ok=True)
+def _go_dependency(dependency: dict) -> dict:
+    encoded = {}
+    for key, omit_empty in DEPENDENCY_FIELDS:
+        value = dependency.get(key)
+        if omit_empty and not value:
+            continue
+        encoded[key] = "" if value is None else value
+    return encoded
+
+
+def lock_digest(requirements: list[dict], locked: list[dict]) -> str:
+    """Compute Helm's Chart.lock digest (``resolver.HashReq``).
+
+    Helm hashes the Go JSON encoding of ``[requirements, locked]``, which
+    is compact and escapes HTML characters.
+    """
+    data = json.dumps(
+        [
+            [_go_dependency(item) for item in requirements],
+            [_go_dependency(item) for item in locked],
+        ],
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    for character, escaped in (("&", "\\u0026"), ("<", "\\u003c"), (">", "\\u003e")):
+        data = data.replace(character, escaped)
+    return "sha256:" + hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _version_matches(constraint: str, version: str) -> Optional[bool]:
+    """Check an exact or wildcard (``0.1.*``) constraint.
+
+    Returns None for constraints that need Helm's semver ranges to decide.
+    """
+    if constraint in ("", "*") or constraint == version:
+        return True
+    if parse_semver(constraint) is not None:
+        return False
+    parts = constraint.split(".")
+    if len(parts) == 3 and parts[-1] in ("*", "x", "X") and "*" not in parts[:2]:
+        prefix = f"{parts[0]}.{parts[1]}."
+        if parse_semver(f"{prefix}0") is not None:
+            return version.startswith(prefix)
+    return None
+
+
+def resolve_local_lock(chart_dir: Path) -> Optional[list[dict]]:
+    """Resolve the lock entries for a chart's dependencies without helm.
+
+    ``file://`` dependencies are locked to the version of the chart on
+    disk, and remote ones are carried over from the existing Chart.lock.
+    Returns None when a dependency needs helm to resolve it: a version
+    range, or a remote dependency that is missing from the lock or no
+    longer matches it.
+    """
+    requirements = load_yaml(chart_dir / "Chart.yaml").get("dependencies") or []
+    lock_path = chart_dir / "Chart.lock"
+    previous = load_yaml(lock_path).get("dependencies") if lock_path.exists() else []
+    pinned = {
+        (item.get("name"), item.get("repository")): str(item.get("version", ""))
+        for item in previous or []
+        if isinstance(item, dict)
+    }
 
-        subprocess.check_call(
-            ["helm", "dependency", "build", "--skip-refresh", str(chart_dir)],
-            cwd=str(chart_dir.parent.parent),
-        )
+    locked = []
+    for dependency in requirements:
+        if not isinstance(dependency, dict):
+            return None
+        name = dependency.get("name")
+        repository = str(dependency.get("repository") or "")
+        constraint = str(dependency.get("version") or "")
+        if repository.startswith("file://"):
+            local_chart = chart_dir / repository.removeprefix("file://") / "Chart.yaml"
+            version = load_chart_version(local_chart) if local_chart.exists() else None
+        else:
+            version = pinned.get((name, repository))
+        if version is None or not _version_matches(constraint, version):
+            return None
+        locked.append({"name": name, "repository": repository, "version": version})
+    return locked
+
+
+def _format_generated(moment: datetime.datetime) -> str:
+    # Helm writes RFC 3339 timestamps with trailing zeros trimmed.
+    fraction = moment.strftime("%f").rstrip("0")
+    stamp = moment.strftime("%Y-%m-%dT%H:%M:%S")
+    return f"{stamp}.{fraction}Z" if fraction else f"{stamp}Z"
+
+
+def write_chart_lock(chart_dir: Path) -> Optional[bool]:
+    """Regenerate Chart.lock natively, the way ``helm dependency update`` would.
+
+    Returns True when the lock was rewritten, False when it was already up
+    to date, and None when helm has to resolve the dependencies instead.
+    """
+    locked = resolve_local_lock(chart_dir)
+    if locked is None:
+        return None
+
+    requirements = load_yaml(chart_dir / "Chart.yaml").get("dependencies") or []
+    digest = lock_digest(requirements, locked)
+    lock_path = chart_dir / "Chart.lock"
+    if lock_path.exists() and load_yaml(lock_path).get("digest") == digest:
+        return False
+
+    body = yaml.safe_dump(
+        {"dependencies": locked, "digest": digest},
+        sort_keys=True,
+        default_flow_style=False,
+    )
+    generated = _format_generated(datetime.datetime.now(datetime.timezone.utc))
+    lock_path.write_text(f'{body}generated: "{generated}"\n', encoding="utf-8")
+    return True
+
+
+def _helm_dependency_build(chart_dir: Path) -> None:
+    subprocess.check_call(
+        ["helm", "dependency", "build", "--skip-refresh", str(chart_dir)],
+        cwd=str(chart_dir.parent.parent),
+    )
+
+
+def refresh_dependency_locks(
+    chart_dirs: list[Path],
+    verify: bool = False,
+    max_workers: int = DEFAULT_LOCK_WORKERS,
+) -> list[Path]:
+    """Bring the Chart.lock of each chart in line with its Chart.yaml.
+
+    Locks are rewritten natively in parallel; only charts whose
+    dependencies need real resolution go through ``helm dependency build``.
+    With ``verify``, helm also builds every rewritten chart, which fails if
+    the lock digest does not match what helm expects.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = list(executor.map(write_chart_lock, chart_dirs))
+
+    updated_lockfiles: list[Path] = []
+    for chart_dir, rewritten in zip(chart_dirs, results):
+        lock_path = chart_dir / "Chart.lock"
+        if rewritten is None:
+            log("INFO", f"Refreshing dependency lock for {chart_dir.name} with helm")
+            # Once Chart.yaml dependency versions change, Helm refuses to build
+            # from a stale Chart.lock. Remove it first so dependency build
+            # regenerates the lockfile from current dependency metadata.
+            lock_path.unlink(missing_ok=True)
+            _helm_dependency_build(chart_dir)
+        else:
+            log("INFO", f"Refreshed dependency lock for {chart_dir.name}")
+            if verify and rewritten:
+                # helm shares one repository cache, so builds stay serial.
+                _helm_dependency_build(chart_dir)
 
         if lock_path.exists():
             updated_lockfiles.append(lock_path)
@@ -1,13 +1,111 @@
 from __future__ import annotations
 
+import hashlib
 import subprocess
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import IO, Iterable, Iterator, Optional
+
+
+# Each commit starts with a record separator; header fields and the message
+# are split by unit separators, and -z NUL-terminates the changed paths.
+LOG_FORMAT = "%x1e%H %P%x1f%s %b%x1f"
+LOG_CHUNK_SIZE = 1 << 16
+
+
+@dataclass(frozen=True)
+class CommitRecord:
+    sha: str
+    parents: tuple[str, ...]
+    message: str
+    paths: tuple[str, ...]
+
+
+def parse_log_records(stream: IO[bytes]) -> Iterator[CommitRecord]:
+    """Parse ``git log -z --name-only --format=LOG_FORMAT`` output as it arrives."""
+    buffer = b""
+    for chunk in iter(lambda: stream.read(LOG_CHUNK_SIZE), b""):
+        *records, buffer = (buffer + chunk).split(b"\x1e")
+        for record in records:
+            if record:
+                yield _parse_log_record(record.decode("utf-8", "replace"))
+    if buffer:
+        yield _parse_log_record(buffer.decode("utf-8", "replace"))
+
+
+def _parse_log_record(record: str) -> CommitRecord:
+    header, message, files = record.split("\x1f", 2)
+    sha, *parents = header.split()
+    paths = tuple(path.strip("\n") for path in files.split("\0"))
+    return CommitRecord(sha, tuple(parents), message, tuple(p for p in paths if p))
+
+
+class HistoryIndex:
+    """Commits between a common base and HEAD, bucketed by directory.
+
+    Built from a single ``git log`` walk, so the commits touching a chart
+    since any tag in the walked range are answered without spawning git.
+    """
+
+    def __init__(self, base: Optional[str], commits: Iterable[CommitRecord]) -> None:
+        self.base = base
+        self.commits: dict[str, CommitRecord] = {}
+        self.by_directory: dict[str, list[str]] = {}
+        self._ancestors: dict[str, frozenset[str]] = {}
+        for commit in commits:
+            self.commits[commit.sha] = commit
+            directories = set()
+            for path in commit.paths:
+                slash = path.find("/")
+                while slash != -1:
+                    directories.add(path[:slash])
+                    slash = path.find("/", slash + 1)
+            for directory in directories:
+                self.by_directory.setdefault(directory, []).append(commit.sha)
+
+    def covers(self, sha: str) -> bool:
+        """Whether ranges starting at ``sha`` can be answered from the index."""
+        return sha == self.base or sha in self.commits
+
+    def ancestors(self, sha: str) -> frozenset[str]:
+        """Indexed commits reachable from ``sha``, itself included."""
+        cached = self._ancestors.get(sha)
+        if cached is not None:
+            return cached
+        seen = set()
+        pending = [sha]
+        while pending:
+            current = pending.pop()
+            commit = self.commits.get(current)
+            if commit is None or current in seen:
+                continue
+            seen.add(current)
+            pending.extend(commit.parents)
+        result = frozenset(seen)
+        self._ancestors[sha] = result
+        return result
+
+    def commits_since(self, sha: str, directory: str) -> list[CommitRecord]:
+        """Commits in ``sha..HEAD`` touching ``directory``, newest first."""
+        excluded = self.ancestors(sha)
+        return [
+            self.commits[commit]
+            for commit in self.by_directory.get(directory.rstrip("/"), ())
+            if commit not in excluded
+        ]
+
+
+def ref_digest(refs: dict[str, str]) -> str:
+    """Digest a ref map, so any created, moved or deleted ref changes it."""
+    data = "\n".join(f"{name} {sha}" for name, sha in sorted(refs.items()))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
 
 
 class GitClient:
     def __init__(self, repo_root: Path) -> None:
         self.repo_root = repo_root
+        self.history: Optional[HistoryIndex] = None
+        self._ref_commits: dict[str, str] = {}
 
     def _normalize_path(self, path: Path) -> str:
         try:
@@ -19,6 +117,83 @@ class GitClient:
         output = subprocess.check_output(args, cwd=str(cwd or self.repo_root))
         return output.decode().strip()
 
+    def git_dir(self) -> Path:
+        dot_git = self.repo_root / ".git"
+        if dot_git.is_file():
+            # Worktrees and submodules point at their real git directory.
+            content = dot_git.read_text(encoding="utf-8").strip()
+            return (self.repo_root / content.removeprefix("gitdir:").strip()).resolve()
+        return dot_git
+
+    def common_dir(self) -> Path:
+        git_dir = self.git_dir()
+        commondir = git_dir / "commondir"
+        if commondir.is_file():
+            return (git_dir / commondir.read_text(encoding="utf-8").strip()).resolve()
+        return git_dir
+
+    def read_refs(self, prefix: str) -> Optional[dict[str, str]]:
+        """Read refs under ``prefix`` straight from packed-refs and loose files.
+
+        Returns None when the refs cannot be read from disk, such as in a
+        reftable repository, so callers can fall back to git commands.
+        """
+        common = self.common_dir()
+        if not (common / "HEAD").is_file() or (common / "reftable").exists():
+            return None
+
+        refs: dict[str, str] = {}
+        packed = common / "packed-refs"
+        if packed.is_file():
+            for line in packed.read_text(encoding="utf-8").splitlines():
+                # Skip the header and "^<sha>" peeled annotated-tag lines.
+                if not line or line[0] in "#^":
+                    continue
+                sha, _, name = line.partition(" ")
+                if name.startswith(prefix):
+                    refs[name] = sha
+
+        loose = common / prefix
+        if loose.is_file():
+            refs[prefix] = loose.read_text(encoding="utf-8").strip()
+        elif loose.is_dir():
+            for path in loose.rglob("*"):
+                if path.is_file():
+                    name = path.relative_to(common).as_posix()
+                    refs[name] = path.read_text(encoding="utf-8").strip()
+        return refs
+
+    def tag_refs(self) -> Optional[dict[str, str]]:
+        refs = self.read_refs("refs/tags/")
+        if refs is None:
+            return None
+        return {name.removeprefix("refs/tags/"): sha for name, sha in refs.items()}
+
+    def head_commit(self) -> Optional[str]:
+        try:
+            head = (self.git_dir() / "HEAD").read_text(encoding="utf-8").strip()
+        except OSError:
+            return None
+        if not head.startswith("ref: "):
+            return head or None
+        name = head.removeprefix("ref: ")
+        refs = self.read_refs(name)
+        return refs.get(name) if refs else None
+
+    def is_clean(self, path: Path) -> bool:
+        """Whether tracked files under ``path`` match HEAD."""
+        output = self.run(
+            [
+                "git",
+                "status",
+                "--porcelain",
+                "--untracked-files=no",
+                "--",
+                self._normalize_path(path),
+            ]
+        )
+        return not output
+
     def fetch_tags(self) -> None:
         self.run(["git", "fetch", "--tags"])
 
@@ -53,6 +228,51 @@ class GitClient:
         )
         return result.returncode == 1
 
+    def resolve_commits(self, refs: list[str]) -> dict[str, str]:
+        if not refs:
+            return {}
+        output = self.run(["git", "rev-parse", *(f"{ref}^{{commit}}" for ref in refs)])
+        return dict(zip(refs, output.splitlines()))
+
+    def merge_base(self, revisions: list[str]) -> Optional[str]:
+        result = subprocess.run(
+            ["git", "merge-base", "--octopus", *revisions],
+            check=False,
+            capture_output=True,
+            cwd=str(self.repo_root),
+        )
+        return result.stdout.decode().strip() or None
+
+    def index_history(self, refs: list[str]) -> HistoryIndex:
+        """Index every commit from the common ancestor of ``refs`` up to HEAD."""
+        self._ref_commits = self.resolve_commits(refs)
+        base = self.merge_base([*self._ref_commits.values(), "HEAD"])
+        args = ["git", "log", "-z", "--name-only", f"--format={LOG_FORMAT}", "HEAD"]
+        if base:
+            args.append(f"^{base}")
+
+        with subprocess.Popen(
+            args, stdout=subprocess.PIPE, cwd=str(self.repo_root)
+        ) as process:
+            assert process.stdout is not None
+            history = HistoryIndex(base, parse_log_records(process.stdout))
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, args)
+
+        self.history = history
+        return history
+
+    def indexed_commits(self, ref: str, path: Path) -> Optional[list[CommitRecord]]:
+        """Commits in ``ref..HEAD`` touching ``path`` from the history index.
+
+        Returns None when the index has not been built or does not reach
+        ``ref``, in which case callers should ask git directly.
+        """
+        sha = self._ref_commits.get(ref)
+        if self.history is None or sha is None or not self.history.covers(sha):
+            return None
+        return self.history.commits_since(sha, self._normalize_path(path))
+
     def stage_paths(self, paths: Iterable[Path]) -> None:
         normalized_paths = sorted({self._normalize_path(path) for path in paths})
         if not normalized_paths:
@@ -1,45 +1,276 @@
 from __future__ import annotations
 
+import http.client
 import json
-import urllib.request
-from typing import Optional
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Iterable, Optional
+from urllib.parse import urlsplit
 
 from tools.versioning.common import log
 
 
+DEFAULT_API_URL = "https://api.github.com"
+API_VERSION = "2022-11-28"
+GRAPHQL_BATCH_SIZE = 50
+REST_CONCURRENCY = 8
+REQUEST_TIMEOUT_SECONDS = 10.0
+# Labels on closed and merged PRs rarely change, so only those are kept on disk.
+SETTLED_STATES = {"closed", "merged"}
+
+
+def default_label_cache_path() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base) / "helm-charts" / "pr-labels.json"
+
+
+def graphql_url_for(api_url: str) -> str:
+    if api_url.endswith("/api/v3"):
+        return f"{api_url.removesuffix('/v3')}/graphql"
+    return f"{api_url}/graphql"
+
+
+class ConnectionPool:
+    """Keep-alive HTTP connections, one per origin and worker thread."""
+
+    def __init__(self, timeout: float = REQUEST_TIMEOUT_SECONDS) -> None:
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open: list[http.client.HTTPConnection] = []
+
+    def _connection(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        connection = connections.get((scheme, netloc))
+        if connection is None:
+            factory = (
+                http.client.HTTPSConnection
+                if scheme == "https"
+                else http.client.HTTPConnection
+            )
+            connection = factory(netloc, timeout=self.timeout)
+            connections[(scheme, netloc)] = connection
+            with self._lock:
+                self._open.append(connection)
+        return connection
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: dict[str, str],
+        body: Optional[bytes] = None,
+    ) -> tuple[int, Any]:
+        parts = urlsplit(url)
+        target = parts.path + (f"?{parts.query}" if parts.query else "")
+        for attempt in range(2):
+            connection = self._connection(parts.scheme, parts.netloc)
+            try:
+                connection.request(method, target, body=body, headers=headers)
+                response = connection.getresponse()
+                payload = response.read()
+            except Exception as e:
+                # A socket that failed mid-request is never reused. Only a
+                # dropped idle keep-alive socket is worth one retry.
+                self._discard(parts.scheme, parts.netloc, connection)
+                if attempt or not isinstance(e, ConnectionError):
+                    raise
+                continue
+            return response.status, json.loads(payload) if payload else None
+        raise AssertionError("unreachable")
+
+    def _discard(
+        self, scheme: str, netloc: str, connection: http.client.HTTPConnection
+    ) -> None:
+        connection.close()
+        getattr(self._local, "connections", {}).pop((scheme, netloc), None)
+        with self._lock:
+            if connection in self._open:
+                self._open.remove(connection)
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._open:
+                connection.close()
+            self._open.clear()
+
+
 class GitHubClient:
-    def __init__(self, owner_repo: str, token: Optional[str]) -> None:
+    def __init__(
+        self,
+        owner_repo: str,
+        token: Optional[str],
+        api_url: Optional[str] = None,
+        cache_path: Optional[Path] = None,
+    ) -> None:
         self.owner_repo = owner_repo
         self.token = token
+        self.api_url = (
+            api_url or os.environ.get("GITHUB_API_URL") or DEFAULT_API_URL
+        ).rstrip("/")
+        self.graphql_url = os.environ.get("GITHUB_GRAPHQL_URL") or graphql_url_for(
+            self.api_url
+        )
+        self.cache_path = cache_path
+        self.pool = ConnectionPool()
         self._label_cache: dict[int, list[str]] = {}
+        self._stored: Optional[dict[str, dict[str, list[str]]]] = None
+        self._dirty = False
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def _headers(self) -> dict[str, str]:
+        headers = {
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": API_VERSION,
+            "User-Agent": "helm-charts-version-bump",
+        }
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        return headers
 
     def get_pr_labels(self, pr_number: int) -> list[str]:
         if not self.owner_repo:
             return []
 
-        if pr_number in self._label_cache:
-            return self._label_cache[pr_number]
+        if pr_number not in self._label_cache:
+            self.prefetch_pr_labels([pr_number])
+        return self._label_cache.get(pr_number, [])
 
-        url = f"https://api.github.com/repos/{self.owner_repo}/issues/{pr_number}"
-        request = urllib.request.Request(url)
-        if self.token:
-            request.add_header("Authorization", f"Bearer {self.token}")
-            request.add_header("Accept", "application/vnd.github+json")
-            request.add_header("X-GitHub-Api-Version", "2022-11-28")
+    def prefetch_pr_labels(self, pr_numbers: Iterable[int]) -> None:
+        """Resolve labels for many PRs at once, in as few API calls as possible.
+
+        Settled PRs come from the on-disk cache first. The rest are fetched
+        through aliased GraphQL ``pullRequest`` queries when a token is set,
+        and anything GraphQL could not answer through concurrent REST calls.
+        """
+        if not self.owner_repo:
+            return
+
+        stored = self._stored_labels()
+        missing = []
+        for pr_number in sorted(set(pr_numbers) - set(self._label_cache)):
+            labels = stored.get(str(pr_number))
+            if labels is None:
+                missing.append(pr_number)
+            else:
+                self._label_cache[pr_number] = labels
+
+        if missing and self.token:
+            missing = self._fetch_graphql(missing)
+        if missing:
+            self._fetch_rest(missing)
+        self._save_stored_labels()
+
+    def _remember(self, pr_number: int, labels: list[str], state: str) -> None:
+        self._label_cache[pr_number] = labels
+        if state.lower() in SETTLED_STATES:
+            self._stored_labels()[str(pr_number)] = labels
+            self._dirty = True
 
+    def _fetch_graphql(self, pr_numbers: list[int]) -> list[int]:
+        """Fetch labels through GraphQL, returning the PRs it could not resolve."""
+        owner, _, name = self.owner_repo.partition("/")
+        unresolved = []
+        for start in range(0, len(pr_numbers), GRAPHQL_BATCH_SIZE):
+            batch = pr_numbers[start : start + GRAPHQL_BATCH_SIZE]
+            fields = " ".join(
+                f"pr{number}: pullRequest(number: {number}) "
+                "{ state labels(first: 100) { nodes { name } } }"
+                for number in batch
+            )
+            query = (
+                "query($owner: String!, $name: String!) "
+                f"{{ repository(owner: $owner, name: $name) {{ {fields} }} }}"
+            )
+            body = json.dumps(
+                {"query": query, "variables": {"owner": owner, "name": name}}
+            ).encode("utf-8")
+            try:
+                status, payload = self.pool.request(
+                    "POST",
+                    self.graphql_url,
+                    {**self._headers(), "Content-Type": "application/json"},
+                    body,
+                )
+            except Exception as exc:  # noqa: BLE001
+                log("WARNING", f"GraphQL label lookup failed: {exc}")
+                status, payload = 0, None
+
+            repository = ((payload or {}).get("data") or {}).get("repository")
+            if status != 200 or not isinstance(repository, dict):
+                unresolved.extend(batch)
+                continue
+
+            for number in batch:
+                pull_request = repository.get(f"pr{number}")
+                if not isinstance(pull_request, dict):
+                    # Not a PR (an issue reference, say); REST resolves issues too.
+                    unresolved.append(number)
+                    continue
+                nodes = (pull_request.get("labels") or {}).get("nodes") or []
+                labels = [
+                    node["name"]
+                    for node in nodes
+                    if isinstance(node, dict) and isinstance(node.get("name"), str)
+                ]
+                self._remember(number, labels, str(pull_request.get("state", "")))
+        return unresolved
+
+    def _fetch_rest_one(self, pr_number: int) -> tuple[int, list[str], str]:
+        url = f"{self.api_url}/repos/{self.owner_repo}/issues/{pr_number}"
         try:
-            with urllib.request.urlopen(request) as response:
-                payload = json.loads(response.read().decode())
+            status, payload = self.pool.request("GET", url, self._headers())
+            if status != 200 or not isinstance(payload, dict):
+                raise RuntimeError(f"HTTP {status} for {url}")
         except Exception as exc:  # noqa: BLE001
             log("WARNING", f"Failed to fetch PR #{pr_number} labels: {exc}")
-            self._label_cache[pr_number] = []
-            return []
+            return pr_number, [], ""
 
         labels = []
         for item in payload.get("labels", []):
-            name = item.get("name")
+            name = item.get("name") if isinstance(item, dict) else None
             if isinstance(name, str):
                 labels.append(name)
+        return pr_number, labels, str(payload.get("state", ""))
 
-        self._label_cache[pr_number] = labels
-        return labels
+    def _fetch_rest(self, pr_numbers: list[int]) -> None:
+        workers = min(REST_CONCURRENCY, len(pr_numbers))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for pr_number, labels, state in executor.map(
+                self._fetch_rest_one, pr_numbers
+            ):
+                self._remember(pr_number, labels, state)
+
+    def _stored_labels(self) -> dict[str, list[str]]:
+        if self._stored is None:
+            self._stored = {}
+            if self.cache_path is not None and self.cache_path.exists():
+                try:
+                    data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+                except (OSError, ValueError) as exc:
+                    log("WARNING", f"Ignoring unreadable label cache: {exc}")
+                    data = {}
+                if isinstance(data, dict):
+                    self._stored = {
+                        repo: labels
+                        for repo, labels in data.items()
+                        if isinstance(labels, dict)
+                    }
+        return self._stored.setdefault(self.owner_repo, {})
+
+    def _save_stored_labels(self) -> None:
+        if not self._dirty or self.cache_path is None or self._stored is None:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.cache_path.with_suffix(".tmp")
+        temporary.write_text(
+            json.dumps(self._stored, indent=2, sort_keys=True) + "\n", encoding="utf-8"
+        )
+        temporary.replace(self.cache_path)
+        self._dirty = False
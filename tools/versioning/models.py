@@ -15,6 +15,9 @@ class VersionBumpConfig:
     owner_repo: str
     github_token: Optional[str]
     summary_file: Optional[Path]
+    label_cache: Optional[Path] = None
+    verify_locks: bool = False
+    use_plan_cache: bool = True
 
 
 @dataclass(frozen=True)
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Optional
+
+from tools.versioning.common import log
+from tools.versioning.models import ChartUpdate
+
+
+PLAN_CACHE_VERSION = 1
+
+LatestTags = dict[str, tuple[str, str, tuple[int, int, int]]]
+
+
+class PlanCache:
+    """On-disk memo of the latest-tag map and the last version plan.
+
+    The tag map is keyed by the digest of the tag refs and the plan by HEAD
+    plus that digest, so reruns where nothing relevant moved skip planning.
+    """
+
+    def __init__(self, path: Optional[Path]) -> None:
+        self.path = path
+        self._data: Optional[dict[str, Any]] = None
+
+    def _load(self) -> dict[str, Any]:
+        if self._data is None:
+            self._data = {}
+            if self.path is not None and self.path.is_file():
+                try:
+                    data = json.loads(self.path.read_text(encoding="utf-8"))
+                except (OSError, ValueError) as exc:
+                    log("WARNING", f"Ignoring unreadable plan cache: {exc}")
+                    data = {}
+                if isinstance(data, dict) and data.get("version") == PLAN_CACHE_VERSION:
+                    self._data = data
+        return self._data
+
+    def _save(self) -> None:
+        if self.path is None or self._data is None:
+            return
+        self._data["version"] = PLAN_CACHE_VERSION
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = self.path.with_suffix(".tmp")
+            temporary.write_text(json.dumps(self._data, indent=2), encoding="utf-8")
+            temporary.replace(self.path)
+        except OSError as exc:
+            log("WARNING", f"Could not write plan cache: {exc}")
+
+    def latest_tags(self, tags_digest: str) -> Optional[LatestTags]:
+        entry = self._load().get("tags")
+        if not isinstance(entry, dict) or entry.get("digest") != tags_digest:
+            return None
+        return {
+            chart: (tag, version, tuple(parsed))
+            for chart, (tag, version, parsed) in entry["latest"].items()
+        }
+
+    def store_latest_tags(self, tags_digest: str, latest: LatestTags) -> None:
+        self._load()["tags"] = {
+            "digest": tags_digest,
+            "latest": {chart: list(entry) for chart, entry in latest.items()},
+        }
+        self._save()
+
+    def plan(self, key: str) -> Optional[tuple[list[ChartUpdate], list[str]]]:
+        entry = self._load().get("plan")
+        if not isinstance(entry, dict) or entry.get("key") != key:
+            return None
+        updates = [
+            ChartUpdate(
+                chart_name=item["chart_name"],
+                chart_dir=Path(item["chart_dir"]),
+                chart_yaml=Path(item["chart_yaml"]),
+                current_version=item["current_version"],
+                new_version=item["new_version"],
+                bump=item["bump"],
+            )
+            for item in entry["updates"]
+        ]
+        return updates, list(entry["summary"])
+
+    def store_plan(
+        self, key: str, updates: list[ChartUpdate], summary: list[str]
+    ) -> None:
+        self._load()["plan"] = {
+            "key": key,
+            "updates": [
+                {
+                    "chart_name": update.chart_name,
+                    "chart_dir": str(update.chart_dir),
+                    "chart_yaml": str(update.chart_yaml),
+                    "current_version": update.current_version,
+                    "new_version": update.new_version,
+                    "bump": update.bump,
+                }
+                for update in updates
+            ],
+            "summary": summary,
+        }
+        self._save()